@@ -0,0 +1,38 @@
+from testflows.core import *
+
+from helpers.argparser import argparser
+from helpers.cluster import Cluster
+import e2e.settings as settings
+
+
+@TestSuite
+@ArgumentParser(argparser)
+def benchmark(self, native, keeper_type):
+    """ClickHouse Operator benchmark suite.
+
+    Results are appended to trend files in tests/benchmarks (see BENCHMARK_RESULTS_DIR).
+    """
+    def run_features():
+        features = [
+            "e2e.benchmark_metrics_exporter",
+            "e2e.benchmark_backup",
+            "e2e.benchmark_reconcile",
+            "e2e.benchmark_operator_restart",
+            "e2e.benchmark_scale",
+            "e2e.benchmark_keeper",
+        ]
+        for feature_name in features:
+            Feature(run=load(feature_name, "test"))
+
+    self.context.native = native
+    self.context.keeper_type = keeper_type
+    settings.load()
+    if native:
+        run_features()
+    else:
+        with Cluster():
+            run_features()
+
+
+if main():
+    benchmark()
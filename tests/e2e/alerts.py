@@ -1,6 +1,7 @@
 import json
 import time
 import random
+import urllib.parse
 
 from testflows.core import Given, Then, And, fail, When
 
@@ -48,6 +49,33 @@ def wait_alert_state(alert_name, alert_state, expected_state, prometheus_pod='pr
     return catched
 
 
+def query_prometheus(query, prometheus_pod='prometheus-prometheus-0'):
+    """Instant PromQL query, returns list of (labels, value) of the result vector."""
+    out = kubectl.launch(
+        f"exec -n {settings.prometheus_namespace} {prometheus_pod} -c prometheus -- "
+        f"wget -qO- 'http://127.0.0.1:9090/api/v1/query?query={urllib.parse.quote(query)}' 2>/dev/null"
+    )
+    out = json.loads(out)
+    if not ("status" in out and out["status"] == "success"):
+        fail("wrong response from prometheus query API")
+    return [(r["metric"], float(r["value"][1])) for r in out["data"]["result"]]
+
+
+def wait_prometheus_value(query, value, prometheus_pod='prometheus-prometheus-0', timeout=180, sleep_time=2):
+    """Wait until the query returns a sample equal to value, i.e. Prometheus has scraped it.
+
+    Returns as soon as the sample is ingested, instead of sleeping for a few scrape intervals.
+    """
+    with Then(f"wait {query} == {value} in prometheus"):
+        deadline = time.time() + timeout
+        while True:
+            if any(v == float(value) for _, v in query_prometheus(query, prometheus_pod)):
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(sleep_time)
+
+
 def random_pod_choice_for_callbacks(chi):
     first_idx = random.randint(0, 1)
     first_pod = chi["status"]["pods"][first_idx]
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import datetime
+import threading
+import subprocess
+import contextvars
+
+import e2e.settings as settings
+
+from testflows.core import metric, note, Then, fail
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(values):
+    """min/avg/p50/p90/p99/max of a list of numbers."""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "min": min(values),
+        "avg": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+class Sampler(object):
+    """Base of background samplers: start() runs run(*args) in a thread for each of threads_args() until stop().
+
+        class Timeline(benchmark.Sampler):
+            def run(self):
+                self.every(self.interval, self.sample)
+
+    setup() runs before the threads start and cleanup() after they stopped, also when start() failed,
+    stop() does nothing when the sampler is already stopped. Threads run in the context of the test which
+    started them, so they may log with debug().
+    """
+
+    def __init__(self, join_timeout=60):
+        self.join_timeout = join_timeout
+        self.threads = []
+        self.stopped = threading.Event()
+        self.started_at = None
+        self.stopped_at = None
+
+    def threads_args(self):
+        """Arguments of run() of every thread, one thread without arguments by default."""
+        return [()]
+
+    def setup(self):
+        pass
+
+    def cleanup(self):
+        pass
+
+    def run(self, *args):
+        raise NotImplementedError()
+
+    def start(self):
+        try:
+            self.setup()
+            self.started_at = time.time()
+            for args in self.threads_args():
+                thread = threading.Thread(target=contextvars.copy_context().run, args=(self.run, *args), daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def stop(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        try:
+            for thread in self.threads:
+                thread.join(timeout=self.join_timeout)
+            self.stopped_at = time.time()
+        finally:
+            self.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    def every(self, interval, sample, start=None):
+        """Call sample() every interval seconds from start, now by default, until stop().
+
+        A sample falling behind skips missed slots instead of bursting to catch up.
+        """
+        next_time = time.time() if start is None else start
+        while not self.stopped.wait(max(0.0, next_time - time.time())):
+            sample()
+            next_time += interval
+            if next_time < time.time():
+                next_time = time.time()
+
+
+def git_sha():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def results_file(name):
+    return os.path.join(settings.benchmark_results_dir, f"{name}.jsonl")
+
+
+def load_results(name, params=None):
+    """All stored records of the benchmark, optionally only the ones with the same params."""
+    path = results_file(name)
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line == "":
+                continue
+            record = json.loads(line)
+            if params is None or record.get("params") == params:
+                records.append(record)
+    return records
+
+
+def compare(previous, current, tolerance=None, higher_is_better=()):
+    """Return list of (key, previous, current) for numeric results which became worse than tolerance allows."""
+    tolerance = settings.benchmark_tolerance if tolerance is None else tolerance
+    regressions = []
+    for key, value in current.items():
+        old = previous.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+            continue
+        change = (value - old) / abs(old)
+        if key in higher_is_better:
+            change = -change
+        if change > tolerance:
+            regressions.append((key, old, value))
+    return regressions
+
+
+def store(name, params, results, higher_is_better=()):
+    """Append results to the trend file of the benchmark and report changes against the previous run.
+
+    `params` identifies comparable runs, `results` is a flat dict of numbers, None for values which were not measured.
+    """
+    previous = load_results(name, params)
+    record = {
+        "timestamp": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "unixtime": time.time(),
+        "git_sha": git_sha(),
+        "operator_version": settings.operator_version,
+        "params": params,
+        "results": results,
+    }
+    os.makedirs(settings.benchmark_results_dir, exist_ok=True)
+    with open(results_file(name), "a") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+    for key, value in results.items():
+        if isinstance(value, (int, float)):
+            metric(key, value, "")
+
+    if previous:
+        regressions = compare(previous[-1]["results"], results, higher_is_better=higher_is_better)
+        with Then(f"compare with previous {name} run from {previous[-1]['timestamp']}"):
+            for key, old, value in regressions:
+                note(f"{key} regressed: {old} -> {value}")
+            if regressions and settings.benchmark_fail_on_regression == 'yes':
+                fail(f"{len(regressions)} results of {name} regressed more than {settings.benchmark_tolerance}")
+    return record
@@ -0,0 +1,132 @@
+import re
+import time
+
+import e2e.benchmark as benchmark
+import e2e.clickhouse as clickhouse
+import e2e.settings as settings
+import e2e.test_backup_alerts as backup
+import e2e.util as util
+
+from testflows.core import *
+from testflows.asserts import error
+
+table = "default.benchmark_backup"
+
+
+def backup_metric(backup_pod, metric_name):
+    value = backup.get_backup_metric_value(backup_pod, metric_name).strip()
+    return float(value) if value != "" else 0.0
+
+
+def run_backup_command(backup_pod, request, command):
+    """POST request to clickhouse-backup API and wait until the command succeeds, returns wall clock seconds."""
+    start = time.time()
+    backup.exec_on_backup_container(backup_pod, f'curl -X POST -sL "http://127.0.0.1:7171/backup/{request}"')
+    backup.wait_backup_command_status(backup_pod, command, expected_status='success')
+    return time.time() - start
+
+
+def prepare_table(chi_name, backup_pod, rows, parts):
+    """Create table with `rows` rows in `parts` parts, merges are stopped to keep the part count."""
+    clickhouse.query(
+        chi_name,
+        f"DROP TABLE IF EXISTS {table} SYNC;"
+        f"CREATE TABLE {table} (i UInt64, s String) ENGINE MergeTree() ORDER BY i;"
+        f"SYSTEM STOP MERGES {table}",
+        pod=backup_pod,
+    )
+    rows_per_part = max(1, rows // parts)
+    for part in range(parts):
+        clickhouse.query(
+            chi_name,
+            f"INSERT INTO {table} SELECT number + {part * rows_per_part}, randomPrintableASCII(16) "
+            f"FROM numbers({rows_per_part})",
+            pod=backup_pod,
+            timeout=600,
+        )
+    return int(clickhouse.query(
+        chi_name,
+        f"SELECT sum(bytes_on_disk) FROM system.parts WHERE active AND database || '.' || table = '{table}'",
+        pod=backup_pod,
+    ))
+
+
+@TestScenario
+def backup_throughput(self, chi, rows, parts):
+    """Measure create/upload/download/restore of a table with `rows` rows in `parts` parts."""
+    chi_name = chi["metadata"]["name"]
+    backup_pod = chi["status"]["pods"][0]
+    backup_name = f"benchmark_{rows}_{parts}_{int(time.time())}"
+
+    with Given(f"{table} with {rows} rows in {parts} parts"):
+        table_bytes = prepare_table(chi_name, backup_pod, rows, parts)
+        note(f"{table_bytes} bytes on disk")
+
+    try:
+        with When("backup is created and uploaded"):
+            create_wall = run_backup_command(backup_pod, f"create?name={backup_name}", f"create {backup_name}")
+            upload_wall = run_backup_command(backup_pod, f"upload/{backup_name}", f"upload {backup_name}")
+
+        with And("local backup and table are dropped"):
+            backup.exec_on_backup_container(backup_pod, f'curl -X POST -sL "http://127.0.0.1:7171/backup/delete/local/{backup_name}"')
+            clickhouse.query(chi_name, f"DROP TABLE {table} SYNC", pod=backup_pod)
+
+        with When("backup is downloaded and restored"):
+            download_wall = run_backup_command(backup_pod, f"download/{backup_name}", f"download {backup_name}")
+            restore_wall = run_backup_command(
+                backup_pod, f"restore/{backup_name}?table={table}", re.compile(f"restore .*{backup_name}"),
+            )
+
+        with Then("table is restored"):
+            restored = clickhouse.query(chi_name, f"SELECT count() FROM {table}", pod=backup_pod)
+            assert int(restored) == max(1, rows // parts) * parts, error()
+
+        with Then("durations are reported by clickhouse-backup"):
+            results = {"table_bytes": table_bytes}
+            for command, wall in [("create", create_wall), ("upload", upload_wall),
+                                  ("download", download_wall), ("restore", restore_wall)]:
+                duration = backup_metric(backup_pod, f"clickhouse_backup_last_{command}_duration") / 1e9
+                results[f"{command}_duration_s"] = duration
+                results[f"{command}_wall_s"] = wall
+                results[f"{command}_bytes_per_s"] = table_bytes / duration if duration > 0 else 0
+            results["backup_size_remote"] = backup_metric(backup_pod, "clickhouse_backup_last_backup_size_remote")
+
+        benchmark.store(
+            "backup_throughput",
+            params={"rows": rows, "parts": parts, "clickhouse_version": settings.clickhouse_version},
+            results=results,
+            higher_is_better=[key for key in results if key.endswith("_bytes_per_s")],
+        )
+    finally:
+        with Finally(f"remove {backup_name}"):
+            backup.exec_on_backup_container(
+                backup_pod, f'curl -X POST -sL "http://127.0.0.1:7171/backup/delete/local/{backup_name}"', ok_to_fail=True,
+            )
+            backup.exec_on_backup_container(
+                backup_pod, f'curl -X POST -sL "http://127.0.0.1:7171/backup/delete/remote/{backup_name}"', ok_to_fail=True,
+            )
+            clickhouse.query(chi_name, f"DROP TABLE IF EXISTS {table} SYNC", pod=backup_pod)
+
+
+@TestFeature
+@Name("e2e.benchmark_backup")
+def test(self):
+    """Backup and restore throughput against the MinIO installed by deploy/minio, see test_backup_alerts."""
+    _, chi = util.install_clickhouse_and_keeper(
+        chi_file='manifests/chi/test-cluster-for-backups.yaml',
+        chi_template_file='manifests/chit/tpl-clickhouse-backups.yaml',
+        chi_name='test-cluster-for-backups',
+        keeper_type=self.context.keeper_type,
+    )
+    util.wait_clickhouse_cluster_ready(chi)
+    backup.get_minio_spec()
+    backup.wait_backup_pod_ready_and_curl_installed(chi["status"]["pods"][0])
+
+    try:
+        for rows in [int(r) for r in settings.backup_benchmark_rows.split(",")]:
+            for parts in [int(p) for p in settings.backup_benchmark_parts.split(",")]:
+                Scenario(name=f"backup throughput {rows} rows {parts} parts", test=backup_throughput)(
+                    chi=chi, rows=rows, parts=parts,
+                )
+    finally:
+        backup.stop_backup_status_trackers()
@@ -0,0 +1,72 @@
+import time
+
+import e2e.clickhouse as clickhouse
+import e2e.keeper_load as keeper_load
+import e2e.kubectl as kubectl
+import e2e.settings as settings
+import e2e.test_keeper as test_keeper
+import e2e.util as util
+
+from testflows.core import *
+from testflows.asserts import error
+
+chi_name = "test-cluster-for-zk"
+replica_pods = [f"chi-{chi_name}-default-0-{replica}-0" for replica in range(2)]
+
+# 1 and 3 node keeper manifests of test_keeper probes scenarios
+keeper_manifests = {
+    "zookeeper": ("zookeeper-1-node-for-test-probes.yaml", "zookeeper-3-nodes-for-test-probes.yaml"),
+    "zookeeper-operator": ("zookeeper-operator-1-node.yaml", "zookeeper-operator-3-node.yaml"),
+    "clickhouse-keeper": ("clickhouse-keeper-1-node-256M-for-test-only.yaml", "clickhouse-keeper-3-nodes-256M-for-test-only.yaml"),
+}
+
+
+@TestScenario
+def keeper_insert_rate(self, keeper_type, rate):
+    """Replicated inserts at rate parts per second to each replica for KEEPER_BENCHMARK_DURATION seconds."""
+    load = keeper_load.KeeperLoad(chi_name, replica_pods, keeper_type, rate=rate, user="bench", password="bench")
+    with When(f"{rate} inserts per second per replica for {settings.keeper_benchmark_duration}s"):
+        with load:
+            time.sleep(settings.keeper_benchmark_duration)
+        report = load.note_report()
+
+    keeper_load.store(load, keeper_type, rate)
+
+    with Then("keeper probes do not fail"):
+        assert report["probe_failures"] == {}, error()
+        assert report["restarts"] == {}, error()
+
+
+@TestFeature
+@Name("e2e.benchmark_keeper")
+def test(self):
+    """Keeper latency and ClickHouse ZooKeeper waits under KEEPER_BENCHMARK_INSERT_RATES replicated inserts per
+    second to each of 2 replicas, with a 3 node keeper of the --keeper-type flavour.
+    """
+    keeper_type = self.context.keeper_type
+    util.clean_namespace(delete_chi=True)
+    util.install_operator_if_not_exist()
+    keeper_manifest_1_node, keeper_manifest_3_node = keeper_manifests[keeper_type]
+
+    try:
+        with Given(f"CH 2 replicas and {keeper_type} 3 nodes"):
+            chi = test_keeper.rescale_zk_and_clickhouse(
+                ch_node_count=2, keeper_node_count=3, keeper_type=keeper_type,
+                keeper_manifest_1_node=keeper_manifest_1_node, keeper_manifest_3_node=keeper_manifest_3_node,
+                first_install=True, clean_ns=False,
+            )
+            util.wait_clickhouse_cluster_ready(chi)
+            test_keeper.wait_keeper_ready(keeper_type=keeper_type, pod_count=3)
+            test_keeper.wait_clickhouse_no_readonly_replicas(chi)
+            clickhouse.query(chi_name, "DROP DATABASE IF EXISTS zookeeper_bench ON CLUSTER 'all-sharded' SYNC")
+            clickhouse.query(chi_name, "CREATE DATABASE zookeeper_bench ON CLUSTER 'all-sharded'")
+            clickhouse.query(chi_name, keeper_load.create_table_sql)
+
+        for rate in [int(r) for r in settings.keeper_benchmark_insert_rates.split(",")]:
+            Scenario(name=f"{keeper_type} with {rate} inserts per second per replica", test=keeper_insert_rate)(
+                keeper_type=keeper_type, rate=rate,
+            )
+    finally:
+        with Finally(f"remove {chi_name} and {keeper_type}"):
+            kubectl.delete_chi(chi_name, ok_to_fail=True)
+            kubectl.delete_all_keeper(settings.test_namespace)
@@ -0,0 +1,106 @@
+import time
+import urllib.request
+
+import e2e.benchmark as benchmark
+import e2e.fake_clickhouse as fake_clickhouse
+import e2e.fake_metrics_exporter as fake_metrics_exporter
+import e2e.prometheus_metrics as prometheus_metrics
+import e2e.settings as settings
+
+from testflows.core import *
+from testflows.asserts import error
+
+
+def scrape(url, timeout=300):
+    start = time.time()
+    with urllib.request.urlopen(f"{url}/metrics", timeout=timeout) as response:
+        body = response.read().decode()
+    return time.time() - start, body
+
+
+@TestScenario
+def scrape_latency(self, chi_count, hosts_per_chi, dataset, scrapes=5):
+    """Measure /metrics latency, size and series count with chi_count * hosts_per_chi fake ClickHouse hosts watched."""
+    hosts = chi_count * hosts_per_chi
+    fleet = None
+    exporter = None
+    chis = []
+    try:
+        with Given(f"{hosts} fake ClickHouse hosts"):
+            fleet = fake_clickhouse.FakeClickHouseFleet(hosts, rules=dataset.rules(), port=settings.fake_clickhouse_port)
+            fleet.start()
+
+        with And("metrics-exporter"):
+            if settings.metrics_exporter_url != '':
+                url = settings.metrics_exporter_url
+                exporter_kind = "real"
+            else:
+                exporter = fake_metrics_exporter.FakeMetricsExporter(
+                    fake_metrics_exporter.clickhouse_source(fleet.url_for)
+                ).start()
+                url = exporter.url
+                exporter_kind = "fake"
+            note(f"{exporter_kind} metrics-exporter at {url}")
+
+        with When(f"{chi_count} CHIs are watched"):
+            hostnames = fleet.hostnames
+            for i in range(chi_count):
+                chi = {
+                    "namespace": "benchmark",
+                    "name": f"benchmark-{i}",
+                    "hostnames": hostnames[i * hosts_per_chi:(i + 1) * hosts_per_chi],
+                }
+                code, out = fake_metrics_exporter.rest_call(url, "POST", chi)
+                assert code == 200, error(out)
+                chis.append(chi)
+
+        with Then(f"scrape /metrics {scrapes} times"):
+            latencies = []
+            sizes = []
+            series = 0
+            for _ in range(scrapes):
+                latency, body = scrape(url)
+                latencies.append(latency)
+                sizes.append(len(body))
+                series = len(prometheus_metrics.parse(body))
+            expected_series = hosts * dataset.series_per_host()
+            note(f"series={series} expected={expected_series}")
+            assert series == expected_series, error()
+
+        latency = benchmark.summarize(latencies)
+        benchmark.store(
+            "metrics_exporter_scrape",
+            params={
+                "exporter": exporter_kind,
+                "chi_count": chi_count,
+                "hosts_per_chi": hosts_per_chi,
+                "series_per_host": dataset.series_per_host(),
+            },
+            results={
+                "scrape_latency_p50_s": latency["p50"],
+                "scrape_latency_max_s": latency["max"],
+                "scrape_bytes": max(sizes),
+                "series": series,
+            },
+        )
+    finally:
+        with Finally("stop exporter and fake hosts"):
+            if settings.metrics_exporter_url != '':
+                for chi in chis:
+                    fake_metrics_exporter.rest_call(url, "DELETE", chi)
+            if exporter is not None:
+                exporter.stop()
+            if fleet is not None:
+                fleet.stop()
+
+
+@TestFeature
+@Name("e2e.benchmark_metrics_exporter")
+def test(self):
+    dataset = fake_clickhouse.ExporterDataset()
+    for hosts in [int(h) for h in settings.metrics_exporter_benchmark_hosts.split(",")]:
+        chi_count = max(1, hosts // 10)
+        Scenario(
+            name=f"scrape latency with {hosts} hosts",
+            test=scrape_latency,
+        )(chi_count=chi_count, hosts_per_chi=hosts // chi_count, dataset=dataset)
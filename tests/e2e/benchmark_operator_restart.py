@@ -0,0 +1,92 @@
+import e2e.benchmark as benchmark
+import e2e.fleet as fleet
+import e2e.kubectl as kubectl
+import e2e.settings as settings
+import e2e.util as util
+import e2e.yaml_manifest as yaml_manifest
+
+from testflows.core import *
+from testflows.asserts import error
+
+chi_template = "manifests/chi/test-009-operator-upgrade-1.yaml"
+
+
+def fleet_manifests(count, template=chi_template):
+    """Write count copies of the template CHI named bench-fleet-N, returns their paths relative to tests/e2e."""
+    manifests = []
+    for i in range(count):
+        chi = yaml_manifest.thaw(yaml_manifest.get_manifest_data(util.get_full_path(template)))
+        chi["metadata"]["name"] = f"bench-fleet-{i}"
+        manifests.append(util.write_manifest(chi, f"bench-fleet-{i}"))
+    return manifests
+
+
+@TestScenario
+def operator_restart_impact(self, chi_count, version_from=None):
+    """Restart the operator, or upgrade it from version_from, with chi_count CHIs and measure what it touched."""
+    version_to = settings.operator_version
+    manifests = fleet_manifests(chi_count)
+    chis = [yaml_manifest.get_chi_name(util.get_full_path(m)) for m in manifests]
+    try:
+        if version_from is not None:
+            with Given(f"clickhouse-operator {version_from}"):
+                util.set_operator_version(version_from)
+
+        with Given(f"{chi_count} CHIs"):
+            for manifest in manifests:
+                kubectl.apply(util.get_full_path(manifest, False))
+            for chi in chis:
+                kubectl.wait_chi_status(chi, "Completed")
+                kubectl.wait_objects(chi, {"statefulset": 1, "pod": 1, "service": 2})
+
+        tracker = fleet.FleetTracker().start()
+        if version_from is None:
+            with When("operator is restarted"):
+                util.restart_operator()
+        else:
+            with When(f"operator is upgraded to {version_to}"):
+                util.set_operator_version(version_to)
+
+        with Then("all CHIs are reconciled"):
+            tracker.wait_reconciled()
+            for chi in chis:
+                kubectl.wait_chi_status(chi, "Completed")
+            report = tracker.finish()
+            tracker.note_report()
+
+        benchmark.store(
+            "operator_restart_impact",
+            params={"chis": chi_count, "version_from": version_from or version_to, "version_to": version_to},
+            results=tracker.results(),
+        )
+
+        with And("no ClickHouse pod is restarted"):
+            assert report["restarted_pods"] == {}, error()
+    finally:
+        with Finally(f"remove {chi_count} CHIs"):
+            for chi in chis:
+                kubectl.delete_chi(chi, wait=False, ok_to_fail=True)
+            for chi in chis:
+                kubectl.wait_objects(chi, {"statefulset": 0, "pod": 0, "service": 0})
+            if version_from is not None:
+                util.set_operator_version(version_to)
+
+
+@TestFeature
+@Name("e2e.benchmark_operator_restart")
+def test(self):
+    """Impact of operator restarts, and of upgrades from OPERATOR_UPGRADE_BENCHMARK_FROM when set,
+    on OPERATOR_RESTART_BENCHMARK_CHIS CHIs: reconcile duration, touched objects and restarted pods.
+    """
+    util.clean_namespace(delete_chi=True)
+    util.install_operator_if_not_exist()
+    with Given(f"Install ClickHouse template {settings.clickhouse_template}"):
+        kubectl.apply(util.get_full_path(settings.clickhouse_template, lookup_in_host=False), settings.test_namespace)
+
+    for chi_count in [int(n) for n in settings.operator_restart_benchmark_chis.split(",")]:
+        Scenario(name=f"operator restart with {chi_count} CHIs", test=operator_restart_impact)(chi_count=chi_count)
+        if settings.operator_upgrade_benchmark_from != "":
+            Scenario(
+                name=f"operator upgrade from {settings.operator_upgrade_benchmark_from} with {chi_count} CHIs",
+                test=operator_restart_impact,
+            )(chi_count=chi_count, version_from=settings.operator_upgrade_benchmark_from)
@@ -0,0 +1,221 @@
+import json
+import time
+import shlex
+import subprocess
+
+import e2e.benchmark as benchmark
+import e2e.chi_model as chi_model
+import e2e.kubectl as kubectl
+import e2e.settings as settings
+import e2e.util as util
+import e2e.yaml_manifest as yaml_manifest
+
+from testflows.core import *
+from testflows.asserts import error
+
+layout_template = "manifests/chi/test-003-complex-layout.yaml"
+
+
+def layout_manifest(shards, replicas, template=layout_template):
+    """Write a copy of the template CHI with a shards x replicas layout of named shards and replicas,
+    returns its path relative to tests/e2e."""
+    chi = yaml_manifest.thaw(yaml_manifest.get_manifest_data(util.get_full_path(template)))
+    name = f"bench-reconcile-{shards}x{replicas}"
+    chi["metadata"]["name"] = name
+    cluster = chi["spec"]["configuration"]["clusters"][0]
+    cluster["layout"] = {
+        "shards": [
+            {"name": f"shard{s}", "replicas": [{"name": f"replica{s}-{r}"} for r in range(replicas)]}
+            for s in range(shards)
+        ]
+    }
+    return util.write_manifest(chi, name)
+
+
+def kubectl_json(args, ns):
+    """Parsed `kubectl get -o json` without a testflows shell, so it can run from a background thread."""
+    cmd = f"{settings.kubectl_cmd} get {args} --namespace={ns} -o json"
+    out = subprocess.run(shlex.split(cmd), capture_output=True, text=True, timeout=60)
+    if out.returncode != 0:
+        return None
+    return json.loads(out.stdout)
+
+
+def last_task_completed(chi):
+    return (chi.get("status", {}).get("taskIDsCompleted") or [None])[0]
+
+
+class ReconcileTimeline(benchmark.Sampler):
+    """Polls the CHI, its StatefulSets and pods and records when each status or object state was first seen.
+
+    Times are seconds since start(), the resolution is the poll interval plus the kubectl round trip.
+    """
+
+    def __init__(self, chi, ns=settings.test_namespace, interval=1.0):
+        super().__init__(join_timeout=120)
+        self.chi = chi
+        self.ns = ns
+        self.interval = interval
+        # status -> first seen
+        self.statuses = {}
+        # first seen completion of a reconcile task started after start(), a CHI may be Completed before it
+        self.completed = None
+        self.task_completed_before = None
+        # StatefulSet name -> {"created": t, "ready": t}
+        self.statefulsets = {}
+        # pod name -> {"created": t, "ready": t}
+        self.pods = {}
+
+    def setup(self):
+        chi = kubectl_json(f"chi {self.chi}", self.ns)
+        if chi is not None:
+            self.task_completed_before = last_task_completed(chi)
+
+    def cleanup(self):
+        # final poll, so objects which became ready just before stop are not lost
+        if self.started_at is not None:
+            self.poll()
+
+    def run(self):
+        self.every(self.interval, self.try_poll, start=time.time() + self.interval)
+
+    def try_poll(self):
+        try:
+            self.poll()
+        except Exception as e:
+            debug(f"reconcile timeline poll failed: {e}")
+
+    def seen(self, events, key, event, t):
+        events.setdefault(key, {})
+        if event not in events[key]:
+            events[key][event] = t
+
+    def poll(self):
+        t = round(time.time() - self.started_at, 3)
+        chi = kubectl_json(f"chi {self.chi}", self.ns)
+        if chi is not None:
+            status = chi.get("status", {}).get("status", "")
+            if status != "" and status not in self.statuses:
+                self.statuses[status] = t
+            if self.completed is None and status == "Completed" and \
+                    last_task_completed(chi) not in (None, self.task_completed_before):
+                self.completed = t
+        objects = kubectl_json(f"sts,pod -l clickhouse.altinity.com/chi={self.chi}", self.ns)
+        for item in (objects or {}).get("items", []):
+            name = item["metadata"]["name"]
+            if item["kind"] == "StatefulSet":
+                self.seen(self.statefulsets, name, "created", t)
+                replicas = item["spec"].get("replicas", 1)
+                if replicas and item.get("status", {}).get("readyReplicas", 0) == replicas:
+                    self.seen(self.statefulsets, name, "ready", t)
+            elif item["kind"] == "Pod":
+                self.seen(self.pods, name, "created", t)
+                conditions = item.get("status", {}).get("conditions", []) or []
+                if any(c["type"] == "Ready" and c["status"] == "True" for c in conditions):
+                    self.seen(self.pods, name, "ready", t)
+
+    def hosts(self):
+        """{host: {sts_created, pod_created, pod_ready, sts_ready}}, a host is named after its StatefulSet."""
+        return {
+            name: {
+                "sts_created": sts.get("created"),
+                "pod_created": self.pods.get(f"{name}-0", {}).get("created"),
+                "pod_ready": self.pods.get(f"{name}-0", {}).get("ready"),
+                "sts_ready": sts.get("ready"),
+            }
+            for name, sts in sorted(self.statefulsets.items())
+        }
+
+
+@TestScenario
+def reconcile_latency(self, shards, replicas):
+    """Measure apply -> InProgress -> every StatefulSet ready -> Completed for a CHI of shards x replicas hosts."""
+    manifest = layout_manifest(shards, replicas)
+    chi = yaml_manifest.get_chi_name(util.get_full_path(manifest))
+    object_counts = chi_model.expected_object_counts(manifest, kinds=("statefulset", "pod", "service"))
+    timeline = ReconcileTimeline(chi)
+    deleted = False
+
+    try:
+        with When(f"CHI with {shards} shards and {replicas} replicas is created"):
+            timeline.start()
+            kubectl.create_and_check(
+                manifest=manifest,
+                check={
+                    "object_counts": object_counts,
+                    "do_not_delete": 1,
+                },
+                timeout=3600,
+            )
+            wall = time.time() - timeline.started_at
+            timeline.stop()
+
+        with Then("every host has become ready"):
+            hosts = timeline.hosts()
+            for host, events in hosts.items():
+                note(f"{host}: {events}")
+            for status in ("InProgress", "Completed"):
+                if status not in timeline.statuses:
+                    note(f"status {status} was not observed, polled every {timeline.interval}s")
+            assert len(hosts) == object_counts["statefulset"], error()
+            assert all(events["sts_ready"] is not None for events in hosts.values()), error()
+
+        sts_ready = [events["sts_ready"] for events in hosts.values()]
+        per_host = [events["sts_ready"] - events["sts_created"] for events in hosts.values()]
+        results = {
+            "hosts": len(hosts),
+            # None when the poll missed the status, compare() skips it
+            "to_in_progress_s": timeline.statuses.get("InProgress"),
+            "to_completed_s": timeline.statuses.get("Completed"),
+            "create_and_check_s": wall,
+            "first_sts_ready_s": min(sts_ready),
+            "last_sts_ready_s": max(sts_ready),
+            "sts_ready_p50_s": benchmark.percentile(sts_ready, 50),
+            "host_reconcile_avg_s": sum(per_host) / len(per_host),
+            "host_reconcile_max_s": max(per_host),
+        }
+
+        with When("CHI is deleted"):
+            start = time.time()
+            kubectl.delete_chi(chi)
+            results["delete_s"] = time.time() - start
+            deleted = True
+
+        record = benchmark.store(
+            "reconcile_latency",
+            params={"shards": shards, "replicas": replicas, "clickhouse_version": settings.clickhouse_version},
+            results=results,
+        )
+        with open(benchmark.results_file("reconcile_latency_timelines"), "a") as f:
+            f.write(json.dumps({
+                "timestamp": record["timestamp"],
+                "operator_version": record["operator_version"],
+                "params": record["params"],
+                "statuses": timeline.statuses,
+                "hosts": hosts,
+            }, sort_keys=True) + "\n")
+    finally:
+        timeline.stop()
+        if not deleted:
+            with Finally(f"remove {chi}"):
+                kubectl.delete_chi(chi, ok_to_fail=True)
+
+
+@TestFeature
+@Name("e2e.benchmark_reconcile")
+def test(self):
+    """Reconcile latency of CHIs with RECONCILE_BENCHMARK_LAYOUTS layouts, against the current kubectl context.
+
+    Results are stored per operator version, so runs against kind or k3d before and after an operator
+    change can be compared, per host timelines go to reconcile_latency_timelines.jsonl.
+    """
+    util.clean_namespace(delete_chi=True)
+    util.install_operator_if_not_exist()
+    with Given(f"Install ClickHouse template {settings.clickhouse_template}"):
+        kubectl.apply(util.get_full_path(settings.clickhouse_template, lookup_in_host=False), settings.test_namespace)
+
+    for layout in settings.reconcile_benchmark_layouts.split(","):
+        shards, replicas = [int(n) for n in layout.strip().split("x")]
+        Scenario(name=f"reconcile latency {shards} shards {replicas} replicas", test=reconcile_latency)(
+            shards=shards, replicas=replicas,
+        )
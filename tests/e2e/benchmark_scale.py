@@ -0,0 +1,167 @@
+import os
+import csv
+import time
+import datetime
+
+import e2e.benchmark as benchmark
+import e2e.benchmark_reconcile as benchmark_reconcile
+import e2e.chi_model as chi_model
+import e2e.clickhouse as clickhouse
+import e2e.fleet as fleet
+import e2e.kubectl as kubectl
+import e2e.normalizer as normalizer
+import e2e.schema as schema
+import e2e.settings as settings
+import e2e.util as util
+import e2e.yaml_manifest as yaml_manifest
+
+from testflows.core import *
+from testflows.asserts import error
+
+chi_template = "manifests/chi/test-013-add-shards-1.yaml"
+chi_name = "bench-scale"
+database = "bench_scale"
+schema_objects = [("table", f"{database}.{name}") for name in ("test_local", "test_distr", "events_distr")]
+
+csv_columns = [
+    "step", "shards_from", "shards_to", "hosts", "reconcile_s", "first_sts_created_s", "last_sts_created_s",
+    "last_sts_ready_s", "schema_ready_s", "schema_checks", "touched_objects", "restarted_pods",
+]
+
+
+def shards_manifest(shards, template=chi_template):
+    """Write the template CHI with shardsCount = shards, returns its path relative to tests/e2e."""
+    chi = yaml_manifest.thaw(yaml_manifest.get_manifest_data(util.get_full_path(template)))
+    chi["metadata"]["name"] = chi_name
+    chi["spec"]["configuration"]["clusters"][0]["layout"]["shardsCount"] = shards
+    return util.write_manifest(chi, f"{chi_name}-{shards}")
+
+
+def wait_schema(chi, pods, started_at, timeout=600):
+    """Seconds since started_at until all pods have all schema objects, None on timeout, and number of checks."""
+    checks = 0
+    while time.time() - started_at < timeout:
+        checks += 1
+        snap = schema.snapshot(chi)
+        missing = [pod for pod in pods if schema.missing_objects(snap, pod, schema_objects)]
+        if not missing:
+            return round(time.time() - started_at, 3), checks
+        debug(f"schema is not ready on {missing}")
+        time.sleep(1)
+    return None, checks
+
+
+@TestScenario
+def scale_step(self, step, shards_from, shards_to, rows):
+    """Reconcile shards_from -> shards_to shards, appends a CSV row to rows."""
+    manifest = shards_manifest(shards_to)
+    pods = [host["pod"] for host in normalizer.normalize(manifest)["hosts"]]
+    object_counts = chi_model.expected_object_counts(manifest, kinds=("statefulset", "pod", "service"))
+    tracker = fleet.FleetTracker().start()
+    existing = set(tracker.before["statefulsets"])
+    timeline = benchmark_reconcile.ReconcileTimeline(chi_name)
+
+    try:
+        with When(f"CHI is scaled from {shards_from} to {shards_to} shards"):
+            timeline.start()
+            kubectl.create_and_check(
+                manifest=manifest,
+                check={
+                    "object_counts": object_counts,
+                    "do_not_delete": 1,
+                },
+                timeout=1500,
+            )
+    finally:
+        timeline.stop()
+
+    hosts = timeline.hosts()
+    if timeline.completed is None:
+        note("completion of the reconcile task was not observed")
+    with Then("schema objects are on every host"):
+        schema_ready, schema_checks = wait_schema(chi_name, pods, timeline.started_at)
+        assert schema_ready is not None, error()
+
+    report = tracker.finish()
+    # pods of removed shards are deleted by design
+    restarted = {pod: reason for pod, reason in report["restarted_pods"].items() if pod in pods}
+    with And("unaffected pods are not restarted"):
+        for pod, reason in restarted.items():
+            note(f"{pod} restarted: {reason}")
+        assert restarted == {}, error()
+
+    created = [events["sts_created"] for host, events in hosts.items() if host not in existing]
+    ready = [events["sts_ready"] for host, events in hosts.items() if host not in existing and events["sts_ready"] is not None]
+    rows.append({
+        "step": step,
+        "shards_from": shards_from,
+        "shards_to": shards_to,
+        "hosts": len(pods),
+        "reconcile_s": timeline.completed if timeline.completed is not None else "",
+        "first_sts_created_s": min(created, default=""),
+        "last_sts_created_s": max(created, default=""),
+        "last_sts_ready_s": max(ready, default=""),
+        "schema_ready_s": schema_ready,
+        "schema_checks": schema_checks,
+        "touched_objects": len(report["touched"]),
+        "restarted_pods": len(restarted),
+    })
+
+
+@TestFeature
+@Name("e2e.benchmark_scale")
+def test(self):
+    """Scale a test_013 style CHI through SCALE_BENCHMARK_SHARDS shard counts and back, timing StatefulSet
+    creation, schema propagation to new shards and checking old pods are not restarted at each step.
+
+    Rows are written to scale-<timestamp>.csv in the benchmark results directory.
+    """
+    util.clean_namespace(delete_chi=True)
+    util.install_operator_if_not_exist()
+    with Given(f"Install ClickHouse template {settings.clickhouse_template}"):
+        kubectl.apply(util.get_full_path(settings.clickhouse_template, lookup_in_host=False), settings.test_namespace)
+
+    steps = [int(n) for n in settings.scale_benchmark_shards.split(",")]
+    steps = steps + steps[-2::-1]
+    os.makedirs(settings.benchmark_results_dir, exist_ok=True)
+    timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    csv_file = os.path.join(settings.benchmark_results_dir, f"scale-{timestamp}.csv")
+
+    try:
+        with Given(f"CHI with {steps[0]} shards and schema objects"):
+            kubectl.create_and_check(
+                manifest=shards_manifest(steps[0]),
+                check={"do_not_delete": 1},
+            )
+            clickhouse.query(chi_name, f"CREATE DATABASE {database}")
+            clickhouse.query(chi_name, f"CREATE TABLE {database}.test_local Engine = Log AS SELECT * FROM system.one")
+            clickhouse.query(
+                chi_name,
+                f"CREATE TABLE {database}.test_distr Engine = Distributed('all-sharded', {database}, test_local)"
+            )
+            clickhouse.query(
+                chi_name,
+                f"CREATE TABLE {database}.events_distr as system.events ENGINE = Distributed('all-sharded', system, events)"
+            )
+
+        with open(csv_file, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=csv_columns)
+            writer.writeheader()
+            rows = []
+            for step, (shards_from, shards_to) in enumerate(zip(steps, steps[1:]), start=1):
+                Scenario(name=f"step {step}: {shards_from} -> {shards_to} shards", test=scale_step)(
+                    step=step, shards_from=shards_from, shards_to=shards_to, rows=rows,
+                )
+                row = rows[-1]
+                writer.writerow(row)
+                f.flush()
+                benchmark.store(
+                    "scale",
+                    params={"shards_from": shards_from, "shards_to": shards_to,
+                            "clickhouse_version": settings.clickhouse_version},
+                    results={k: v for k, v in row.items() if isinstance(v, (int, float)) and k != "step"},
+                )
+        note(f"scale steps are written to {csv_file}")
+    finally:
+        with Finally(f"remove {chi_name}"):
+            kubectl.delete_chi(chi_name, ok_to_fail=True)
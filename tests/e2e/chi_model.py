@@ -0,0 +1,68 @@
+"""Expected Kubernetes objects of a ClickHouseInstallation, computed from manifests without a cluster.
+
+Counts StatefulSets, Pods, Services, PersistentVolumeClaims and ConfigMaps the operator creates for a CHI
+normalized by e2e.normalizer:
+
+    chi_model.expected_object_counts("manifests/chi/test-012-service-template.yaml")
+    {'statefulset': 2, 'pod': 2, 'service': 4, 'pvc': 0, 'configmap': 4}
+"""
+import os
+import functools
+
+import e2e.normalizer as normalizer
+import e2e.yaml_manifest as yaml_manifest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+object_kinds = ("statefulset", "pod", "service", "pvc", "configmap")
+
+
+def expected_objects(chi, chits=()):
+    """{kind: count} of objects created for the parsed CHI, chits are parsed CHITs installed in the cluster."""
+    normalized = normalizer.expand(chi, chits)
+    spec = normalized["spec"]
+    service_templates = normalized["serviceTemplates"]
+    defaults = (spec.get("defaults", {}) or {}).get("templates", {}) or {}
+    clusters = (spec.get("configuration", {}) or {}).get("clusters", []) or [{"name": "cluster"}]
+    stopped = normalized["stopped"]
+
+    counts = dict.fromkeys(object_kinds, 0)
+    # CHI service is created from defaults.templates.serviceTemplate or the default one, stopped CHI has no entry point
+    counts["service"] = 0 if stopped else 1
+    # common and common users configmaps
+    counts["configmap"] = 2
+    for cluster in clusters:
+        if normalizer.template_names(cluster.get("templates"), defaults).get("clusterServiceTemplate") in service_templates:
+            counts["service"] += 1
+    shard_services = set()
+    for host in normalized["hosts"]:
+        if host["templates"].get("shardServiceTemplate") in service_templates:
+            shard_services.add((host["cluster"], host["shardIndex"]))
+        counts["statefulset"] += 1
+        # StatefulSets of stopped CHI are scaled to 0
+        counts["pod"] += 0 if stopped else 1
+        # host service is created from replicaServiceTemplate or the default one
+        counts["service"] += 1
+        counts["configmap"] += 1
+        counts["pvc"] += len(host["volumeClaims"])
+    counts["service"] += len(shard_services)
+    return counts
+
+
+@functools.lru_cache(maxsize=None)
+def _expected_object_counts(manifest, templates, _mtimes):
+    chi = yaml_manifest.get_manifest_data(manifest)
+    chits = [yaml_manifest.get_manifest_data(t) for t in templates]
+    return expected_objects(chi, chits)
+
+
+def expected_object_counts(manifest, templates=(), kinds=object_kinds):
+    """Expected objects of a CHI manifest, in the format of kubectl.count_objects().
+
+    manifest and templates are paths relative to tests/e2e as used by kubectl.create_and_check(),
+    templates are CHIT manifests installed in the cluster, e.g. check["apply_templates"].
+    Results are cached until one of the files changes.
+    """
+    paths = [os.path.join(current_dir, p) for p in [manifest] + list(templates)]
+    counts = _expected_object_counts(paths[0], tuple(paths[1:]), tuple(os.stat(p).st_mtime_ns for p in paths))
+    return {kind: counts[kind] for kind in kinds}
@@ -42,7 +42,7 @@ def query(
             f"exec {pod_name} -n {ns} -c {container}"
             f" -- "
             f"clickhouse-client -mn -h {host} --port={port} {user_str} {pwd_str} {advanced_params}"
-            f"--query=\"{sql}\"",
+            f" --query=\"{sql}\"",
             timeout=timeout,
             ns=ns,
         )
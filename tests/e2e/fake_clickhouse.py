@@ -0,0 +1,594 @@
+import re
+import json
+import time
+import threading
+import urllib.parse
+
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# result of a rule handler, types are ClickHouse type names used by *WithNamesAndTypes formats
+Result = namedtuple("Result", ["columns", "types", "rows"])
+
+format_re = re.compile(r"\s+FORMAT\s+(\w+)\s*;?\s*$", re.IGNORECASE)
+whitespace_re = re.compile(r"\s+")
+exception_code_re = re.compile(r"^Code: (\d+)")
+
+
+def normalize_sql(sql):
+    return whitespace_re.sub(" ", sql).strip().rstrip(";").strip()
+
+
+def split_format(sql, default="TabSeparated"):
+    m = format_re.search(sql)
+    if m is None:
+        return sql, default
+    return sql[:m.start()], m.group(1)
+
+
+def escape_tsv(value):
+    value = "\\N" if value is None else str(value)
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def render(result, fmt):
+    if isinstance(result, str):
+        return result
+    columns, types, rows = result
+    if fmt in ("TabSeparated", "TSV", "TabSeparatedWithNames", "TSVWithNames",
+               "TabSeparatedWithNamesAndTypes", "TSVWithNamesAndTypes"):
+        lines = []
+        if "WithNames" in fmt:
+            lines.append("\t".join(escape_tsv(c) for c in columns))
+        if "AndTypes" in fmt:
+            lines.append("\t".join(escape_tsv(t) for t in types))
+        lines.extend("\t".join(escape_tsv(v) for v in row) for row in rows)
+        return "".join(line + "\n" for line in lines)
+    if fmt == "JSONEachRow":
+        return "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+    raise ValueError(f"Unsupported format {fmt}")
+
+
+class ExporterDataset(object):
+    """Synthetic system tables content for the metrics-exporter queries, see pkg/apis/metrics/clickhouse_fetcher.go.
+
+    Sizes control the number of series each host contributes to /metrics.
+    """
+    def __init__(self, metrics=100, events=100, asynchronous_metrics=100, tables=10, disks=1, replicated_tables=None,
+                 mutations=0, detached_parts=0):
+        self.metrics = metrics
+        self.events = events
+        self.asynchronous_metrics = asynchronous_metrics
+        self.tables = tables
+        self.disks = disks
+        self.replicated_tables = tables if replicated_tables is None else replicated_tables
+        self.mutations = mutations
+        self.detached_parts = detached_parts
+
+    def series_per_host(self):
+        """Number of series metrics-exporter produces for one host with this dataset."""
+        return (
+            self.asynchronous_metrics + self.metrics + self.events + 3
+            + 5 * self.tables + 2
+            + self.replicated_tables
+            + 2 * self.mutations
+            + 2 * self.disks
+            + self.detached_parts
+            # metric_fetch_errors, one per fetch type
+            + 7
+        )
+
+    def rules(self):
+        return [
+            (r"FROM system\.asynchronous_metrics .* FROM system\.metrics .* FROM system\.events", self.query_metrics),
+            (r"FROM system\.parts GROUP BY active, database, table", self.query_parts),
+            (r"is_session_expired.* FROM system\.replicas", self.query_replicas),
+            (r"FROM system\.mutations WHERE is_done = 0", self.query_mutations),
+            (r"free_space.* FROM system\.disks", self.query_disks),
+            (r"FROM system\.detached_parts", self.query_detached_parts),
+        ]
+
+    def query_metrics(self, sql, host):
+        rows = [(f"metric.AsyncMetric{i}", str(i), "", "gauge") for i in range(self.asynchronous_metrics)]
+        rows += [(f"metric.Metric{i}", str(i), "", "gauge") for i in range(self.metrics)]
+        rows += [(f"event.Event{i}", str(i * 10), "", "counter") for i in range(self.events)]
+        rows += [
+            ("metric.MemoryDictionaryBytesAllocated", "0", "Memory size allocated for dictionaries", "gauge"),
+            ("metric.LongestRunningQuery", "0", "Longest running query time", "gauge"),
+            ("metric.ChangedSettingsHash", "0", "Control sum for changed settings", "gauge"),
+        ]
+        return Result(["metric", "value", "description", "type"], ["String"] * 4, rows)
+
+    def query_parts(self, sql, host):
+        rows = [
+            ("default", f"table_{i}", "1", "1", "3", "1024", "4096", "100", "1024", "64")
+            for i in range(self.tables)
+        ]
+        return Result(
+            ["database", "table", "active", "partitions", "parts", "bytes", "uncompressed_bytes", "rows",
+             "metric_DiskDataBytes", "metric_MemoryPrimaryKeyBytesAllocated"],
+            ["String"] * 10, rows,
+        )
+
+    def query_replicas(self, sql, host):
+        rows = [("default", f"table_{i}", "0") for i in range(self.replicated_tables)]
+        return Result(["database", "table", "is_session_expired"], ["String"] * 3, rows)
+
+    def query_mutations(self, sql, host):
+        rows = [("default", f"table_{i}", 1, 1) for i in range(self.mutations)]
+        return Result(["database", "table", "mutations", "parts_to_do"], ["UInt64"] * 4, rows)
+
+    def query_disks(self, sql, host):
+        rows = [(f"disk_{i}" if i else "default", str(1 << 30), str(1 << 32)) for i in range(self.disks)]
+        return Result(["name", "free_space", "total_space"], ["String"] * 3, rows)
+
+    def query_detached_parts(self, sql, host):
+        rows = [(1, "default", f"table_{i}", "default", "broken") for i in range(self.detached_parts)]
+        return Result(["detached_parts", "database", "table", "disk", "detach_reason"],
+                      ["UInt64", "String", "String", "String", "String"], rows)
+
+
+class ConnectionDropped(Exception):
+    pass
+
+
+class Fault(object):
+    """Injected latency and/or error for queries matching `pattern`, applied `times` times or forever when None."""
+    def __init__(self, pattern=".*", latency=0.0, error=None, drop_connection=False, times=None):
+        self.pattern = re.compile(pattern, re.IGNORECASE | re.DOTALL)
+        self.latency = latency
+        self.error = error
+        self.drop_connection = drop_connection
+        self.times = times
+        # requests are handled by concurrent threads, `times` is checked and decremented under the lock
+        self.lock = threading.Lock()
+
+    def apply(self, sql):
+        if self.times is not None:
+            with self.lock:
+                if self.times <= 0:
+                    return
+                self.times -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.drop_connection:
+            raise ConnectionDropped()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+
+
+select_re = re.compile(
+    r"^SELECT (?P<columns>.+?) FROM "
+    r"(?:(?P<function>cluster|clusterAllReplicas)\(\s*'?(?P<cluster>[\w.-]+)'?\s*,\s*(?P<function_table>[\w.]+)\s*\)"
+    r"|(?P<table>system\.\w+))"
+    r"(?: WHERE (?P<where>.+?))?(?: SETTINGS .+)?$",
+    re.IGNORECASE,
+)
+condition_re = re.compile(r"^\s*(\w+)\s*(=|!=|<>|>=|<=|>|<)\s*(?:'((?:[^'\\]|\\.)*)'|(-?[\d.]+))\s*$")
+in_re = re.compile(r"^\s*(\w+)\s+(NOT\s+)?(IN|LIKE)\s+(.+?)\s*$", re.IGNORECASE)
+not_re = re.compile(r"^\s*NOT\s+(\w+)\s*$", re.IGNORECASE)
+union_re = re.compile(r"\s+UNION ALL\s+", re.IGNORECASE)
+call_re = re.compile(r"^(?P<name>\w+)\((?P<args>.*)\)$")
+number_re = re.compile(r"^-?\d+(\.\d+)?$")
+column_re = re.compile(r"^(?P<expr>.+?)(?:\s+AS\s+(?P<alias>\w+))?$", re.IGNORECASE)
+function_re = re.compile(r"^(?P<name>\w+)\((?P<arg>[\w*]*)\)$")
+aggregate_functions = ("count", "groupArray", "sum", "min", "max", "any")
+
+
+def split_top_level(text, separator=","):
+    parts, depth, current, quoted = [], 0, "", False
+    for c in text:
+        if c == "'":
+            quoted = not quoted
+        elif not quoted and c == "(":
+            depth += 1
+        elif not quoted and c == ")":
+            depth -= 1
+        if c == separator and depth == 0 and not quoted:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += c
+    parts.append(current.strip())
+    return parts
+
+
+def format_array(values):
+    return "[" + ",".join(str(v) if isinstance(v, (int, float)) else f"'{v}'" for v in values) + "]"
+
+
+def evaluate(expr, row):
+    """Value of a column expression: column, 'string', number, hostName(), concat(...) or if(condition, a, b)."""
+    expr = expr.strip()
+    if expr.startswith("'") and expr.endswith("'"):
+        return re.sub(r"\\(.)", r"\1", expr[1:-1])
+    if number_re.match(expr):
+        return float(expr) if "." in expr else int(expr)
+    c = call_re.match(expr)
+    if c is None:
+        return row.get(expr)
+    name, args = c.group("name"), split_top_level(c.group("args")) if c.group("args").strip() else []
+    if name == "hostName":
+        return row["_host"]
+    if name == "concat":
+        return "".join(str(evaluate(arg, row)) for arg in args)
+    if name == "if" and len(args) == 3:
+        return evaluate(args[1], row) if matches(args[0], row) else evaluate(args[2], row)
+    raise LookupError(f"Code: 46. DB::Exception: unsupported function in fake: {expr}")
+
+
+def matches(condition, row):
+    """Whether the row satisfies one condition of WHERE: `c op v`, `c [NOT] IN (...)`, `c [NOT] LIKE '...'` or `NOT c`."""
+    c = condition_re.match(condition)
+    if c is not None:
+        value = c.group(3) if c.group(3) is not None else float(c.group(4))
+        return compare_values(row.get(c.group(1)), c.group(2), value)
+    c = in_re.match(condition)
+    if c is not None:
+        actual, negate, op, operand = row.get(c.group(1)), c.group(2) is not None, c.group(3).upper(), c.group(4)
+        if op == "IN":
+            result = actual in [evaluate(v, row) for v in split_top_level(operand.strip()[1:-1])]
+        else:
+            pattern = "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in evaluate(operand, row))
+            result = re.fullmatch(pattern, str(actual), re.DOTALL) is not None
+        return result != negate
+    c = not_re.match(condition)
+    if c is not None:
+        return not row.get(c.group(1))
+    raise LookupError(f"Code: 62. DB::Exception: unsupported condition in fake: {condition}")
+
+
+def compare_values(actual, op, expected):
+    if isinstance(actual, (int, float)) and not isinstance(expected, (int, float)):
+        expected = float(expected)
+    elif isinstance(expected, (int, float)) and not isinstance(actual, (int, float)):
+        actual = float(actual)
+    return {
+        "=": actual == expected, "!=": actual != expected, "<>": actual != expected,
+        ">": actual > expected, "<": actual < expected, ">=": actual >= expected, "<=": actual <= expected,
+    }[op]
+
+
+class FakeClickHouse(object):
+    """Local stand-in for the ClickHouse HTTP interface.
+
+    Queries are matched against `rules`, a list of (regexp, handler) pairs checked in order against
+    whitespace-normalized SQL. Handler is called as handler(sql, host) and returns a Result or a raw string.
+    Queries no rule matched are answered from `tables` by a small engine which understands
+    `SELECT columns|*|count()|groupArray(c) FROM system.t|cluster('c', system.t) [WHERE c = v AND ...]`
+    and UNION ALL of such queries, see evaluate() and matches() for the supported expressions.
+    """
+    def __init__(self, rules=None, host="127.0.0.1", port=0, name=None):
+        self.rules = []
+        self.queries = []
+        self.faults = []
+        # table name -> (columns, rows or callable returning rows)
+        self.tables = {}
+        # set by FakeClickHouseFleet, used to evaluate cluster() and clusterAllReplicas()
+        self.fleet = None
+        self.lock = threading.Lock()
+        self.name = host if name is None else name
+        # answered by hostName(), the name when None, operator-created hosts are named by the pod
+        self.pod = None
+        for pattern, handler in rules or []:
+            self.add_rule(pattern, handler)
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_rule(self, pattern, handler, first=False):
+        rule = (re.compile(pattern, re.IGNORECASE | re.DOTALL), handler)
+        with self.lock:
+            if first:
+                self.rules.insert(0, rule)
+            else:
+                self.rules.append(rule)
+
+    def set_table(self, name, columns, rows):
+        with self.lock:
+            self.tables[name] = (list(columns), rows)
+
+    def set_metric(self, metric, value):
+        """Set value of `metric` in system.metrics, e.g. set_metric("ReadonlyReplica", 1)."""
+        with self.lock:
+            columns, rows = self.tables.setdefault("system.metrics", (["metric", "value", "description"], []))
+            for row in rows:
+                if row[0] == metric:
+                    row[1] = value
+                    return
+            rows.append([metric, value, ""])
+
+    def inject(self, pattern=".*", latency=0.0, error=None, drop_connection=False, times=None):
+        """Delay, fail or drop the connection of matching queries. Returns the Fault, which may be passed to clear_faults()."""
+        fault = Fault(pattern, latency, error, drop_connection, times)
+        with self.lock:
+            self.faults.append(fault)
+        return fault
+
+    def clear_faults(self, fault=None):
+        with self.lock:
+            self.faults = [] if fault is None else [f for f in self.faults if f is not fault]
+
+    def execute(self, sql):
+        sql, fmt = split_format(normalize_sql(sql))
+        with self.lock:
+            self.queries.append(sql)
+            rules = list(self.rules)
+            faults = [f for f in self.faults if f.pattern.search(sql)]
+        for fault in faults:
+            fault.apply(sql)
+        for pattern, handler in rules:
+            if pattern.search(sql):
+                return render(handler(sql, self.name), fmt)
+        return render(self.select(sql), fmt)
+
+    def table_rows(self, table):
+        """Rows of a local table as list of dicts with hostName() added as `_host`."""
+        with self.lock:
+            if table not in self.tables:
+                raise LookupError(f"Code: 60. DB::Exception: Table {table} doesn't exist. (UNKNOWN_TABLE)")
+            columns, rows = self.tables[table]
+        rows = rows() if callable(rows) else rows
+        host = self.pod or self.name
+        return columns, [dict(zip(columns, row), _host=host) for row in rows]
+
+    def cluster_hosts(self, cluster, all_replicas):
+        _, rows = self.table_rows("system.clusters")
+        hosts = {}
+        for row in rows:
+            if row["cluster"] != cluster:
+                continue
+            if all_replicas or row["shard_num"] not in hosts:
+                hosts[(row["shard_num"], row["replica_num"]) if all_replicas else row["shard_num"]] = row["host_name"]
+        if not hosts:
+            raise LookupError(f"Code: 701. DB::Exception: Requested cluster '{cluster}' not found. (CLUSTER_DOESNT_EXIST)")
+        return [hosts[k] for k in sorted(hosts)]
+
+    def select(self, sql):
+        """Result of sql, every SELECT of a UNION ALL is evaluated separately and names the columns of the first."""
+        results = [self.select_one(part) for part in union_re.split(sql)]
+        return Result(results[0].columns, results[0].types, [row for r in results for row in r.rows])
+
+    def select_one(self, sql):
+        m = select_re.match(sql)
+        if m is None:
+            raise LookupError(f"Code: 62. DB::Exception: no fake rule for query: {sql}")
+
+        if m.group("function"):
+            table = m.group("function_table")
+            columns, rows = None, []
+            for host in self.cluster_hosts(m.group("cluster"), m.group("function") == "clusterAllReplicas"):
+                remote = self if host == self.name else self.fleet.servers[host]
+                if remote is not self:
+                    with remote.lock:
+                        faults = [f for f in remote.faults if f.pattern.search(sql)]
+                    for fault in faults:
+                        fault.apply(sql)
+                columns, host_rows = remote.table_rows(table)
+                rows.extend(host_rows)
+        else:
+            columns, rows = self.table_rows(m.group("table"))
+
+        if m.group("where"):
+            for condition in re.split(r"\s+AND\s+", m.group("where"), flags=re.IGNORECASE):
+                rows = [row for row in rows if matches(condition, row)]
+
+        return self.project(m.group("columns"), columns, rows)
+
+    def project(self, columns_sql, columns, rows):
+        result_columns, getters, aggregate = [], [], False
+        for item in split_top_level(columns_sql):
+            if item == "*":
+                for c in columns:
+                    result_columns.append(c)
+                    getters.append((None, c))
+                continue
+            c = column_re.match(item)
+            expr, alias = c.group("expr").strip(), c.group("alias")
+            f = function_re.match(expr)
+            if f is not None and f.group("name") in aggregate_functions:
+                aggregate = True
+                getters.append((f.group("name"), f.group("arg")))
+            else:
+                getters.append((None, expr))
+            result_columns.append(alias or expr)
+
+        if aggregate:
+            row = []
+            for function, arg in getters:
+                values = [r.get(arg) for r in rows] if arg not in ("", "*") else rows
+                if function == "count":
+                    row.append(len(rows))
+                elif function == "groupArray":
+                    row.append(format_array(values))
+                elif function == "sum":
+                    row.append(sum(values))
+                elif function == "min":
+                    row.append(min(values) if values else 0)
+                elif function == "max":
+                    row.append(max(values) if values else 0)
+                elif function == "any":
+                    row.append(values[0] if values else "")
+                else:
+                    row.append(evaluate(arg, rows[0]) if rows else "")
+            result_rows = [row]
+        else:
+            result_rows = [[evaluate(arg, r) for _, arg in getters] for r in rows]
+        types = ["UInt64" if result_rows and isinstance(v, int) else "String" for v in (result_rows[0] if result_rows else result_columns)]
+        return Result(result_columns, types, result_rows)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"fake-clickhouse-{self.name}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+
+class FakeClickHouseFleet(object):
+    """Set of FakeClickHouse servers, one per host name.
+
+    With port=0 every host listens on an ephemeral port of 127.0.0.1. With a fixed port every host
+    gets its own loopback address 127.0.0.N, so a locally running metrics-exporter configured with
+    this port can reach all of them by address. Servers are addressed by `hostnames` when given.
+    """
+    def __init__(self, count=0, rules=None, port=0, hostnames=None):
+        self.servers = {}
+        # path -> list of children names, shared by all hosts like a single keeper ensemble
+        self.znodes = {"/": ["clickhouse", "zookeeper"], "/clickhouse": [], "/zookeeper": []}
+        hostnames = list(hostnames) if hostnames is not None else [None] * count
+        for i, hostname in enumerate(hostnames):
+            address = "127.0.0.1" if port == 0 else f"127.0.{(i + 2) // 256}.{(i + 2) % 256}"
+            server = FakeClickHouse(rules=rules, host=address, port=port)
+            if hostname is not None:
+                server.name = hostname
+            elif port != 0:
+                server.name = address
+            else:
+                server.name = f"127.0.0.1:{server.server.server_address[1]}"
+            server.fleet = self
+            server.set_table("system.zookeeper", ["name", "value", "path"], self._znode_rows)
+            self.servers[server.name] = server
+
+    @classmethod
+    def for_chi(cls, chi_name, shards=1, replicas=1, cluster="default", namespace="test", rules=None, port=0):
+        """Fleet with hosts named like operator-created ones and system.clusters, system.metrics,
+        system.replicas and system.parts populated for clusters `cluster`, `all-sharded` and `all-replicated`.
+
+        Servers are keyed by host name, e.g. chi-x-default-0-0, hostName() answers the pod name chi-x-default-0-0-0.
+        """
+        layout = [(s, r) for s in range(shards) for r in range(replicas)]
+        hostnames = [f"chi-{chi_name}-{cluster}-{s}-{r}" for s, r in layout]
+        fleet = cls(rules=rules, port=port, hostnames=hostnames)
+
+        clusters = []
+        for i, (s, r) in enumerate(layout):
+            clusters.append([cluster, s + 1, r + 1, hostnames[i]])
+            clusters.append(["all-sharded", i + 1, 1, hostnames[i]])
+            clusters.append(["all-replicated", 1, i + 1, hostnames[i]])
+        for hostname, server in fleet.servers.items():
+            server.pod = f"{hostname}-0"
+            server.set_table(
+                "system.clusters",
+                ["cluster", "shard_num", "replica_num", "host_name", "host_address", "port", "is_local"],
+                [[c, s, r, h, "127.0.0.1", 9000, int(h == hostname)] for c, s, r, h in clusters],
+            )
+            server.set_table("system.metrics", ["metric", "value", "description"], [
+                ["ReadonlyReplica", 0, "Number of Replicated tables that are currently in readonly state"],
+                ["Query", 0, "Number of executing queries"],
+                ["TCPConnection", 0, "Number of connections to TCP server"],
+            ])
+            server.set_table("system.replicas", [
+                "database", "table", "is_readonly", "is_session_expired", "total_replicas", "active_replicas",
+            ], [])
+            server.set_table("system.parts", [
+                "database", "table", "partition", "name", "active", "rows", "bytes_on_disk",
+            ], [])
+            server.set_table("system.tables", ["database", "name", "engine", "uuid", "is_temporary"], [])
+            server.set_table("system.one", ["dummy"], [[0]])
+            server.set_table("system.databases", ["name", "engine"], [["default", "Atomic"], ["system", "Atomic"]])
+            server.set_table("system.dictionaries", ["database", "name", "status"], [])
+        return fleet
+
+    def _znode_rows(self):
+        return [[child, "", path] for path, children in self.znodes.items() for child in children]
+
+    def add_znode(self, path):
+        parent, _, name = path.rstrip("/").rpartition("/")
+        parent = parent or "/"
+        if parent not in self.znodes:
+            self.add_znode(parent)
+        if name not in self.znodes[parent]:
+            self.znodes[parent].append(name)
+        self.znodes.setdefault(path, [])
+
+    def inject(self, pattern=".*", latency=0.0, error=None, drop_connection=False, times=None):
+        return [server.inject(pattern, latency, error, drop_connection, times) for server in self.servers.values()]
+
+    def clear_faults(self):
+        for server in self.servers.values():
+            server.clear_faults()
+
+    @property
+    def hostnames(self):
+        return list(self.servers.keys())
+
+    def url_for(self, hostname):
+        return self.servers[hostname].url
+
+    def kubectl_env(self):
+        """Environment of e2e.fake_kubectl which routes clickhouse-client of every host to its own server."""
+        return {"FAKE_CLICKHOUSE_URLS": json.dumps({name: server.url for name, server in self.servers.items()})}
+
+    def start(self):
+        for server in self.servers.values():
+            server.start()
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+
+def _make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, code, body):
+            body = body.encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "text/tab-separated-values; charset=UTF-8")
+            self.send_header("Content-Length", str(len(body)))
+            if code != 200:
+                m = exception_code_re.match(body.decode())
+                self.send_header("X-ClickHouse-Exception-Code", m.group(1) if m else "1001")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _dispatch(self):
+            url = urllib.parse.urlsplit(self.path)
+            params = urllib.parse.parse_qs(url.query)
+            if url.path == "/ping":
+                return self._reply(200, "Ok.\n")
+            sql = params.get("query", [""])[0]
+            if self.command == "POST":
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode()
+                sql = f"{sql}\n{body}" if sql else body
+            try:
+                return self._reply(200, fake.execute(sql))
+            except ConnectionDropped:
+                self.close_connection = True
+                self.connection.close()
+            except Exception as e:
+                return self._reply(500, f"{e}\n")
+
+        do_GET = _dispatch
+        do_POST = _dispatch
+
+    return Handler
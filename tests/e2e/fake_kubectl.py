@@ -0,0 +1,819 @@
+#!/usr/bin/env python3
+"""Fake kubectl for running the harness without a Kubernetes cluster.
+
+Select it with KUBECTL_CMD, e.g. from tests/:
+
+    KUBECTL_CMD="python3 $(pwd)/e2e/fake_kubectl.py" python3 regression.py --only "/regression/e2e.test_operator/test_001*"
+
+Objects are kept in a JSON state file (FAKE_KUBECTL_STATE, default /tmp/fake-kubectl-state.json),
+guarded by a lock file, so parallel invocations are safe. Applied ClickHouseInstallations expand into
+StatefulSets, Pods, Services, PVCs and ConfigMaps named and labeled like the operator does,
+Deployments and StatefulSets from manifests get Pods. Status changes over time:
+
+    FAKE_KUBECTL_HOST_DELAY    seconds to reconcile one CHI host, CHI is InProgress until all are done (0.5)
+    FAKE_KUBECTL_POD_DELAY     seconds a created or deleted Pod stays Pending before Running (0.2)
+    FAKE_KUBECTL_DELETE_DELAY  seconds objects of a deleted CHI remain visible (0.5)
+
+`exec ... clickhouse-client --query=...` is forwarded to the fake ClickHouse host of the target (see
+e2e/fake_clickhouse.py): FAKE_CLICKHOUSE_URLS is a JSON object {host name: url}, e.g. from
+FakeClickHouseFleet.kubectl_env(), where the host is the `-h` of clickhouse-client, or the exec pod when it is
+local. Pod names match with or without their StatefulSet ordinal and service FQDNs by their first label.
+Hosts not found there go to FAKE_CLICKHOUSE_URL. Other exec commands succeed with empty output.
+port-forward and logs are not simulated.
+"""
+import os
+import re
+import sys
+import copy
+import json
+import time
+import calendar
+import fcntl
+import uuid
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import yaml
+
+state_file = os.getenv('FAKE_KUBECTL_STATE') \
+    if 'FAKE_KUBECTL_STATE' in os.environ \
+    else "/tmp/fake-kubectl-state.json"
+host_delay = float(os.getenv('FAKE_KUBECTL_HOST_DELAY')) \
+    if 'FAKE_KUBECTL_HOST_DELAY' in os.environ \
+    else 0.5
+pod_delay = float(os.getenv('FAKE_KUBECTL_POD_DELAY')) \
+    if 'FAKE_KUBECTL_POD_DELAY' in os.environ \
+    else 0.2
+delete_delay = float(os.getenv('FAKE_KUBECTL_DELETE_DELAY')) \
+    if 'FAKE_KUBECTL_DELETE_DELAY' in os.environ \
+    else 0.5
+fake_clickhouse_url = os.getenv('FAKE_CLICKHOUSE_URL') \
+    if 'FAKE_CLICKHOUSE_URL' in os.environ \
+    else ""
+fake_clickhouse_urls = json.loads(os.getenv('FAKE_CLICKHOUSE_URLS')) \
+    if 'FAKE_CLICKHOUSE_URLS' in os.environ \
+    else {}
+
+# alias -> (Kind, plural.group used in messages)
+kinds = {}
+for kind, plural, aliases in [
+    ("ClickHouseInstallation", "clickhouseinstallations.clickhouse.altinity.com", ["chi"]),
+    ("ClickHouseInstallationTemplate", "clickhouseinstallationtemplates.clickhouse.altinity.com", ["chit"]),
+    ("ClickHouseOperatorConfiguration", "clickhouseoperatorconfigurations.clickhouse.altinity.com", ["chopconf"]),
+    ("ZookeeperCluster", "zookeeperclusters.zookeeper.pravega.io", ["zk"]),
+    ("StatefulSet", "statefulsets.apps", ["sts"]),
+    ("Deployment", "deployments.apps", ["deploy"]),
+    ("Pod", "pods", ["po"]),
+    ("Service", "services", ["svc"]),
+    ("Endpoints", "endpoints", ["ep"]),
+    ("PersistentVolumeClaim", "persistentvolumeclaims", ["pvc"]),
+    ("PersistentVolume", "persistentvolumes", ["pv"]),
+    ("ConfigMap", "configmaps", ["cm"]),
+    ("Secret", "secrets", []),
+    ("ServiceAccount", "serviceaccounts", ["sa"]),
+    ("Namespace", "namespaces", ["ns"]),
+    ("CustomResourceDefinition", "customresourcedefinitions.apiextensions.k8s.io", ["crd", "crds"]),
+    ("StorageClass", "storageclasses.storage.k8s.io", ["sc"]),
+    ("ClusterRole", "clusterroles.rbac.authorization.k8s.io", []),
+    ("ClusterRoleBinding", "clusterrolebindings.rbac.authorization.k8s.io", []),
+    ("Role", "roles.rbac.authorization.k8s.io", []),
+    ("RoleBinding", "rolebindings.rbac.authorization.k8s.io", []),
+    ("PodDisruptionBudget", "poddisruptionbudgets.policy", ["pdb"]),
+    ("Event", "events", ["ev"]),
+]:
+    for alias in [kind.lower(), plural, plural.split(".")[0], plural.split(".")[0].rstrip("s")] + aliases:
+        kinds[alias] = (kind, plural)
+
+cluster_scoped = (
+    "Namespace", "CustomResourceDefinition", "StorageClass", "ClusterRole", "ClusterRoleBinding", "PersistentVolume",
+)
+chi_label = "clickhouse.altinity.com/chi"
+
+
+class KubectlError(Exception):
+    pass
+
+
+def resolve_kind(name):
+    name = name.split(".")[0] if name.lower() not in kinds else name
+    kind = kinds.get(name.lower())
+    if kind is None:
+        raise KubectlError(f'error: the server doesn\'t have a resource type "{name}"')
+    return kind
+
+
+def resource_name(kind):
+    """Singular resource name with group as kubectl prints it, e.g. statefulset.apps."""
+    group = kinds[kind.lower()][1].partition(".")[2]
+    return f"{kind.lower()}.{group}" if group else kind.lower()
+
+
+def now():
+    return time.time()
+
+
+def timestamp(t):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t))
+
+
+def new_state():
+    t = now()
+    state = {"objects": {}, "deleted_chi": [], "pod_restarts": {}}
+    for ns in ("default", "kube-system"):
+        put(state, {"apiVersion": "v1", "kind": "Namespace", "metadata": {"name": ns}}, t)
+    put(state, {
+        "apiVersion": "storage.k8s.io/v1",
+        "kind": "StorageClass",
+        "metadata": {
+            "name": "standard",
+            "annotations": {"storageclass.kubernetes.io/is-default-class": "true"},
+        },
+        "provisioner": "fake",
+    }, t)
+    return state
+
+
+def key(kind, ns, name):
+    return f"{kind}/{'' if kind in cluster_scoped else ns}/{name}"
+
+
+def put(state, obj, t):
+    kind = obj["kind"]
+    meta = obj.setdefault("metadata", {})
+    if kind in cluster_scoped:
+        meta.pop("namespace", None)
+    k = key(kind, meta.get("namespace", ""), meta["name"])
+    old = state["objects"].get(k)
+    if old is None:
+        meta["uid"] = str(uuid.uuid4())
+        meta["creationTimestamp"] = timestamp(t)
+        meta["generation"] = 1
+        meta["fakeAppliedAt"] = t
+        action = "created"
+    else:
+        for field in ("uid", "creationTimestamp"):
+            meta[field] = old["metadata"][field]
+        meta["generation"] = old["metadata"].get("generation", 1) + 1
+        meta["fakeAppliedAt"] = t if old.get("spec") != obj.get("spec") else old["metadata"]["fakeAppliedAt"]
+        action = "configured" if old != obj else "unchanged"
+    state["objects"][k] = obj
+    return action
+
+
+def chi_hosts(chi):
+    """(cluster, shard, replica) of every host, only the layout part of the CHI spec is interpreted."""
+    hosts = []
+    clusters = chi.get("spec", {}).get("configuration", {}).get("clusters") or [{"name": "cluster"}]
+    for cluster in clusters:
+        layout = cluster.get("layout", {}) or {}
+        shards = layout.get("shards")
+        if shards:
+            for s, shard in enumerate(shards):
+                replicas = len(shard.get("replicas", [])) or shard.get("replicasCount", layout.get("replicasCount", 1))
+                for r in range(replicas):
+                    hosts.append((cluster["name"], s, r))
+            continue
+        replicas = layout.get("replicas")
+        replicas_count = len(replicas) if replicas else layout.get("replicasCount", 1)
+        for s in range(layout.get("shardsCount", 1)):
+            for r in range(replicas_count):
+                hosts.append((cluster["name"], s, r))
+    return hosts
+
+
+def chi_pod_spec(chi):
+    templates = chi.get("spec", {}).get("templates", {}) or {}
+    pod_templates = templates.get("podTemplates") or []
+    spec = copy.deepcopy(pod_templates[0].get("spec", {})) if pod_templates else {}
+    containers = spec.get("containers") or [{"name": "clickhouse-pod", "image": "clickhouse/clickhouse-server:latest"}]
+    for container in containers:
+        container.setdefault("ports", [
+            {"name": "http", "containerPort": 8123},
+            {"name": "client", "containerPort": 9000},
+            {"name": "interserver", "containerPort": 9009},
+        ])
+        container.setdefault("volumeMounts", [])
+    spec["containers"] = containers
+    return spec
+
+
+def pod_status(pod_name, pod_spec, ready_at, t):
+    """Status with one container status per container of the pod spec, all ready once the pod is Running."""
+    running = t >= ready_at
+    return {
+        "phase": "Running" if running else "Pending",
+        "podIP": "10.0.0." + str(1 + sum(map(ord, pod_name)) % 250),
+        "containerStatuses": [
+            {"name": container.get("name", ""), "image": container.get("image", ""), "ready": running, "restartCount": 0}
+            for container in pod_spec.get("containers") or []
+        ],
+    }
+
+
+def chi_children(state, chi, t, visible_hosts=None):
+    meta = chi["metadata"]
+    ns, name = meta.get("namespace", "default"), meta["name"]
+    hosts = chi_hosts(chi)
+    if visible_hosts is not None:
+        hosts = hosts[:visible_hosts]
+    created = meta["fakeAppliedAt"]
+    base_labels = {
+        "clickhouse.altinity.com/app": "chop",
+        chi_label: name,
+        "clickhouse.altinity.com/namespace": ns,
+    }
+    templates = chi.get("spec", {}).get("templates", {}) or {}
+    volume_claims = templates.get("volumeClaimTemplates") or []
+
+    children = []
+
+    def child(kind, child_name, labels, **fields):
+        obj = {
+            "apiVersion": "apps/v1" if kind == "StatefulSet" else "v1",
+            "kind": kind,
+            "metadata": {
+                "name": child_name,
+                "namespace": ns,
+                "labels": dict(base_labels, **labels),
+                "uid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{ns}/{kind}/{child_name}/{created}")),
+                "creationTimestamp": timestamp(created),
+            },
+        }
+        obj.update(fields)
+        children.append(obj)
+
+    child("Service", f"clickhouse-{name}", {}, spec={"type": "LoadBalancer", "ports": [
+        {"name": "http", "port": 8123}, {"name": "tcp", "port": 9000},
+    ]})
+    child("ConfigMap", f"chi-{name}-common-configd", {}, data={
+        "01-clickhouse-01-listen.xml": "", "01-clickhouse-02-logger.xml": "", "01-clickhouse-03-query_log.xml": "",
+        "01-clickhouse-04-part_log.xml": "", "01-clickhouse-05-trace_log.xml": "",
+    })
+    child("ConfigMap", f"chi-{name}-common-usersd", {}, data={
+        "01-clickhouse-user.xml": "", "02-clickhouse-default-profile.xml": "",
+    })
+    for i, (cluster, s, r) in enumerate(hosts):
+        host = f"chi-{name}-{cluster}-{s}-{r}"
+        pod = f"{host}-0"
+        labels = {
+            "clickhouse.altinity.com/cluster": cluster,
+            "clickhouse.altinity.com/shard": str(s),
+            "clickhouse.altinity.com/replica": str(r),
+        }
+        pod_spec = chi_pod_spec(chi)
+        child("ConfigMap", f"chi-{name}-deploy-confd-{cluster}-{s}-{r}", labels, data={"macros.xml": ""})
+        child("StatefulSet", host, labels, spec={
+            "replicas": 1, "serviceName": host,
+            "template": {"metadata": {"labels": dict(base_labels, **labels)}, "spec": pod_spec},
+        }, status={"replicas": 1, "readyReplicas": 1})
+        child("Service", host, labels, spec={"type": "ClusterIP", "clusterIP": "None", "ports": [
+            {"name": "http", "port": 8123}, {"name": "tcp", "port": 9000}, {"name": "interserver", "port": 9009},
+        ]})
+        ready_at = max(created + (i + 1) * host_delay, state["pod_restarts"].get(f"{ns}/{pod}", 0) + pod_delay)
+        child("Pod", pod, dict(labels, **{"statefulset.kubernetes.io/pod-name": pod}),
+              spec=copy.deepcopy(pod_spec), status=pod_status(pod, pod_spec, ready_at, t))
+        for claim in volume_claims:
+            child("PersistentVolumeClaim", f"{claim['name']}-{pod}", labels,
+                  spec=copy.deepcopy(claim.get("spec", {})), status={"phase": "Bound"})
+    return children
+
+
+def workload_pods(state, obj, t):
+    """Pods of Deployments and StatefulSets applied from manifests, e.g. the operator or keeper."""
+    meta = obj["metadata"]
+    ns = meta.get("namespace", "default")
+    template = obj.get("spec", {}).get("template", {})
+    replicas = obj.get("spec", {}).get("replicas", 1)
+    pods = []
+    for i in range(replicas):
+        if obj["kind"] == "StatefulSet":
+            name = f"{meta['name']}-{i}"
+        else:
+            restarts = state["pod_restarts"].get(f"{ns}/deployment/{meta['name']}", 0)
+            name = f"{meta['name']}-{uuid.uuid5(uuid.NAMESPACE_URL, str(restarts)).hex[:10]}-{i}"
+        ready_at = max(meta["fakeAppliedAt"], state["pod_restarts"].get(f"{ns}/{name}", 0),
+                       state["pod_restarts"].get(f"{ns}/deployment/{meta['name']}", 0)) + pod_delay
+        pods.append({
+            "apiVersion": "v1",
+            "kind": "Pod",
+            "metadata": {
+                "name": name,
+                "namespace": ns,
+                "labels": dict(template.get("metadata", {}).get("labels", {})),
+                "uid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{ns}/Pod/{name}/{ready_at}")),
+                "creationTimestamp": timestamp(ready_at - pod_delay),
+            },
+            "spec": copy.deepcopy(template.get("spec", {})),
+            "status": pod_status(name, template.get("spec", {}), ready_at, t),
+        })
+    return pods
+
+
+def all_objects(state, t):
+    """Stored objects plus the ones the operator and controllers would have created by time t."""
+    objects = []
+    for obj in state["objects"].values():
+        obj = copy.deepcopy(obj)
+        kind = obj["kind"]
+        if kind == "ClickHouseInstallation":
+            hosts = len(chi_hosts(obj))
+            applied = obj["metadata"]["fakeAppliedAt"]
+            done = t >= applied + hosts * host_delay
+            visible = hosts if obj["metadata"]["generation"] > 1 else min(hosts, int((t - applied) / host_delay) + 1)
+            obj["status"] = {
+                "status": "Completed" if done else "InProgress",
+                "taskID": f"auto-{obj['metadata']['generation']}",
+                "hostsCount": hosts,
+                "hostsCompletedCount": hosts if done else max(0, visible - 1),
+                "pods": [f"chi-{obj['metadata']['name']}-{c}-{s}-{r}-0" for c, s, r in chi_hosts(obj)],
+            }
+            objects.extend(chi_children(state, obj, t, visible))
+        elif kind in ("Deployment", "StatefulSet") and not obj["metadata"].get("labels", {}).get(chi_label):
+            pods = workload_pods(state, obj, t)
+            ready = len([p for p in pods if p["status"]["phase"] == "Running"])
+            obj["status"] = {"replicas": len(pods), "readyReplicas": ready, "availableReplicas": ready}
+            objects.extend(pods)
+        elif kind == "PersistentVolumeClaim":
+            obj.setdefault("status", {"phase": "Bound"})
+        obj["metadata"].pop("fakeAppliedAt", None)
+        objects.append(obj)
+    for chi in state["deleted_chi"]:
+        if t < chi["deletedAt"] + delete_delay:
+            objects.extend(chi_children(state, chi["object"], t))
+    for obj in objects:
+        obj["metadata"].pop("fakeAppliedAt", None)
+    return objects
+
+
+def match_labels(obj, selector):
+    if not selector:
+        return True
+    labels = obj["metadata"].get("labels", {}) or {}
+    for term in selector.split(","):
+        term = term.strip()
+        if "!=" in term:
+            k, v = term.split("!=", 1)
+            if labels.get(k.strip()) == v.strip():
+                return False
+        elif "=" in term:
+            k, v = term.replace("==", "=").split("=", 1)
+            if labels.get(k.strip()) != v.strip():
+                return False
+        elif term.startswith("!"):
+            if term[1:] in labels:
+                return False
+        elif term not in labels:
+            return False
+    return True
+
+
+def split_path(path):
+    """Split a kubectl field path like .metadata.annotations.a\\.b/c into ["metadata", "annotations", "a.b/c"]."""
+    path = path.strip().lstrip(".")
+    parts, current, i = [], "", 0
+    while i < len(path):
+        if path[i] == "\\" and i + 1 < len(path):
+            current += path[i + 1]
+            i += 2
+            continue
+        if path[i] == ".":
+            parts.append(current)
+            current = ""
+        else:
+            current += path[i]
+        i += 1
+    if current:
+        parts.append(current)
+    return parts
+
+
+index_re = re.compile(r"^([^\[]*)((?:\[[^\]]*\])*)$")
+
+
+def lookup(obj, path):
+    """Values at path, [*] fans out over lists."""
+    values = [obj]
+    for part in split_path(path):
+        m = index_re.match(part)
+        name, indexes = m.group(1), re.findall(r"\[([^\]]*)\]", m.group(2))
+        next_values = []
+        for value in values:
+            if name:
+                if not isinstance(value, dict) or name not in value:
+                    continue
+                value = value[name]
+            current = [value]
+            for index in indexes:
+                expanded = []
+                for v in current:
+                    if not isinstance(v, list):
+                        continue
+                    if index == "*":
+                        expanded.extend(v)
+                    elif -len(v) <= int(index) < len(v):
+                        expanded.append(v[int(index)])
+                current = expanded
+            next_values.extend(current)
+        values = next_values
+    return values
+
+
+def format_scalar(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def output_custom_columns(objects, spec):
+    columns = []
+    for column in re.split(r",(?=[^,:]+:)", spec):
+        header, _, path = column.partition(":")
+        columns.append((header, path))
+    rows = [[header for header, _ in columns]]
+    for obj in objects:
+        row = []
+        for _, path in columns:
+            values = lookup(obj, path)
+            row.append(",".join(format_scalar(v) for v in values) if values else "<none>")
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "".join("   ".join(v.ljust(w) for v, w in zip(row, widths)).rstrip() + "\n" for row in rows)
+
+
+def output_jsonpath(document, template):
+    out = ""
+    for literal, expression in re.findall(r"([^{]*)(?:\{([^}]*)\})?", template.strip("'\"")):
+        out += literal
+        if expression:
+            out += " ".join(format_scalar(v) for v in lookup(document, expression))
+    return out
+
+
+def age(obj, t):
+    created = obj["metadata"].get("creationTimestamp")
+    seconds = int(t - calendar.timegm(time.strptime(created, "%Y-%m-%dT%H:%M:%SZ"))) if created else 0
+    return f"{seconds}s" if seconds < 120 else f"{seconds // 60}m"
+
+
+def output_table(objects, kind, t, all_namespaces):
+    if kind == "Pod":
+        headers = ["NAME", "READY", "STATUS", "RESTARTS", "AGE"]
+        rows = []
+        for obj in objects:
+            containers = obj.get("spec", {}).get("containers") or [{}]
+            ready = len(containers) if obj["status"]["phase"] == "Running" else 0
+            rows.append([obj["metadata"]["name"], f"{ready}/{len(containers)}", obj["status"]["phase"], "0", age(obj, t)])
+    elif kind == "ClickHouseInstallation":
+        headers = ["NAME", "CLUSTERS", "HOSTS", "STATUS", "AGE"]
+        rows = [[
+            obj["metadata"]["name"],
+            str(len({c for c, _, _ in chi_hosts(obj)})),
+            str(obj["status"]["hostsCount"]),
+            obj["status"]["status"],
+            age(obj, t),
+        ] for obj in objects]
+    else:
+        headers = ["NAME", "AGE"]
+        rows = [[obj["metadata"]["name"], age(obj, t)] for obj in objects]
+    if all_namespaces:
+        headers = ["NAMESPACE"] + headers
+        rows = [[obj["metadata"].get("namespace", "")] + row for obj, row in zip(objects, rows)]
+    rows = [headers] + rows
+    widths = [max(len(row[i]) for row in rows) for i in range(len(headers))]
+    return "".join("   ".join(v.ljust(w) for v, w in zip(row, widths)).rstrip() + "\n" for row in rows)
+
+
+def parse_args(argv):
+    """Split kubectl arguments into positional arguments, flags and the command after --."""
+    args, flags, command = [], {}, []
+    with_value = {
+        "-n": "namespace", "--namespace": "namespace", "-o": "output", "--output": "output",
+        "-l": "selector", "--selector": "selector", "-f": "filename", "--filename": "filename",
+        "-p": "patch", "--patch": "patch", "-c": "container", "--container": "container",
+        "--type": "type", "--timeout": "timeout", "-q": "query", "-h": "host", "--host": "host",
+    }
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "--":
+            command = argv[i + 1:]
+            break
+        name, eq, value = arg.partition("=")
+        if name in with_value:
+            if not eq:
+                i += 1
+                value = argv[i] if i < len(argv) else ""
+            flags[with_value[name]] = value
+        elif arg in ("-A", "--all-namespaces"):
+            flags["all_namespaces"] = True
+        elif arg.startswith("-"):
+            flags[name.lstrip("-")] = value if eq else True
+        else:
+            args.append(arg)
+        i += 1
+    return args, flags, command
+
+
+def read_manifests(filename):
+    if filename == "-":
+        text = sys.stdin.read()
+    else:
+        with open(filename, "r") as f:
+            text = f.read()
+    docs = []
+    for doc in yaml.safe_load_all(text):
+        if not doc:
+            continue
+        if doc.get("kind") == "List":
+            docs.extend(doc.get("items", []))
+        else:
+            docs.append(doc)
+    return docs
+
+
+def namespace_of(obj, flags):
+    if obj["kind"] in cluster_scoped:
+        return ""
+    return obj.get("metadata", {}).get("namespace") or flags.get("namespace") or "default"
+
+
+def check_namespace(state, ns):
+    if ns and key("Namespace", "", ns) not in state["objects"]:
+        raise KubectlError(f'Error from server (NotFound): namespaces "{ns}" not found')
+
+
+def select(state, t, kind, ns, names, selector, all_namespaces):
+    objects = [
+        o for o in all_objects(state, t)
+        if o["kind"] == kind
+        and (all_namespaces or kind in cluster_scoped or o["metadata"].get("namespace") == ns)
+        and match_labels(o, selector)
+    ]
+    if names:
+        by_name = {o["metadata"]["name"]: o for o in objects}
+        missing = [n for n in names if n not in by_name]
+        if missing:
+            raise KubectlError(f'Error from server (NotFound): {kinds[kind.lower()][1]} "{missing[0]}" not found')
+        objects = [by_name[n] for n in names]
+    return sorted(objects, key=lambda o: (o["metadata"].get("namespace", ""), o["metadata"]["name"])) \
+        if not names else objects
+
+
+def kind_and_names(args):
+    """Resolve `pod a b`, `pod/a` and `deployment.v1.apps/a` forms."""
+    if args and "/" in args[0]:
+        kind, _, name = args[0].partition("/")
+        return resolve_kind(kind)[0], [name] + [a.partition("/")[2] for a in args[1:]]
+    if not args:
+        raise KubectlError("error: You must specify the type of resource to get.")
+    kind = args[0].split(",")[0]
+    return resolve_kind(kind)[0], args[1:]
+
+
+def cmd_get(state, t, args, flags):
+    kind, names = kind_and_names(args)
+    ns = flags.get("namespace") or "default"
+    all_namespaces = flags.get("all_namespaces", False)
+    if not all_namespaces:
+        check_namespace(state, "" if kind in cluster_scoped else ns)
+    objects = select(state, t, kind, ns, names, flags.get("selector", ""), all_namespaces)
+    output = flags.get("output", "")
+    single = len(names) == 1
+    if output == "json":
+        document = objects[0] if single else {"apiVersion": "v1", "kind": "List", "items": objects}
+        return json.dumps(document, indent=4) + "\n"
+    if output == "yaml":
+        document = objects[0] if single else {"apiVersion": "v1", "kind": "List", "items": objects}
+        return yaml.safe_dump(document, default_flow_style=False)
+    if output.startswith("jsonpath="):
+        document = objects[0] if single else {"apiVersion": "v1", "kind": "List", "items": objects}
+        return output_jsonpath(document, output[len("jsonpath="):])
+    if output == "name":
+        return "".join(f"{resource_name(kind)}/{o['metadata']['name']}\n" for o in objects)
+    if not objects:
+        where = "" if kind in cluster_scoped else f" in {ns} namespace"
+        sys.stderr.write(f"No resources found{where}.\n")
+        return ""
+    if output.startswith("custom-columns="):
+        return output_custom_columns(objects, output[len("custom-columns="):])
+    return output_table(objects, kind, t, all_namespaces)
+
+
+def cmd_apply(state, t, args, flags, verb="apply"):
+    if "filename" not in flags:
+        raise KubectlError("error: must specify one of -f and -k")
+    out = ""
+    for obj in read_manifests(flags["filename"]):
+        kind = obj.get("kind")
+        if kind not in [k for k, _ in kinds.values()]:
+            kinds[kind.lower()] = (kind, kind.lower() + "s")
+        ns = namespace_of(obj, flags)
+        check_namespace(state, ns)
+        if ns:
+            obj["metadata"]["namespace"] = ns
+        exists = key(kind, ns, obj["metadata"]["name"]) in state["objects"]
+        if verb == "create" and exists:
+            raise KubectlError(
+                f'Error from server (AlreadyExists): {kinds[kind.lower()][1]} "{obj["metadata"]["name"]}" already exists'
+            )
+        action = put(state, obj, t)
+        out += f"{resource_name(kind)}/{obj['metadata']['name']} {action}\n"
+    return out
+
+
+def delete_object(state, t, kind, ns, name, ignore_not_found):
+    k = key(kind, ns, name)
+    obj = state["objects"].pop(k, None)
+    if obj is None:
+        if kind == "Pod" and any(p["metadata"]["name"] == name for p in select(state, t, "Pod", ns, [], "", False)):
+            # pods owned by StatefulSets and Deployments are recreated
+            owner = re.sub(r"-[0-9a-f]{10}-\d+$", "", name)
+            if owner != name:
+                state["pod_restarts"][f"{ns}/deployment/{owner}"] = t
+            state["pod_restarts"][f"{ns}/{name}"] = t
+            return f'pod "{name}" deleted\n'
+        if ignore_not_found:
+            return ""
+        raise KubectlError(f'Error from server (NotFound): {kinds[kind.lower()][1]} "{name}" not found')
+    if kind == "ClickHouseInstallation":
+        state["deleted_chi"].append({"deletedAt": t, "object": obj})
+    if kind == "Namespace":
+        for other in list(state["objects"]):
+            if state["objects"][other]["metadata"].get("namespace") == name:
+                del state["objects"][other]
+    return f'{resource_name(kind)} "{name}" deleted\n'
+
+
+def cmd_delete(state, t, args, flags):
+    ignore_not_found = flags.get("ignore-not-found") not in (None, "false")
+    out = ""
+    if "filename" in flags:
+        for obj in read_manifests(flags["filename"]):
+            out += delete_object(state, t, obj["kind"], namespace_of(obj, flags), obj["metadata"]["name"], ignore_not_found)
+        return out
+    kind, names = kind_and_names(args)
+    ns = "" if kind in cluster_scoped else flags.get("namespace") or "default"
+    if flags.get("all") or ("selector" in flags and not names):
+        names = [o["metadata"]["name"] for o in select(state, t, kind, ns, [], flags.get("selector", ""), False)]
+    for name in names:
+        out += delete_object(state, t, kind, ns, name, ignore_not_found)
+    return out
+
+
+def cmd_create(state, t, args, flags):
+    if args and resolve_kind(args[0])[0] == "Namespace":
+        return create_namespace(state, t, args[1])
+    return cmd_apply(state, t, args, flags, "create")
+
+
+def create_namespace(state, t, name):
+    if key("Namespace", "", name) in state["objects"]:
+        raise KubectlError(f'Error from server (AlreadyExists): namespaces "{name}" already exists')
+    put(state, {"apiVersion": "v1", "kind": "Namespace", "metadata": {"name": name}}, t)
+    return f"namespace/{name} created\n"
+
+
+def merge_patch(target, patch):
+    if not isinstance(patch, dict):
+        return patch
+    target = dict(target) if isinstance(target, dict) else {}
+    for k, v in patch.items():
+        if v is None:
+            target.pop(k, None)
+        else:
+            target[k] = merge_patch(target.get(k), v)
+    return target
+
+
+def cmd_patch(state, t, args, flags):
+    kind, names = kind_and_names(args)
+    ns = "" if kind in cluster_scoped else flags.get("namespace") or "default"
+    if flags.get("type", "strategic") == "json":
+        raise KubectlError("error: --type=json patches are not supported by fake kubectl")
+    k = key(kind, ns, names[0])
+    if k not in state["objects"]:
+        raise KubectlError(f'Error from server (NotFound): {kinds[kind.lower()][1]} "{names[0]}" not found')
+    obj = merge_patch(state["objects"][k], json.loads(flags.get("patch", "{}").strip("'")))
+    put(state, obj, t)
+    return f"{resource_name(kind)}/{names[0]} patched\n"
+
+
+def cmd_set(state, t, args, flags):
+    if not args or args[0] != "image":
+        raise KubectlError("error: fake kubectl supports only `set image`")
+    kind, names = kind_and_names(args[1:2])
+    ns = flags.get("namespace") or "default"
+    k = key(kind, ns, names[0])
+    if k not in state["objects"]:
+        raise KubectlError(f'Error from server (NotFound): {kinds[kind.lower()][1]} "{names[0]}" not found')
+    obj = copy.deepcopy(state["objects"][k])
+    for assignment in args[2:]:
+        container_name, _, image = assignment.partition("=")
+        for container in obj.get("spec", {}).get("template", {}).get("spec", {}).get("containers", []):
+            if container["name"] == container_name or container_name == "*":
+                container["image"] = image
+    if put(state, obj, t) != "unchanged":
+        state["pod_restarts"][f"{ns}/deployment/{names[0]}"] = t
+    return f"{resource_name(kind)}/{names[0]} image updated\n"
+
+
+def cmd_rollout(state, t, args, flags):
+    kind, names = kind_and_names(args[1:])
+    ns = flags.get("namespace") or "default"
+    objects = select(state, t, kind, ns, names, "", False)
+    pods = [p for p in select(state, t, "Pod", ns, [], "", False)
+            if p["metadata"]["name"].startswith(names[0] + "-")]
+    if any(p["status"]["phase"] != "Running" for p in pods):
+        time.sleep(pod_delay)
+    return f'{kind.lower()} "{objects[0]["metadata"]["name"]}" successfully rolled out\n'
+
+
+def cmd_describe(state, t, args, flags):
+    kind, names = kind_and_names(args)
+    ns = flags.get("namespace") or "default"
+    return "".join(yaml.safe_dump(o, default_flow_style=False) for o in select(state, t, kind, ns, names, "", False))
+
+
+def clickhouse_url(pod, host):
+    """URL of the fake ClickHouse which answers clickhouse-client -h host run in the pod."""
+    if host in ("", "127.0.0.1", "localhost", "::1"):
+        host = pod
+    candidates = [host, re.sub(r"-\d+$", "", host), host.split(".")[0], re.sub(r"-\d+$", "", host.split(".")[0])]
+    for candidate in candidates:
+        if candidate in fake_clickhouse_urls:
+            return fake_clickhouse_urls[candidate]
+    if fake_clickhouse_url == "":
+        raise KubectlError(f"error: fake kubectl: no fake ClickHouse for {host}, set FAKE_CLICKHOUSE_URLS or FAKE_CLICKHOUSE_URL")
+    return fake_clickhouse_url
+
+
+def cmd_exec(state, t, args, flags, command):
+    ns = flags.get("namespace") or "default"
+    select(state, t, "Pod", ns, args[:1], "", False)
+    if not command or not any("clickhouse-client" in c for c in command):
+        return ""
+    _, client_flags, _ = parse_args([c for c in command if c != "clickhouse-client"])
+    url = clickhouse_url(args[0], client_flags.get("host", ""))
+    sql = client_flags.get("query", "")
+    try:
+        with urllib.request.urlopen(f"{url}/?{urllib.parse.urlencode({'query': sql})}") as response:
+            return response.read().decode()
+    except urllib.error.HTTPError as e:
+        raise KubectlError(e.read().decode().rstrip("\n"))
+    except (urllib.error.URLError, http.client.HTTPException, ConnectionError) as e:
+        # e.g. a dropped connection of FakeClickHouse.inject(), reported like clickhouse-client does
+        raise KubectlError(f"Code: 210. DB::NetException: Connection reset by peer ({type(e).__name__}: {e})")
+
+
+def run(argv):
+    args, flags, command = parse_args(argv)
+    if not args:
+        raise KubectlError("error: fake kubectl needs a command")
+    verb, args = args[0], args[1:]
+    if verb in ("version", "cluster-info", "wait", "logs", "label", "annotate", "scale", "run", "config"):
+        return ""
+    if verb == "port-forward":
+        raise KubectlError("error: port-forward is not simulated by fake kubectl")
+
+    lock = open(state_file + ".lock", "a")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    try:
+        if os.path.exists(state_file):
+            with open(state_file, "r") as f:
+                state = json.load(f)
+        else:
+            state = new_state()
+        t = now()
+        handlers = {
+            "get": cmd_get, "apply": cmd_apply, "delete": cmd_delete, "create": cmd_create, "patch": cmd_patch,
+            "set": cmd_set, "rollout": cmd_rollout, "describe": cmd_describe,
+        }
+        if verb == "exec":
+            return cmd_exec(state, t, args, flags, command)
+        if verb not in handlers:
+            raise KubectlError(f'error: unknown command "{verb}" for fake kubectl')
+        out = handlers[verb](state, t, args, flags)
+        if verb not in ("get", "describe", "rollout"):
+            with open(state_file + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(state_file + ".tmp", state_file)
+        return out
+    finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+
+def main():
+    try:
+        sys.stdout.write(run(sys.argv[1:]))
+    except KubectlError as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+import json
+import math
+import threading
+import urllib.request
+import urllib.error
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# see prometheus.BuildFQName(namespace, subsystem, name) in pkg/apis/metrics/prometheus_writer.go
+metric_prefix = "chi_clickhouse_"
+fetch_errors_help = "status of fetching metrics from ClickHouse 1 - unsuccessful, 0 - successful"
+
+# copied from pkg/apis/metrics/clickhouse_fetcher.go
+query_system_replicas_sql = """
+    SELECT
+        database,
+        table,
+        toString(is_session_expired) AS is_session_expired
+    FROM system.replicas
+"""
+query_metrics_sql = """
+    SELECT concat('metric.', metric) AS metric, toString(value) AS value, '' AS description, 'gauge' AS type
+    FROM system.asynchronous_metrics
+    UNION ALL
+    SELECT concat('metric.', metric) AS metric, toString(value) AS value, '' AS description, 'gauge' AS type
+    FROM system.metrics
+    UNION ALL
+    SELECT concat('event.', event) AS metric, toString(value) AS value, '' AS description, 'counter' AS type
+    FROM system.events
+    UNION ALL
+    SELECT 'metric.MemoryDictionaryBytesAllocated' AS metric, toString(sum(bytes_allocated)) AS value,
+        'Memory size allocated for dictionaries' AS description, 'gauge' AS type
+    FROM system.dictionaries
+    UNION ALL
+    SELECT 'metric.LongestRunningQuery' AS metric, toString(max(elapsed)) AS value,
+        'Longest running query time' AS description, 'gauge' AS type
+    FROM system.processes
+    UNION ALL
+    SELECT 'metric.ChangedSettingsHash' AS metric, toString(groupBitXor(cityHash64(name,value))) AS value,
+        'Control sum for changed settings' AS description, 'gauge' AS type
+    FROM system.settings WHERE changed
+"""
+query_system_parts_sql = """
+    SELECT
+        database,
+        table,
+        toString(active)                       AS active,
+        toString(uniq(partition))              AS partitions,
+        toString(count())                      AS parts,
+        toString(sum(bytes))                   AS bytes,
+        toString(sum(data_uncompressed_bytes)) AS uncompressed_bytes,
+        toString(sum(rows))                    AS rows,
+        toString(sum(bytes_on_disk))           AS metric_DiskDataBytes,
+        toString(sum(primary_key_bytes_in_memory_allocated)) AS metric_MemoryPrimaryKeyBytesAllocated
+    FROM system.parts
+    GROUP BY active, database, table
+"""
+query_mutations_sql = """
+    SELECT
+        database,
+        table,
+        count()          AS mutations,
+        sum(parts_to_do) AS parts_to_do
+    FROM system.mutations
+    WHERE is_done = 0
+    GROUP BY database, table
+"""
+query_system_disks_sql = """
+    SELECT
+        name,
+        toString(free_space) AS free_space,
+        toString(total_space) AS total_space
+    FROM system.disks
+"""
+query_detached_parts_sql = """
+    SELECT
+        count() AS detached_parts,
+        database,
+        table,
+        disk,
+        if(coalesce(reason,'unknown')='','detached_by_user',coalesce(reason,'unknown')) AS detach_reason
+    FROM system.detached_parts
+    GROUP BY
+        database,
+        table,
+        disk,
+        reason
+"""
+
+
+def static_source(rows):
+    """Data source which returns the same rows for every watched host.
+    Row format is (name, help, value, type, labels), labels are added after chi/namespace/hostname.
+    """
+    def source(chi, hostname):
+        return rows
+    return source
+
+
+def clickhouse_source(url_for_host, timeout=10):
+    """Data source which queries every host over the ClickHouse HTTP interface like collectFromHost in exporter.go.
+
+    url_for_host(hostname) returns base URL of the host, e.g. the one of a FakeClickHouse server.
+    """
+    def query(hostname, sql):
+        req = urllib.request.Request(
+            url_for_host(hostname), data=(sql + " FORMAT TabSeparatedWithNamesAndTypes").encode(), method="POST"
+        )
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            lines = response.read().decode().splitlines()[2:]
+        return [line.split("\t") for line in lines]
+
+    def fetch(rows, hostname, sql, fetch_types, write):
+        try:
+            data = query(hostname, sql)
+        except Exception:
+            for fetch_type in fetch_types:
+                rows.append(("metric_fetch_errors", fetch_errors_help, 1, "gauge", {"fetch_type": fetch_type}))
+            return
+        write(data)
+        for fetch_type in fetch_types:
+            rows.append(("metric_fetch_errors", fetch_errors_help, 0, "gauge", {"fetch_type": fetch_type}))
+
+    def source(chi, hostname):
+        rows = []
+
+        def write_metrics(data):
+            for m in data:
+                rows.append((m[0], m[2], m[1], "counter" if m[3] == "counter" else "gauge", {}))
+
+        def write_parts(data):
+            for m in data:
+                labels = {"database": m[0], "table": m[1], "active": m[2]}
+                rows.append(("table_partitions", "Number of partitions of the table", m[3], "gauge", labels))
+                rows.append(("table_parts", "Number of parts of the table", m[4], "gauge", labels))
+                rows.append(("table_parts_bytes", "Table size in bytes", m[5], "gauge", labels))
+                rows.append(("table_parts_bytes_uncompressed", "Table size in bytes uncompressed", m[6], "gauge", labels))
+                rows.append(("table_parts_rows", "Number of rows in the table", m[7], "gauge", labels))
+            rows.append(("metric.DiskDataBytes", "Total data size for all ClickHouse tables",
+                         sum(int(m[8]) for m in data), "gauge", {}))
+            rows.append(("metric.MemoryPrimaryKeyBytesAllocated", "Memory size allocated for primary keys",
+                         sum(int(m[9]) for m in data), "gauge", {}))
+
+        def write_replicas(data):
+            for m in data:
+                rows.append(("system_replicas_is_session_expired", "Number of expired Zookeeper sessions of the table",
+                             m[2], "gauge", {"database": m[0], "table": m[1]}))
+
+        def write_mutations(data):
+            for m in data:
+                labels = {"database": m[0], "table": m[1]}
+                rows.append(("table_mutations", "Number of active mutations for the table", m[2], "gauge", labels))
+                rows.append(("table_mutations_parts_to_do",
+                             "Number of data parts that need to be mutated for the mutation to finish", m[3], "gauge", labels))
+
+        def write_disks(data):
+            for m in data:
+                rows.append(("metric_DiskFreeBytes", "Free disk space available from system.disks", m[1], "gauge", {"disk": m[0]}))
+                rows.append(("metric_DiskTotalBytes", "Total disk space available from system.disks", m[2], "gauge", {"disk": m[0]}))
+
+        def write_detached_parts(data):
+            for m in data:
+                rows.append(("metric_DetachedParts", "Count of currently detached parts from system.detached_parts", m[0],
+                             "gauge", {"database": m[1], "table": m[2], "disk": m[3], "reason": m[4]}))
+
+        fetch(rows, hostname, query_metrics_sql, ["system.metrics"], write_metrics)
+        fetch(rows, hostname, query_system_parts_sql, ["table sizes", "system parts"], write_parts)
+        fetch(rows, hostname, query_system_replicas_sql, ["system.replicas"], write_replicas)
+        fetch(rows, hostname, query_mutations_sql, ["system.mutations"], write_mutations)
+        fetch(rows, hostname, query_system_disks_sql, ["system.disks"], write_disks)
+        fetch(rows, hostname, query_detached_parts_sql, ["system.detached_parts"], write_detached_parts)
+        return rows
+
+    return source
+
+
+def format_value(value):
+    # mimics expfmt writeFloat, which uses strconv.AppendFloat(f, 'g', -1, 64)
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == 0:
+        return "0"
+    sign, digits, exponent = Decimal(repr(value)).normalize().as_tuple()
+    digits = "".join(str(d) for d in digits)
+    exp10 = len(digits) + exponent - 1
+    sign = "-" if sign else ""
+    if exp10 < -4 or exp10 >= 6:
+        mantissa = digits[0] + ("." + digits[1:] if len(digits) > 1 else "")
+        return f"{sign}{mantissa}e{'-' if exp10 < 0 else '+'}{abs(exp10):02d}"
+    return sign + format(Decimal(digits).scaleb(exponent), "f")
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def convert_metric_name(name):
+    # see convertMetricName in pkg/apis/metrics/prometheus_writer.go
+    return name.replace("-", "_").replace(".", "_")
+
+
+def watched_chi_key(chi):
+    # see WatchedCHI.indexKey() in pkg/apis/metrics/type_watched_chi.go
+    return f"{chi['namespace']}:{chi['name']}"
+
+
+def is_valid_watched_chi(chi):
+    return isinstance(chi, dict) and (
+        len(chi.get("namespace", "")) > 0 or len(chi.get("name", "")) > 0 or len(chi.get("hostnames") or []) > 0
+    )
+
+
+class FakeMetricsExporter(object):
+    """Pure-Python stand-in for the metrics-exporter REST surface.
+
+    Serves `/chi` (GET/POST/DELETE) with the same semantics as pkg/apis/metrics/rest_server.go
+    and `/metrics` in Prometheus text format, using `source(chi, hostname)` to produce rows for each watched host.
+    """
+    def __init__(self, source=None, host="127.0.0.1", port=0, max_workers=32):
+        self.source = source if source is not None else static_source([])
+        self.max_workers = max_workers
+        self.chi_installations = {}
+        self.to_remove_from_watched = []
+        self.mutex = threading.RLock()
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-metrics-exporter", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    def get(self, path, timeout=30):
+        """Plain HTTP GET against the fake, returns response body as text."""
+        with urllib.request.urlopen(f"{self.url}{path}", timeout=timeout) as response:
+            return response.read().decode()
+
+    def get_watched_chi(self):
+        with self.mutex:
+            return [dict(chi) for chi in self.chi_installations.values()]
+
+    def update_watched(self, chi):
+        with self.mutex:
+            self.chi_installations[watched_chi_key(chi)] = {
+                "namespace": chi.get("namespace", ""),
+                "name": chi.get("name", ""),
+                "hostnames": list(chi.get("hostnames") or []),
+            }
+
+    def enqueue_to_remove_from_watched(self, chi):
+        # same as exporter.go, removal is applied after the next collect
+        with self.mutex:
+            self.to_remove_from_watched.append(chi)
+
+    def collect(self):
+        """Return list of (chi, hostname, rows) for all watched hosts, hosts are queried in parallel."""
+        with self.mutex:
+            targets = [(chi, hostname) for chi in self.chi_installations.values() for hostname in chi["hostnames"]]
+            try:
+                if not targets:
+                    return []
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as pool:
+                    results = pool.map(lambda t: (t[0], t[1], self._collect_from_host(*t)), targets)
+                    return list(results)
+            finally:
+                for chi in self.to_remove_from_watched:
+                    self.chi_installations.pop(watched_chi_key(chi), None)
+                self.to_remove_from_watched = []
+
+    def _collect_from_host(self, chi, hostname):
+        try:
+            return list(self.source(chi, hostname))
+        except Exception:
+            return [("metric_fetch_errors", fetch_errors_help, 1, "gauge", {"fetch_type": "system.metrics"})]
+
+    def render_metrics(self):
+        families = {}
+        for chi, hostname, rows in self.collect():
+            for name, help_text, value, metric_type, labels in rows:
+                name = metric_prefix + convert_metric_name(name)
+                family = families.setdefault(name, {"help": help_text, "type": metric_type, "samples": []})
+                sample_labels = {"chi": chi["name"], "namespace": chi["namespace"], "hostname": hostname}
+                sample_labels.update(labels or {})
+                family["samples"].append((sorted(sample_labels.items()), value))
+
+        lines = []
+        for name in sorted(families):
+            family = families[name]
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for labels, value in sorted(family["samples"], key=lambda s: [v for _, v in s[0]]):
+                label_str = ",".join(f"{k}=\"{escape_label_value(v)}\"" for k, v in labels)
+                lines.append(f"{name}{{{label_str}}} {format_value(value)}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _make_handler(exporter):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, code, body, content_type="text/plain; charset=utf-8"):
+            body = body.encode()
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_chi(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                chi = json.loads(self.rfile.read(length) or b"null")
+            except ValueError:
+                return None
+            return chi if is_valid_watched_chi(chi) else None
+
+        def _dispatch(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics" and self.command == "GET":
+                return self._reply(200, exporter.render_metrics(), "text/plain; version=0.0.4; charset=utf-8")
+            if path != "/chi":
+                return self._reply(404, "404 not found.\n")
+            if self.command == "GET":
+                return self._reply(200, json.dumps(exporter.get_watched_chi(), separators=(",", ":")) + "\n", "application/json")
+            if self.command in ("POST", "DELETE"):
+                chi = self._read_chi()
+                if chi is None:
+                    return self._reply(406, "unable to parse CHI from request\n")
+                if self.command == "POST":
+                    exporter.update_watched(chi)
+                else:
+                    exporter.enqueue_to_remove_from_watched(chi)
+                return self._reply(200, "", "application/json")
+            return self._reply(200, "Sorry, only GET, POST and DELETE methods are supported.")
+
+        do_GET = _dispatch
+        do_POST = _dispatch
+        do_DELETE = _dispatch
+        do_PUT = _dispatch
+
+    return Handler
+
+
+def rest_call(url, method, chi=None, timeout=30):
+    """Send request to the `/chi` endpoint of the real or fake metrics-exporter, see makeRESTCall in rest_machinery.go."""
+    data = None if chi is None else json.dumps(chi).encode()
+    req = urllib.request.Request(f"{url}/chi", data=data, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
@@ -0,0 +1,170 @@
+"""Fleet-wide snapshots of CHIs and the objects the operator created for them, to detect what an operator
+restart or upgrade touched:
+
+    tracker = fleet.FleetTracker().start()
+    util.restart_operator()
+    tracker.wait_reconciled()
+    report = tracker.finish()
+    assert report["restarted_pods"] == {}, error()
+
+Each snapshot is two kubectl calls regardless of the number of CHIs.
+"""
+import time
+
+import e2e.kubectl as kubectl
+import e2e.settings as settings
+
+from testflows.core import note, debug
+
+# objects created by the operator
+object_kinds = "statefulset,pod,service,configmap,pvc"
+object_label = "-l clickhouse.altinity.com/app=chop"
+
+
+def snapshot(ns=settings.test_namespace):
+    """{"chis": {name: status}, "objects": {"Kind/name": metadata}, "pods": {name: start state}, "statefulsets": {name: generation}}"""
+    result = {"time": time.time(), "chis": {}, "objects": {}, "pods": {}, "statefulsets": {}}
+    for chi in kubectl.get("chi", "", ns=ns)["items"]:
+        status = chi.get("status", {}) or {}
+        result["chis"][chi["metadata"]["name"]] = {
+            "status": status.get("status", ""),
+            "taskIDsStarted": (status.get("taskIDsStarted") or [None])[0],
+            "taskIDsCompleted": (status.get("taskIDsCompleted") or [None])[0],
+            "resourceVersion": chi["metadata"]["resourceVersion"],
+        }
+    for item in kubectl.get(object_kinds, "", label=object_label, ns=ns)["items"]:
+        kind = item["kind"]
+        name = item["metadata"]["name"]
+        result["objects"][f"{kind}/{name}"] = {
+            "uid": item["metadata"]["uid"],
+            "resourceVersion": item["metadata"]["resourceVersion"],
+            "chi": item["metadata"].get("labels", {}).get("clickhouse.altinity.com/chi", ""),
+        }
+        if kind == "Pod":
+            status = item.get("status", {})
+            result["pods"][name] = {
+                "uid": item["metadata"]["uid"],
+                "startTime": status.get("startTime"),
+                "restarts": {c["name"]: c.get("restartCount", 0) for c in status.get("containerStatuses", []) or []},
+            }
+        elif kind == "StatefulSet":
+            result["statefulsets"][name] = {
+                "generation": item["metadata"].get("generation"),
+                "updateRevision": item.get("status", {}).get("updateRevision"),
+            }
+    return result
+
+
+def restarted_pods(before, after):
+    """{pod: reason} of pods which were deleted, recreated or restarted between the snapshots."""
+    result = {}
+    for name, pod in before["pods"].items():
+        new = after["pods"].get(name)
+        if new is None:
+            result[name] = "deleted"
+        elif new["uid"] != pod["uid"]:
+            result[name] = "recreated"
+        elif new["startTime"] != pod["startTime"]:
+            result[name] = f"started at {new['startTime']} instead of {pod['startTime']}"
+        else:
+            restarts = {c: n - pod["restarts"].get(c, 0) for c, n in new["restarts"].items() if n > pod["restarts"].get(c, 0)}
+            if restarts:
+                result[name] = f"container restarts {restarts}"
+    return result
+
+
+def diff(before, after):
+    """Objects created, deleted and touched (resourceVersion changed), pods restarted and StatefulSets updated."""
+    touched = [key for key, obj in before["objects"].items()
+               if key in after["objects"] and after["objects"][key]["resourceVersion"] != obj["resourceVersion"]]
+    return {
+        "created": sorted(set(after["objects"]) - set(before["objects"])),
+        "deleted": sorted(set(before["objects"]) - set(after["objects"])),
+        "touched": sorted(touched),
+        "restarted_pods": restarted_pods(before, after),
+        "updated_statefulsets": sorted(
+            name for name, sts in before["statefulsets"].items()
+            if name in after["statefulsets"] and after["statefulsets"][name] != sts
+        ),
+    }
+
+
+class FleetTracker(object):
+    def __init__(self, ns=settings.test_namespace):
+        self.ns = ns
+        self.before = None
+        self.after = None
+        self.started_at = None
+        # CHI -> seconds since start() when its reconcile was seen completed, None when it was not reconciled
+        self.reconciled = {}
+
+    def start(self):
+        self.before = snapshot(self.ns)
+        self.started_at = time.time()
+        return self
+
+    def wait_reconciled(self, timeout=900, settle=60, interval=5):
+        """Wait until every CHI completed a reconcile started after start(), CHIs which have not started one
+        within `settle` seconds are considered not reconciled. Returns {chi: seconds or None}."""
+        pending = set(self.before["chis"])
+        while pending and time.time() - self.started_at < timeout:
+            now = snapshot(self.ns)["chis"]
+            elapsed = round(time.time() - self.started_at, 3)
+            for name in sorted(pending):
+                old, new = self.before["chis"][name], now.get(name)
+                if new is None:
+                    pending.discard(name)
+                    self.reconciled[name] = None
+                elif new["taskIDsCompleted"] != old["taskIDsCompleted"] and new["status"] == "Completed":
+                    pending.discard(name)
+                    self.reconciled[name] = elapsed
+                elif new["taskIDsStarted"] == old["taskIDsStarted"] and elapsed > settle:
+                    pending.discard(name)
+                    self.reconciled[name] = None
+            if pending:
+                time.sleep(interval)
+        for name in pending:
+            debug(f"{name} reconcile has not completed in {timeout}s")
+            self.reconciled[name] = None
+        return self.reconciled
+
+    def finish(self):
+        self.after = snapshot(self.ns)
+        return self.report()
+
+    def report(self):
+        result = diff(self.before, self.after)
+        durations = [t for t in self.reconciled.values() if t is not None]
+        result["chis"] = len(self.before["chis"])
+        result["reconciled_chis"] = len(durations)
+        result["reconcile_s"] = max(durations, default=0)
+        result["duration_s"] = self.after["time"] - self.started_at
+        return result
+
+    def results(self):
+        """Fleet size, reconciled CHIs and counts of touched, created and deleted objects and restarted pods."""
+        report = self.report()
+        return {
+            "chis": report["chis"],
+            "pods": len(self.before["pods"]),
+            "objects": len(self.before["objects"]),
+            "reconciled_chis": report["reconciled_chis"],
+            "reconcile_s": report["reconcile_s"],
+            "touched_objects": len(report["touched"]),
+            "created_objects": len(report["created"]),
+            "deleted_objects": len(report["deleted"]),
+            "updated_statefulsets": len(report["updated_statefulsets"]),
+            "restarted_pods": len(report["restarted_pods"]),
+        }
+
+    def note_report(self):
+        report = self.report()
+        note(f"{report['chis']} CHIs, {report['reconciled_chis']} reconciled in {report['reconcile_s']}s, "
+             f"{len(report['touched'])} objects touched, {len(report['created'])} created, {len(report['deleted'])} deleted, "
+             f"{len(report['updated_statefulsets'])} StatefulSets updated, {len(report['restarted_pods'])} pods restarted")
+        for kind in ("created", "deleted", "touched", "updated_statefulsets"):
+            if report[kind]:
+                debug(f"{kind}: {report[kind]}")
+        for pod, reason in report["restarted_pods"].items():
+            note(f"{pod} restarted: {reason}")
+        return report
@@ -0,0 +1,293 @@
+"""ZooKeeper and ClickHouse Keeper probes without shell pipelines.
+
+Pod readiness comes from one structured `kubectl get pods` list. Server state comes from four-letter
+words (ruok, mntr, srvr), and znodes from a minimal ZooKeeper protocol client. With native kubectl both
+go over plain sockets through one port-forward per keeper pod. Otherwise four-letter words are sent
+from inside the keeper pod with bash /dev/tcp, and znodes are listed by the CLI client of the keeper image.
+
+    with keeper.KeeperProbe("zookeeper") as probe:
+        probe.mntr("zookeeper-0")["zk_server_state"]
+        probe.get_children("zookeeper-0", "/")
+"""
+import re
+import shlex
+import socket
+import struct
+import subprocess
+import threading
+
+import e2e.kubectl as kubectl
+import e2e.settings as settings
+
+from testflows.core import current, debug
+
+client_port = 2181
+
+pod_prefixes = {
+    "zookeeper": "zookeeper",
+    "zookeeper-operator": "zookeeper",
+    "clickhouse-keeper": "clickhouse-keeper",
+}
+service_names = {
+    "zookeeper": "zookeeper",
+    "zookeeper-operator": "zookeeper-client",
+    "clickhouse-keeper": "zookeeper",
+}
+# children of / which are expected in an installation used by ClickHouse
+root_znodes = {
+    "zookeeper": ["clickhouse", "zookeeper"],
+    "zookeeper-operator": ["clickhouse", "zookeeper", "zookeeper-operator"],
+    "clickhouse-keeper": ["clickhouse"],
+}
+
+# `ls <path>` inside a keeper pod, when its client port is not reachable from the tests
+ls_commands = {
+    "zookeeper": "./bin/zkCli.sh ls {path}",
+    "zookeeper-operator": "./bin/zkCli.sh ls {path}",
+    "clickhouse-keeper": f"clickhouse keeper-client --host 127.0.0.1 --port {client_port} -q \"ls {{path}}\"",
+}
+
+# ZooKeeper protocol opcodes
+op_get_children = 8
+op_close = -11
+
+
+def pods(keeper_type, ns=settings.test_namespace):
+    """{pod: pod object} of keeper pods."""
+    prefix = re.compile(rf"^{pod_prefixes[keeper_type]}-\d+$")
+    return {
+        pod["metadata"]["name"]: pod
+        for pod in kubectl.get("pod", "", ns=ns)["items"]
+        if prefix.match(pod["metadata"]["name"])
+    }
+
+
+def ready_pods(keeper_type, ns=settings.test_namespace):
+    """{pod: ready} of keeper pods, a pod is ready when it is Running and all its containers are ready."""
+    result = {}
+    for name, pod in pods(keeper_type, ns).items():
+        status = pod.get("status", {})
+        containers = status.get("containerStatuses", []) or []
+        result[name] = status.get("phase") == "Running" and bool(containers) and all(c.get("ready") for c in containers)
+    return result
+
+
+def restart_counts(keeper_type, ns=settings.test_namespace):
+    """{pod: container restarts} of keeper pods."""
+    return {
+        name: sum(c.get("restartCount", 0) for c in pod.get("status", {}).get("containerStatuses", []) or [])
+        for name, pod in pods(keeper_type, ns).items()
+    }
+
+
+def probe_failures(keeper_type, ns=settings.test_namespace):
+    """{pod: failed liveness and readiness probes} of keeper pods, counted from Unhealthy events."""
+    prefix = re.compile(rf"^{pod_prefixes[keeper_type]}-\d+$")
+    result = {}
+    for event in kubectl.get("events", "", ns=ns)["items"]:
+        obj = event.get("involvedObject", {})
+        if obj.get("kind") != "Pod" or not prefix.match(obj.get("name", "")) or event.get("reason") != "Unhealthy":
+            continue
+        count = (event.get("series") or {}).get("count") or event.get("count") or 1
+        result[obj["name"]] = result.get(obj["name"], 0) + count
+    return result
+
+
+def parse_ls(keeper_type, out):
+    """Children from `ls` output, zkCli.sh prints `[a, b]` after its log lines, keeper-client prints `a b`."""
+    lines = [line.strip() for line in out.splitlines() if line.strip()]
+    if keeper_type == "clickhouse-keeper":
+        return sorted(lines[-1].split()) if lines else []
+    for line in reversed(lines):
+        if line.startswith("[") and line.endswith("]"):
+            return sorted(child.strip() for child in line[1:-1].split(",") if child.strip())
+    return []
+
+
+def ready_endpoints(keeper_type, ns=settings.test_namespace):
+    """Number of ready addresses behind the keeper client service."""
+    try:
+        endpoints = kubectl.get("endpoints", service_names[keeper_type], ns=ns, ok_to_fail=True)
+    except ValueError:
+        # service does not exist yet
+        return 0
+    return sum(len(subset.get("addresses", []) or []) for subset in endpoints.get("subsets", []) or [])
+
+
+def parse_mntr(out):
+    """mntr output as {key: value}, numbers are converted to int."""
+    result = {}
+    for line in out.splitlines():
+        fields = line.strip().split("\t", 1)
+        if len(fields) != 2:
+            continue
+        key, value = fields
+        result[key] = int(value) if value.lstrip("-").isdigit() else value
+    return result
+
+
+class KeeperClient(object):
+    """Socket client of a ZooKeeper or ClickHouse Keeper server for four-letter words and read-only requests."""
+
+    def __init__(self, host="127.0.0.1", port=client_port, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def four_letter(self, command):
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as s:
+            s.sendall(command.encode())
+            chunks = []
+            while True:
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return b"".join(chunks).decode(errors="replace")
+
+    def get_children(self, path):
+        """Children of path, via a session which is closed right after the request."""
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as s:
+            # protocolVersion, lastZxidSeen, timeOut, sessionId, passwd, readOnly
+            connect = struct.pack(">iqiqi16s?", 0, 0, int(self.timeout * 1000), 0, 16, b"\x00" * 16, False)
+            self.send(s, connect)
+            self.receive(s)
+            path_bytes = path.encode()
+            self.send(s, struct.pack(f">iii{len(path_bytes)}s?", 1, op_get_children, len(path_bytes), path_bytes, False))
+            reply = self.receive(s)
+            xid, zxid, err = struct.unpack_from(">iqi", reply)
+            if err != 0:
+                raise RuntimeError(f"getChildren {path} failed with ZooKeeper error {err}")
+            offset = 16
+            count, = struct.unpack_from(">i", reply, offset)
+            offset += 4
+            children = []
+            for _ in range(max(count, 0)):
+                length, = struct.unpack_from(">i", reply, offset)
+                offset += 4
+                children.append(reply[offset:offset + length].decode())
+                offset += length
+            self.send(s, struct.pack(">ii", 2, op_close))
+        return sorted(children)
+
+    @staticmethod
+    def send(s, payload):
+        s.sendall(struct.pack(">i", len(payload)) + payload)
+
+    @staticmethod
+    def receive(s):
+        length, = struct.unpack(">i", KeeperClient.receive_exactly(s, 4))
+        return KeeperClient.receive_exactly(s, length)
+
+    @staticmethod
+    def receive_exactly(s, size):
+        data = b""
+        while len(data) < size:
+            chunk = s.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed by keeper")
+            data += chunk
+        return data
+
+
+class KeeperProbe(object):
+    """Four-letter words and znodes of keeper pods, port-forwards are reused until close().
+
+    Four-letter words may be sent from several threads, get_children is for the main thread only.
+    """
+
+    def __init__(self, keeper_type="zookeeper", ns=settings.test_namespace, timeout=10.0):
+        self.keeper_type = keeper_type
+        self.ns = ns
+        self.timeout = timeout
+        self.native = current().context.native
+        self.forwards = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            for forward in self.forwards.values():
+                forward.stop()
+            self.forwards = {}
+
+    def drop(self, pod):
+        """Stop the port-forward of the pod, e.g. after the pod was restarted."""
+        with self.lock:
+            forward = self.forwards.pop(pod, None)
+        if forward is not None:
+            forward.stop()
+
+    def client(self, pod):
+        with self.lock:
+            forward = self.forwards.get(pod)
+            if forward is None or not forward.alive():
+                forward = kubectl.PortForward(f"pod/{pod}", client_port, ns=self.ns).start()
+                self.forwards[pod] = forward
+        return KeeperClient(port=forward.local_port, timeout=self.timeout)
+
+    def four_letter(self, pod, command):
+        """Response to a four-letter word, empty when the pod does not answer."""
+        try:
+            if self.native:
+                return self.client(pod).four_letter(command)
+            # not kubectl.launch, probes are also sent from background threads, e.g. by e2e.keeper_load
+            script = f"exec 3<>/dev/tcp/127.0.0.1/{client_port}; printf {command} >&3; cat <&3"
+            cmd = f"{settings.kubectl_cmd} exec {pod} --namespace={self.ns} -- bash -c {shlex.quote(script)}"
+            return subprocess.run(shlex.split(cmd), capture_output=True, text=True, timeout=self.timeout + 30).stdout
+        except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+            debug(f"{command} to {pod} failed: {e}")
+            self.drop(pod)
+            return ""
+
+    def ruok(self, pod):
+        return self.four_letter(pod, "ruok").strip() == "imok"
+
+    def mntr(self, pod):
+        return parse_mntr(self.four_letter(pod, "mntr"))
+
+    def srvr(self, pod):
+        """srvr output as {key: value}, e.g. Mode and Zxid."""
+        result = {}
+        for line in self.four_letter(pod, "srvr").splitlines():
+            key, sep, value = line.partition(":")
+            if sep:
+                result[key.strip()] = value.strip()
+        return result
+
+    def quorum(self, pods):
+        """{pod: server state} from mntr, e.g. leader, follower or standalone, missing when the pod does not answer."""
+        result = {}
+        for pod in pods:
+            state = self.mntr(pod).get("zk_server_state")
+            if state is not None:
+                result[pod] = state
+        return result
+
+    def get_children(self, pod, path):
+        """Children of path read from the pod, empty when the pod does not answer."""
+        if not self.native:
+            command = ls_commands[self.keeper_type].format(path=path)
+            out = kubectl.launch(f"exec {pod} -- bash -c '{command}'", ns=self.ns, ok_to_fail=True, timeout=self.timeout + 30)
+            return parse_ls(self.keeper_type, out)
+        try:
+            return self.client(pod).get_children(path)
+        except (OSError, RuntimeError, struct.error) as e:
+            debug(f"getChildren {path} from {pod} failed: {e}")
+            self.drop(pod)
+            return []
+
+
+def has_quorum(states, pod_count):
+    """States of all pod_count pods are known, and they are one standalone server or one leader with followers."""
+    if len(states) != pod_count:
+        return False
+    values = sorted(states.values())
+    if pod_count == 1:
+        return values in (["standalone"], ["leader"])
+    return values.count("leader") == 1 and values.count("follower") == pod_count - 1
@@ -0,0 +1,252 @@
+"""Replicated insert load on a CHI, with keeper and ClickHouse side samples of how keeper copes with it.
+
+Every replica gets its own e2e.workload.Workload of inserts into a replicated table at `rate` inserts per
+second. Every inserted row is a part of its own, so each row is a keeper transaction from every replica in
+parallel. A sampler thread records keeper `mntr` latency and outstanding requests of every keeper pod, and
+ZooKeeper profile events of every ClickHouse host from one query over the all-sharded cluster:
+
+    with keeper_load.KeeperLoad(chi_name, replica_pods, "zookeeper", rate=10, user="bench", password="bench") as load:
+        time.sleep(60)
+    report = load.note_report()
+    assert report["probe_failures"] == {}, error()
+
+Inserts go over kubectl proxy, so the user has to be allowed from any network, see e2e.prober.
+"""
+import time
+
+import e2e.benchmark as benchmark
+import e2e.keeper as keeper
+import e2e.prober as prober
+import e2e.settings as settings
+import e2e.workload as workload
+
+from testflows.core import note, debug
+
+table = "zookeeper_bench.zookeeper_bench"
+# the table is created on every replica, the zookeeper_bench database has to exist on every replica as well
+create_table_sql = f"""
+    CREATE TABLE {table} ON CLUSTER 'all-sharded' (p UInt64, x UInt64)
+    ENGINE=ReplicatedSummingMergeTree('/clickhouse/tables/{{database}}/{{table}}', '{{replica}}' )
+    ORDER BY tuple()
+    PARTITION BY p
+    SETTINGS in_memory_parts_enable_wal=0,
+        min_bytes_for_wide_part=104857600,
+        min_bytes_for_compact_part=10485760,
+        parts_to_delay_insert=1000000,
+        parts_to_throw_insert=1000000,
+        max_parts_in_total=1000000
+"""
+# one part per row, without deduplication every part is a new block in keeper
+insert_sql = (
+    "INSERT INTO {table} SELECT rand(1)%100, rand(2) FROM numbers({batch_size}) "
+    "SETTINGS max_block_size=1, min_insert_block_size_rows=1, min_insert_block_size_bytes=1, insert_deduplicate=0"
+)
+
+mntr_keys = ("zk_avg_latency", "zk_max_latency", "zk_outstanding_requests")
+clickhouse_events = ("ZooKeeperWaitMicroseconds", "ZooKeeperTransactions")
+events_sql = (
+    "SELECT hostName(), event, value FROM clusterAllReplicas('all-sharded', system.events) "
+    "WHERE event IN ({events}) SETTINGS skip_unavailable_shards=1"
+).format(events=", ".join(f"'{event}'" for event in clickhouse_events))
+
+
+def number(value):
+    """mntr value as float, newer ZooKeeper reports fractional latencies, None when it is not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class KeeperLoad(benchmark.Sampler):
+    def __init__(self, chi_name, pods, keeper_type="zookeeper", keeper_pod_count=3, rate=10, batch_size=None,
+                 writers=None, sample_interval=1.0, user="", password="", timeout=10.0, ns=settings.test_namespace):
+        """pods are the replica pods inserts go to, rate is inserts per second per replica, timeout is per insert,
+        batch_size and writers per replica are KEEPER_BENCHMARK_* settings by default."""
+        super().__init__(join_timeout=sample_interval + 60)
+        self.chi_name = chi_name
+        self.pods = pods
+        self.keeper_type = keeper_type
+        self.keeper_pods = [f"{keeper.pod_prefixes[keeper_type]}-{i}" for i in range(keeper_pod_count)]
+        self.rate = rate
+        self.batch_size = settings.keeper_benchmark_batch_size if batch_size is None else batch_size
+        self.writers = settings.keeper_benchmark_writers if writers is None else writers
+        self.sample_interval = sample_interval
+        self.user = user
+        self.password = password
+        self.ns = ns
+        self.workloads = {
+            pod: workload.Workload(
+                prober.Target(pod, pod=pod), readers=0, writers=self.writers, write_table=table,
+                batch_size=self.batch_size, write_qps=self.rate, write_sql=insert_sql,
+                user=user, password=password, timeout=timeout, ns=ns,
+            )
+            for pod in pods
+        }
+        self.probe = None
+        self.proxy = None
+        # (unixtime, keeper pod, {mntr key: value})
+        self.keeper_samples = []
+        # (unixtime, {host: {event: value}})
+        self.clickhouse_samples = []
+        self.probe_failures_before = {}
+        self.restarts_before = {}
+        self.probe_failures = {}
+        self.restarts = {}
+
+    def setup(self):
+        self.probe_failures_before = keeper.probe_failures(self.keeper_type, self.ns)
+        self.restarts_before = keeper.restart_counts(self.keeper_type, self.ns)
+        self.probe = keeper.KeeperProbe(self.keeper_type, self.ns, timeout=5.0)
+        for pod in self.keeper_pods:
+            # latency statistics of mntr are cumulative, reset them to cover the load only
+            self.probe.four_letter(pod, "srst")
+        self.proxy = prober.start_proxy()
+        for load in self.workloads.values():
+            load.start()
+
+    def stop(self):
+        # inserts stop first, so the last samples cover all of them
+        for load in self.workloads.values():
+            load.stop()
+        super().stop()
+
+    def cleanup(self):
+        if self.probe is not None:
+            self.probe.close()
+        if self.proxy is not None:
+            self.proxy.stop()
+        if self.started_at is not None:
+            self.probe_failures = self.delta(keeper.probe_failures(self.keeper_type, self.ns), self.probe_failures_before)
+            self.restarts = self.delta(keeper.restart_counts(self.keeper_type, self.ns), self.restarts_before)
+
+    @staticmethod
+    def delta(after, before):
+        """{pod: increase} of pods whose counter increased."""
+        return {pod: n - before.get(pod, 0) for pod, n in after.items() if n > before.get(pod, 0)}
+
+    def run(self):
+        client = prober.Client(self.proxy, self.user, self.password, timeout=5.0, ns=self.ns)
+        target = prober.Target(self.pods[0], pod=self.pods[0])
+        try:
+            self.every(self.sample_interval, lambda: self.sample(client, target))
+        finally:
+            client.close()
+
+    def sample(self, client, target):
+        for pod in self.keeper_pods:
+            mntr = self.probe.mntr(pod)
+            if mntr:
+                self.keeper_samples.append((time.time(), pod, {key: number(mntr.get(key)) for key in mntr_keys}))
+        try:
+            events = {}
+            for line in client.query(target, events_sql).splitlines():
+                host, event, value = line.split("\t")
+                events.setdefault(host, {})[event] = int(value)
+            self.clickhouse_samples.append((time.time(), events))
+        except Exception as e:
+            debug(f"system.events sample failed: {type(e).__name__}: {e}")
+
+    def clickhouse_delta(self, event):
+        """Increase of a ClickHouse profile event summed over hosts between the first and the last sample."""
+        if len(self.clickhouse_samples) < 2:
+            return 0
+        first, last = self.clickhouse_samples[0][1], self.clickhouse_samples[-1][1]
+        return sum(events.get(event, 0) - first.get(host, {}).get(event, 0) for host, events in last.items() if host in first)
+
+    def report(self):
+        """Throughput and latency of inserts, keeper latency and load, ZooKeeper waits of ClickHouse, probe failures."""
+        duration = max((self.stopped_at or time.time()) - self.started_at, 1e-9)
+        writes = {pod: load.report()["write"] for pod, load in self.workloads.items()}
+        latencies = [latency for load in self.workloads.values() for _, latency in load.stats["write"].ok]
+        inserts = sum(w["ops"] - w["errors"] for w in writes.values())
+        errors = sum(w["errors"] for w in writes.values())
+        error_classes = {}
+        for w in writes.values():
+            for error_class, count in w["error_classes"].items():
+                error_classes[error_class] = error_classes.get(error_class, 0) + count
+        keeper_values = {
+            key: [sample[key] for _, _, sample in self.keeper_samples if sample[key] is not None] for key in mntr_keys
+        }
+        transactions = self.clickhouse_delta("ZooKeeperTransactions")
+        wait_us = self.clickhouse_delta("ZooKeeperWaitMicroseconds")
+        return {
+            "duration_s": duration,
+            "replicas": len(self.pods),
+            "target_inserts_per_s": self.rate * len(self.pods),
+            "inserts": inserts,
+            "inserts_per_s": inserts / duration,
+            "rows_per_s": inserts * self.batch_size / duration,
+            "insert_errors": errors,
+            "insert_error_rate": errors / (inserts + errors) if inserts + errors else 0.0,
+            "insert_error_classes": error_classes,
+            "insert_latency": benchmark.summarize(latencies),
+            "per_replica_inserts_per_s": {pod: w["qps"] for pod, w in writes.items()},
+            "keeper_avg_latency_ms": benchmark.summarize(keeper_values["zk_avg_latency"]),
+            "keeper_max_latency_ms": max(keeper_values["zk_max_latency"], default=0),
+            "keeper_outstanding_requests": benchmark.summarize(keeper_values["zk_outstanding_requests"]),
+            "keeper_samples": len(self.keeper_samples),
+            "zookeeper_transactions_per_s": transactions / duration,
+            "zookeeper_wait_us_per_s": wait_us / duration,
+            "zookeeper_wait_us_per_transaction": wait_us / transactions if transactions else 0.0,
+            "probe_failures": self.probe_failures,
+            "restarts": self.restarts,
+        }
+
+    def results(self):
+        """Insert throughput and latency, keeper latency, probe failures and restarts as numbers."""
+        report = self.report()
+        latency = report["insert_latency"]
+        return {
+            "inserts_per_s": report["inserts_per_s"],
+            "rows_per_s": report["rows_per_s"],
+            "insert_error_rate": report["insert_error_rate"],
+            "insert_p50_s": latency["p50"] if latency["count"] else 0.0,
+            "insert_p99_s": latency["p99"] if latency["count"] else 0.0,
+            "keeper_avg_latency_ms": report["keeper_avg_latency_ms"]["max"] if report["keeper_avg_latency_ms"]["count"] else 0.0,
+            "keeper_max_latency_ms": report["keeper_max_latency_ms"],
+            "keeper_outstanding_requests_max":
+                report["keeper_outstanding_requests"]["max"] if report["keeper_outstanding_requests"]["count"] else 0.0,
+            "zookeeper_wait_us_per_transaction": report["zookeeper_wait_us_per_transaction"],
+            "probe_failures": sum(report["probe_failures"].values()),
+            "restarts": sum(report["restarts"].values()),
+        }
+
+    def note_report(self):
+        report = self.report()
+        latency = report["insert_latency"]
+        percentiles = "" if not latency["count"] else \
+            f", p50 {latency['p50'] * 1000:.1f}ms, p99 {latency['p99'] * 1000:.1f}ms"
+        note(f"{report['inserts']} inserts in {round(report['duration_s'], 1)}s to {report['replicas']} replicas, "
+             f"{report['inserts_per_s']:.1f}/s of {report['target_inserts_per_s']}/s target, "
+             f"{report['insert_errors']} errors {report['insert_error_classes']}{percentiles}")
+        keeper_avg = report["keeper_avg_latency_ms"]
+        outstanding = report["keeper_outstanding_requests"]
+        if keeper_avg["count"]:
+            note(f"{self.keeper_type} avg latency up to {keeper_avg['max']}ms, max latency {report['keeper_max_latency_ms']}ms, "
+                 f"outstanding requests p99 {outstanding['p99'] if outstanding['count'] else 0}, "
+                 f"{report['keeper_samples']} mntr samples")
+        note(f"ClickHouse {report['zookeeper_transactions_per_s']:.1f} keeper transactions/s, "
+             f"{report['zookeeper_wait_us_per_transaction']:.0f}us ZooKeeperWaitMicroseconds per transaction")
+        for pod, count in report["probe_failures"].items():
+            note(f"{pod}: {count} failed probes")
+        for pod, count in report["restarts"].items():
+            note(f"{pod}: {count} restarts")
+        return report
+
+
+def store(load, keeper_type, rate):
+    """Store results of the load as the keeper_load benchmark."""
+    return benchmark.store(
+        "keeper_load",
+        params={
+            "keeper_type": keeper_type,
+            "replicas": len(load.pods),
+            "rate": rate,
+            "batch_size": load.batch_size,
+            "writers": load.writers,
+            "clickhouse_version": settings.clickhouse_version,
+        },
+        results=load.results(),
+        higher_is_better=["inserts_per_s", "rows_per_s"],
+    )
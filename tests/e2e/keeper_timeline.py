@@ -0,0 +1,179 @@
+"""Timeline of ClickHouse read-only replicas and keeper quorum while keepers and replicas are rescaled.
+
+A sampler thread queries ReadonlyReplica of every host over the all-sharded cluster and the mntr server
+state of every keeper pod every KEEPER_TIMELINE_INTERVAL seconds, so read-only time is measured instead of
+only waited out:
+
+    with keeper_timeline.RescaleTimeline(chi_name, "zookeeper", user="bench", password="bench") as timeline:
+        timeline.mark("CH 1 -> 2 + keeper 1 -> 3")
+        ... rescale and wait ...
+    summary = timeline.note_report()
+    summary["readonly_s"]
+
+A sample holds until the next one, so durations have the resolution of the interval. Queries go over
+kubectl proxy to the CHI service, so the user has to be allowed from any network, see e2e.prober.
+"""
+import json
+import time
+
+import e2e.benchmark as benchmark
+import e2e.keeper as keeper
+import e2e.prober as prober
+import e2e.settings as settings
+
+from testflows.core import note, debug
+
+readonly_sql = (
+    "SELECT hostName(), value FROM clusterAllReplicas('all-sharded', system.metrics) "
+    "WHERE metric = 'ReadonlyReplica' SETTINGS skip_unavailable_shards=1"
+)
+# a keeper pod which did not answer is retried after this many seconds, it may not exist at the current scale
+keeper_retry_interval = 1.0
+
+
+class RescaleTimeline(benchmark.Sampler):
+    def __init__(self, chi_name, keeper_type="zookeeper", keeper_pod_count=3, interval=None, user="", password="",
+                 ns=settings.test_namespace):
+        """keeper_pod_count is the largest number of keeper pods during the rescale,
+        interval is settings.keeper_timeline_interval by default."""
+        self.interval = settings.keeper_timeline_interval if interval is None else interval
+        super().__init__(join_timeout=self.interval + 60)
+        self.chi_name = chi_name
+        self.keeper_type = keeper_type
+        self.keeper_pods = [f"{keeper.pod_prefixes[keeper_type]}-{i}" for i in range(keeper_pod_count)]
+        self.user = user
+        self.password = password
+        self.ns = ns
+        self.target = prober.Target(chi_name, service=f"clickhouse-{chi_name}")
+        self.client_pod = f"chi-{chi_name}-default-0-0-0"
+        # (unixtime, {host: ReadonlyReplica} or None when ClickHouse did not answer, {keeper pod: server state})
+        self.samples = []
+        # (unixtime, label) of phases of the rescale
+        self.marks = []
+        self.probe = None
+        self.proxy = None
+
+    def setup(self):
+        self.probe = keeper.KeeperProbe(self.keeper_type, self.ns, timeout=2.0)
+        self.proxy = prober.start_proxy()
+
+    def cleanup(self):
+        if self.probe is not None:
+            self.probe.close()
+        if self.proxy is not None:
+            self.proxy.stop()
+
+    def mark(self, label):
+        """Start of a phase, durations are reported per phase as well."""
+        self.marks.append((time.time(), label))
+
+    def run(self):
+        client = prober.Client(self.proxy, self.user, self.password, timeout=2.0, client_pod=self.client_pod, ns=self.ns)
+        retry_at = {}
+        try:
+            self.every(self.interval, lambda: self.sample(client, retry_at))
+        finally:
+            client.close()
+
+    def sample(self, client, retry_at):
+        now = time.time()
+        try:
+            readonly = {}
+            for line in client.query(self.target, readonly_sql).splitlines():
+                host, value = line.split("\t")
+                readonly[host] = int(value)
+        except Exception as e:
+            debug(f"ReadonlyReplica sample failed: {type(e).__name__}: {e}")
+            readonly = None
+        states = {}
+        for pod in self.keeper_pods:
+            if retry_at.get(pod, 0) > now:
+                continue
+            state = self.probe.mntr(pod).get("zk_server_state")
+            if state is None:
+                retry_at[pod] = now + keeper_retry_interval
+            else:
+                states[pod] = state
+        self.samples.append((now, readonly, states))
+
+    def durations(self, start=None, end=None):
+        """Seconds of the samples between start and end per condition, a sample lasts until the next one."""
+        start = self.started_at if start is None else start
+        end = (self.stopped_at or time.time()) if end is None else end
+        result = {"duration_s": end - start, "readonly_s": 0.0, "clickhouse_unavailable_s": 0.0,
+                  "no_quorum_s": 0.0, "readonly_host_s": {}}
+        for i, (t, readonly, states) in enumerate(self.samples):
+            next_t = self.samples[i + 1][0] if i + 1 < len(self.samples) else end
+            seconds = min(next_t, end) - max(t, start)
+            if seconds <= 0:
+                continue
+            if readonly is None:
+                result["clickhouse_unavailable_s"] += seconds
+            else:
+                if any(readonly.values()):
+                    result["readonly_s"] += seconds
+                for host, value in readonly.items():
+                    if value:
+                        result["readonly_host_s"][host] = result["readonly_host_s"].get(host, 0.0) + seconds
+            if not any(state in ("leader", "standalone") for state in states.values()):
+                result["no_quorum_s"] += seconds
+        return result
+
+    def transitions(self):
+        """[(seconds since start, change)] of read-only hosts, ClickHouse availability and keeper states."""
+        result = [(round(t - self.started_at, 3), f"phase {label}") for t, label in self.marks]
+        last_readonly, last_states = {}, {}
+        for t, readonly, states in self.samples:
+            offset = round(t - self.started_at, 3)
+            if readonly != last_readonly:
+                if readonly is None:
+                    result.append((offset, "ClickHouse unavailable"))
+                else:
+                    result.append((offset, "read-only " + (", ".join(h for h, v in sorted(readonly.items()) if v) or "none")))
+                last_readonly = readonly
+            if states != last_states:
+                result.append((offset, f"{self.keeper_type} " + (", ".join(f"{p}={s}" for p, s in sorted(states.items())) or "no answer")))
+                last_states = states
+        return sorted(result, key=lambda item: item[0])
+
+    def report(self):
+        """durations() of the whole timeline, with "phases": {label: durations()} between marks."""
+        result = self.durations()
+        result["samples"] = len(self.samples)
+        result["phases"] = {}
+        bounds = self.marks + [(self.stopped_at or time.time(), None)]
+        for (start, label), (end, _) in zip(bounds, bounds[1:]):
+            result["phases"][label] = self.durations(start, end)
+        return result
+
+    def results(self):
+        """Read-only, unavailable and no quorum seconds of the whole timeline."""
+        report = self.report()
+        return {key: report[key] for key in ("duration_s", "readonly_s", "clickhouse_unavailable_s", "no_quorum_s")}
+
+    def note_report(self):
+        report = self.report()
+        note(f"{report['samples']} samples in {round(report['duration_s'], 1)}s: replicas read-only {report['readonly_s']:.1f}s, "
+             f"ClickHouse unavailable {report['clickhouse_unavailable_s']:.1f}s, {self.keeper_type} without quorum {report['no_quorum_s']:.1f}s")
+        for label, phase in report["phases"].items():
+            note(f"{label}: {round(phase['duration_s'], 1)}s, read-only {phase['readonly_s']:.1f}s {phase['readonly_host_s']}, "
+                 f"unavailable {phase['clickhouse_unavailable_s']:.1f}s, no quorum {phase['no_quorum_s']:.1f}s")
+        for offset, change in self.transitions():
+            debug(f"+{offset}s {change}")
+        return report
+
+
+def store(timeline, params):
+    """Store results of the timeline as the keeper_rescale benchmark, and its transitions to
+    keeper_rescale_timelines.jsonl."""
+    record = benchmark.store("keeper_rescale", params=params, results=timeline.results())
+    report = timeline.report()
+    with open(benchmark.results_file("keeper_rescale_timelines"), "a") as f:
+        f.write(json.dumps({
+            "timestamp": record["timestamp"],
+            "operator_version": record["operator_version"],
+            "params": params,
+            "phases": report["phases"],
+            "transitions": timeline.transitions(),
+        }, sort_keys=True) + "\n")
+    return record
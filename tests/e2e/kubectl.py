@@ -1,27 +1,40 @@
 import json
 import os
+import re
 import time
+import shlex
+import queue
+import threading
+import subprocess
 
 from testflows.core import *
 from testflows.asserts import error
 from testflows.connect import Shell
 
 import e2e.settings as settings
+import e2e.normalizer as normalizer
 import e2e.yaml_manifest as yaml_manifest
 import e2e.util as util
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 max_retries = 20
 
-shell = Shell()
-shell.timeout = 300
+# created on first use, Shell() needs a running TestFlows session
+shell = None
 namespace = settings.test_namespace
-kubectl_cmd = settings.kubectl_cmd
+
+
+def get_shell():
+    global shell
+    if shell is None:
+        shell = Shell()
+        shell.timeout = 300
+    return shell
 
 
 def launch(command, ok_to_fail=False, ns=namespace, timeout=600):
     # Build command
-    cmd = f"{kubectl_cmd} "
+    cmd = f"{settings.kubectl_cmd} "
     cmd_args = command.split(" ")
     if ns is not None and ns != "" and ns != "--all-namespaces":
         cmd += f"{cmd_args[0]} --namespace={ns} "
@@ -39,7 +52,7 @@ def launch(command, ok_to_fail=False, ns=namespace, timeout=600):
     if hasattr(current().context, "shell"):
         cmd = current().context.shell(cmd, timeout=timeout)
     else:
-        cmd = shell(cmd, timeout=timeout)
+        cmd = get_shell()(cmd, timeout=timeout)
 
     # Check command failure
     code = cmd.exitcode
@@ -51,6 +64,102 @@ def launch(command, ok_to_fail=False, ns=namespace, timeout=600):
     return cmd.output if (code == 0) or ok_to_fail else ""
 
 
+class PortForward(object):
+    """Background `kubectl port-forward` to a local port, 0 lets kubectl choose a free one.
+
+    The forwarded port is reachable from the test host only when kubectl runs natively, not via docker-compose.
+    """
+    forwarding_re = re.compile(r"Forwarding from 127\.0\.0\.1:(\d+) ->")
+
+    def __init__(self, target, remote_port, local_port=0, ns=namespace, timeout=30):
+        self.target = target
+        self.remote_port = remote_port
+        self.local_port = local_port
+        self.ns = ns
+        self.timeout = timeout
+        self.process = None
+        self.output = []
+
+    def command(self):
+        return f"{settings.kubectl_cmd} port-forward --namespace={self.ns} {self.target} {self.local_port or ''}:{self.remote_port}"
+
+    def start(self):
+        self.process = subprocess.Popen(
+            shlex.split(self.command()), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, text=True,
+        )
+        lines = queue.Queue()
+
+        def drain():
+            # keep reading, kubectl blocks when the pipe is full
+            for line in self.process.stdout:
+                lines.put(line)
+            lines.put(None)
+
+        threading.Thread(target=drain, daemon=True).start()
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                line = lines.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                line = None
+            if line is None:
+                self.stop()
+                raise RuntimeError(f"{self.command()} failed: {''.join(self.output)}")
+            self.output.append(line)
+            m = self.forwarding_re.search(line)
+            if m is not None:
+                self.local_port = int(m.group(1))
+                return self
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.local_port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+
+def port_forward(target, remote_port, local_port=0, ns=namespace, timeout=30):
+    return PortForward(target, remote_port, local_port=local_port, ns=ns, timeout=timeout)
+
+
+class Proxy(PortForward):
+    """Background `kubectl proxy`, services and pods are reachable via the API server:
+
+        {url}/api/v1/namespaces/{ns}/services/{service}:{port}/proxy/
+        {url}/api/v1/namespaces/{ns}/pods/{pod}:{port}/proxy/
+
+    Unlike port-forward, the connection to the proxy survives restarts of the pods behind it.
+    """
+    forwarding_re = re.compile(r"Starting to serve on 127\.0\.0\.1:(\d+)")
+
+    def __init__(self, local_port=0, timeout=30):
+        super().__init__(target="", remote_port=None, local_port=local_port, ns=None, timeout=timeout)
+
+    def command(self):
+        return f"{settings.kubectl_cmd} proxy --port={self.local_port}"
+
+    def service_path(self, service, port, ns=namespace):
+        return f"/api/v1/namespaces/{ns}/services/{service}:{port}/proxy/"
+
+    def pod_path(self, pod, port, ns=namespace):
+        return f"/api/v1/namespaces/{ns}/pods/{pod}:{port}/proxy/"
+
+
 def delete_chi(chi, ns=namespace, wait=True, ok_to_fail=False):
     with When(f"Delete chi {chi}"):
         launch(f"delete chi {chi}", ns=ns, timeout=600, ok_to_fail=ok_to_fail)
@@ -106,6 +215,13 @@ def create_and_check(manifest, check, ns=namespace, timeout=900):
             apply(util.get_full_path(t, False), ns=ns)
         time.sleep(5)
 
+    # pod expectations are computed from the CHI expanded by e2e.normalizer, the listed ones are a pre-flight check
+    host = None
+    if any(key in check for key in ("pod_volumes", "pod_ports", "pod_podAntiAffinity")):
+        normalized = normalizer.normalize(manifest, check.get("apply_templates", ()), ns=ns)
+        check_normalized_chi(normalized, check, ns=ns)
+        host = normalized["hosts"][0]
+
     apply(util.get_full_path(manifest, False), ns=ns, timeout=timeout)
 
     # Wait for reconcile to start before performing other checks. In some cases it does not start, so we can pass
@@ -127,13 +243,15 @@ def create_and_check(manifest, check, ns=namespace, timeout=900):
         check_pod_image(chi_name, check["pod_image"], ns=ns)
 
     if "pod_volumes" in check:
-        check_pod_volumes(chi_name, check["pod_volumes"], ns=ns)
+        volumes = [m["mountPath"] for m in host["volumeMounts"]] or check["pod_volumes"]
+        check_pod_volumes(chi_name, volumes, pod_name=host["pod"], ns=ns)
 
     if "pod_podAntiAffinity" in check:
-        check_pod_antiaffinity(chi_name, ns=ns)
+        check_pod_antiaffinity(chi_name, pod_name=host["pod"], ns=ns, expected=host["podAntiAffinity"])
 
     if "pod_ports" in check:
-        check_pod_ports(chi_name, check["pod_ports"], ns=ns)
+        ports = [p["containerPort"] for p in host["podSpec"]["containers"][0].get("ports", [])] or check["pod_ports"]
+        check_pod_ports(chi_name, ports, pod_name=host["pod"], ns=ns)
 
     if "service" in check:
         check_service(check["service"][0], check["service"][1], ns=ns)
@@ -166,12 +284,8 @@ def get_count(kind, name="", label="", ns=namespace):
     return len(out.splitlines()) - 1
 
 
-def count_objects(label="", ns=namespace):
-    return {
-        "statefulset": get_count("sts", ns=ns, label=label),
-        "pod": get_count("pod", ns=ns, label=label),
-        "service": get_count("service", ns=ns, label=label),
-    }
+def count_objects(label="", ns=namespace, kinds=("statefulset", "pod", "service")):
+    return {kind: get_count(kind, ns=ns, label=label) for kind in kinds}
 
 
 def apply(manifest, ns=namespace, validate=True, timeout=600):
@@ -189,24 +303,18 @@ def delete(manifest, ns=namespace, timeout=600):
 
 
 def wait_objects(chi, object_counts, ns=namespace):
-    with Then(
-            f"Waiting for: "
-            f"{object_counts['statefulset']} statefulsets, "
-            f"{object_counts['pod']} pods and "
-            f"{object_counts['service']} services "
-            f"to be available"
-    ):
+    """Wait for the CHI objects to reach object_counts, e.g. {"statefulset": 1, "pod": 1, "service": 2}.
+
+    Any kinds known to `kubectl get` may be counted, see chi_model.expected_object_counts().
+    """
+    expected = ", ".join(f"{count} {kind}s" for kind, count in object_counts.items())
+    with Then(f"Waiting for: {expected} to be available"):
         for i in range(1, max_retries):
-            cur_object_counts = count_objects(label=f"-l clickhouse.altinity.com/chi={chi}", ns=ns)
+            cur_object_counts = count_objects(label=f"-l clickhouse.altinity.com/chi={chi}", ns=ns, kinds=object_counts.keys())
             if cur_object_counts == object_counts:
                 break
-            with Then(
-                    f"Not ready yet. [ "
-                    f"statefulset: {cur_object_counts['statefulset']} "
-                    f"pod: {cur_object_counts['pod']} "
-                    f"service: {cur_object_counts['service']} ]. "
-                    f"Wait for {i * 5} seconds"
-            ):
+            current = " ".join(f"{kind}: {count}" for kind, count in cur_object_counts.items())
+            with Then(f"Not ready yet. [ {current} ]. Wait for {i * 5} seconds"):
                 time.sleep(i * 5)
         assert cur_object_counts == object_counts, error()
 
@@ -359,8 +467,8 @@ def get_pod_ports(chi_name, pod_name="", ns=namespace):
     return ports
 
 
-def check_pod_ports(chi_name, ports, ns=namespace):
-    pod_ports = get_pod_ports(chi_name, ns=ns)
+def check_pod_ports(chi_name, ports, pod_name="", ns=namespace):
+    pod_ports = get_pod_ports(chi_name, pod_name, ns=ns)
     with Then(f"Expect pod ports {pod_ports} to match {ports}"):
         assert sorted(pod_ports) == sorted(ports)
 
@@ -371,8 +479,8 @@ def check_pod_image(chi_name, image, ns=namespace):
         assert pod_image == image
 
 
-def check_pod_volumes(chi_name, volumes, ns=namespace):
-    pod_volumes = get_pod_volumes(chi_name, ns=ns)
+def check_pod_volumes(chi_name, volumes, pod_name="", ns=namespace):
+    pod_volumes = get_pod_volumes(chi_name, pod_name, ns=ns)
     for v in volumes:
         with Then(f"Expect pod has volume mount {v}"):
             found = 0
@@ -387,15 +495,15 @@ def get_pvc_size(pvc_name, ns=namespace):
     return get_field("pvc", pvc_name, ".spec.resources.requests.storage", ns)
 
 
-def check_pod_antiaffinity(chi_name, pod_name="", match_labels={}, topologyKey="kubernetes.io/hostname", ns=namespace):
-    pod_spec = get_pod_spec(chi_name, pod_name, ns)
+def pod_antiaffinity(chi_name, match_labels={}, topologyKey="kubernetes.io/hostname", ns=namespace):
+    """podAntiAffinity of ClickHouseAntiAffinity podDistribution with the default scope."""
     if match_labels == {}:
         match_labels = {
                         "clickhouse.altinity.com/app": "chop",
                         "clickhouse.altinity.com/chi": f"{chi_name}",
                         "clickhouse.altinity.com/namespace": f"{ns}",
                     }
-    expected = {
+    return {
         "requiredDuringSchedulingIgnoredDuringExecution": [
             {
                 "labelSelector": {
@@ -405,12 +513,39 @@ def check_pod_antiaffinity(chi_name, pod_name="", match_labels={}, topologyKey="
             },
         ],
     }
+
+
+def check_pod_antiaffinity(chi_name, pod_name="", match_labels={}, topologyKey="kubernetes.io/hostname", ns=namespace,
+                           expected=None):
+    """expected is usually the podAntiAffinity of the expanded CHI, pod_antiaffinity() when it is not given."""
+    pod_spec = get_pod_spec(chi_name, pod_name, ns)
+    if expected is None:
+        expected = pod_antiaffinity(chi_name, match_labels, topologyKey, ns)
     with Then(f"Expect podAntiAffinity to exist and match {expected}"):
         assert "affinity" in pod_spec
         assert "podAntiAffinity" in pod_spec["affinity"]
         assert pod_spec["affinity"]["podAntiAffinity"] == expected
 
 
+def check_normalized_chi(normalized, check, ns=namespace):
+    """Pre-flight: expectations of create_and_check() must match the CHI expanded by e2e.normalizer."""
+    host = normalized["hosts"][0]
+    with Given(f"CHI {normalized['name']} expands to {len(normalized['hosts'])} hosts, first is {host['name']}"):
+        if "pod_volumes" in check:
+            mounts = [m["mountPath"] for m in host["volumeMounts"]]
+            for v in check["pod_volumes"]:
+                with Then(f"Expect pod template to mount {v}"):
+                    assert v in mounts, error(f"volume mounts {mounts}")
+        if "pod_ports" in check:
+            ports = [p["containerPort"] for p in host["podSpec"]["containers"][0].get("ports", [])]
+            with Then(f"Expect pod template ports {ports} to match {check['pod_ports']}"):
+                assert sorted(ports) == sorted(check["pod_ports"]), error()
+        if "pod_podAntiAffinity" in check:
+            expected = pod_antiaffinity(normalized["name"], ns=ns)
+            with Then(f"Expect pod template podAntiAffinity to match {expected}"):
+                assert host["podAntiAffinity"] == expected, error()
+
+
 def check_service(service_name, service_type, ns=namespace):
     with When(f"{service_name} is available"):
         service = get("service", service_name, ns=ns)
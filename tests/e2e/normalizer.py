@@ -0,0 +1,346 @@
+"""Pre-flight expansion of a ClickHouseInstallation, a partial Python port of pkg/model/normalizer.go.
+
+Loads a CHI manifest together with the CHITs it uses and computes what the operator is going to create
+for every host: names, template names, ports, pod template, volume mounts, volume claims and pod anti-affinity.
+Only the parts needed for test expectations are ported, macros other than the name parts are not expanded.
+
+    chi = normalizer.normalize("manifests/chi/test-002-tpl.yaml")
+    chi["hosts"][0]["volumeMounts"]
+
+CHITs referenced by useTemplates are looked up by name in manifests/chit, CHITs installed
+in the cluster can be passed explicitly. Results are cached by the hash of the manifests.
+"""
+import os
+import glob
+import hashlib
+
+import e2e.yaml_manifest as yaml_manifest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+chit_dir = os.path.join(current_dir, "manifests", "chit")
+
+# fields of ChiTemplateNames, see pkg/apis/clickhouse.altinity.com/v1/type_template_names.go
+template_name_fields = (
+    "hostTemplate",
+    "podTemplate",
+    "dataVolumeClaimTemplate",
+    "logVolumeClaimTemplate",
+    "serviceTemplate",
+    "clusterServiceTemplate",
+    "shardServiceTemplate",
+    "replicaServiceTemplate",
+    "volumeClaimTemplate",
+)
+# util.IsStringBoolTrue
+true_values = ("1", "true", "yes", "on", "enable")
+
+# pkg/model/ch_config_const.go
+default_ports = {"tcp": 9000, "http": 8123, "interserver": 9009}
+port_settings = {"tcp": "tcp_port", "http": "http_port", "interserver": "interserver_http_port"}
+host_port_fields = {"tcp": "tcpPort", "http": "httpPort", "interserver": "interserverHTTPPort"}
+dir_path_clickhouse_data = "/var/lib/clickhouse"
+dir_path_clickhouse_log = "/var/log/clickhouse-server"
+config_mounts = ["/etc/clickhouse-server/config.d/", "/etc/clickhouse-server/users.d/", "/etc/clickhouse-server/conf.d/"]
+default_image = "clickhouse/clickhouse-server:latest"
+
+# pkg/model/namer.go, names context
+name_part_max_len = {"chi": 60, "cluster": 15, "shard": 15, "replica": 15}
+
+# pkg/model/labeler.go
+label_app = "clickhouse.altinity.com/app"
+label_namespace = "clickhouse.altinity.com/namespace"
+label_chi = "clickhouse.altinity.com/chi"
+label_cluster = "clickhouse.altinity.com/cluster"
+label_shard = "clickhouse.altinity.com/shard"
+label_replica = "clickhouse.altinity.com/replica"
+scope_labels = {
+    "Shard": (label_namespace, label_chi, label_cluster, label_shard),
+    "Replica": (label_namespace, label_chi, label_cluster, label_replica),
+    "Cluster": (label_namespace, label_chi, label_cluster),
+    "ClickHouseInstallation": (label_namespace, label_chi),
+    "Namespace": (label_namespace,),
+    "Global": (),
+}
+
+_normalized = {}
+
+
+def merge(base, override):
+    """Merge CHI specs like the operator merges CHITs into a CHI: dicts recursively, lists of named items by name."""
+    if isinstance(base, dict) and isinstance(override, dict):
+        result = dict(base)
+        for k, v in override.items():
+            result[k] = merge(base[k], v) if k in base else v
+        return result
+    if isinstance(base, list) and isinstance(override, list) \
+            and all(isinstance(i, dict) and "name" in i for i in base + override):
+        result = {i["name"]: i for i in base}
+        for i in override:
+            result[i["name"]] = merge(result[i["name"]], i) if i["name"] in result else i
+        return list(result.values())
+    return override
+
+
+def chit_applies(chit, chi):
+    """CHIT is used by the CHI explicitly via useTemplates or has templating.policy auto."""
+    if (chit.get("spec", {}).get("templating", {}) or {}).get("policy", "").lower() == "auto":
+        return True
+    used = {t["name"] for t in chi.get("spec", {}).get("useTemplates", []) or []}
+    return chit["metadata"]["name"] in used
+
+
+def effective_spec(chi, chits=()):
+    """CHI spec with applicable CHITs merged underneath, CHI values win."""
+    spec = {}
+    for chit in chits:
+        if chit_applies(chit, chi):
+            spec = merge(spec, yaml_manifest.thaw(chit.get("spec", {}) or {}))
+    return merge(spec, yaml_manifest.thaw(chi.get("spec", {}) or {}))
+
+
+def is_stopped(spec):
+    return str(spec.get("stop", "")).lower() in true_values
+
+
+def template_names(*levels):
+    """Template names of the first level which specifies each of them, host level goes first."""
+    names = {}
+    for level in levels:
+        for field in template_name_fields:
+            if not names.get(field) and (level or {}).get(field):
+                names[field] = level[field]
+    # deprecated volumeClaimTemplate is used as data volume claim template
+    if not names.get("dataVolumeClaimTemplate") and names.get("volumeClaimTemplate"):
+        names["dataVolumeClaimTemplate"] = names["volumeClaimTemplate"]
+    return names
+
+
+def get_item(items, index):
+    return (items[index] or {}) if items and index < len(items) else {}
+
+
+def name_part(kind, name):
+    return str(name)[:name_part_max_len[kind]].rstrip("-_.")
+
+
+def cluster_hosts(cluster, defaults, chi_settings=None):
+    """Hosts of the cluster, shardsCount x replicasCount grid like normalizeCluster() builds.
+
+    Every host is {"shardIndex", "replicaIndex", "shard", "replica", "spec", "templates", "settings"},
+    spec merges the host definitions from layout.shards[].replicas[] and layout.replicas[].shards[].
+    """
+    layout = cluster.get("layout", {}) or {}
+    shards = layout.get("shards", []) or []
+    replicas = layout.get("replicas", []) or []
+    shards_count = layout.get("shardsCount", 0) or max(
+        [1, len(shards)] + [max(r.get("shardsCount", 0) or 0, len(r.get("shards", []) or [])) for r in replicas]
+    )
+    replicas_count = layout.get("replicasCount", 0) or max(
+        [1, len(replicas)] + [max(s.get("replicasCount", 0) or 0, len(s.get("replicas", []) or [])) for s in shards]
+    )
+    cluster_settings = merge(chi_settings or {}, cluster.get("settings", {}) or {})
+    hosts = []
+    for s in range(shards_count):
+        shard = get_item(shards, s)
+        for r in range(replicas_count):
+            replica = get_item(replicas, r)
+            spec = merge(get_item(replica.get("shards"), s), get_item(shard.get("replicas"), r))
+            # host inherits settings from shard when shards are specified explicitly, otherwise from replica
+            parent = shard if shards else replica
+            hosts.append({
+                "shardIndex": s,
+                "replicaIndex": r,
+                "shard": str(shard.get("name") or s),
+                "replica": str(replica.get("name") or r),
+                "spec": spec,
+                "templates": template_names(
+                    spec.get("templates"),
+                    shard.get("templates"),
+                    replica.get("templates"),
+                    cluster.get("templates"),
+                    defaults,
+                ),
+                "settings": merge(merge(cluster_settings, parent.get("settings", {}) or {}), spec.get("settings", {}) or {}),
+            })
+    return hosts
+
+
+def host_ports(host, host_templates):
+    """tcp/http/interserver ports: host spec, then host template, then settings, then defaults."""
+    template_spec = (host_templates.get(host["templates"].get("hostTemplate"), {}) or {}).get("spec", {}) or {}
+    ports = {}
+    for name, field in host_port_fields.items():
+        for value in (host["spec"].get(field), template_spec.get(field), host["settings"].get(port_settings[name])):
+            if value and 0 < int(value) < 65535:
+                ports[name] = int(value)
+                break
+        else:
+            ports[name] = default_ports[name]
+    return ports
+
+
+def clickhouse_container(pod_spec):
+    containers = pod_spec.get("containers", []) or []
+    for container in containers:
+        if container.get("name") == "clickhouse":
+            return container
+    return containers[0] if containers else None
+
+
+def host_pod_spec(host, pod_templates, volume_claim_templates, ports):
+    """Pod spec of the host's StatefulSet, creator.go: named ports and volume claim template mounts."""
+    pod_template = pod_templates.get(host["templates"].get("podTemplate"), {}) or {}
+    spec = yaml_manifest.thaw(yaml_manifest.freeze(pod_template.get("spec", {}) or {}))
+    if not spec.get("containers"):
+        spec["containers"] = [{
+            "name": "clickhouse",
+            "image": default_image,
+            "ports": [{"name": name, "containerPort": default_ports[name]} for name in ("http", "tcp", "interserver")],
+        }]
+    container = clickhouse_container(spec)
+
+    # ensureNamedPortsSpecified
+    container_ports = container.setdefault("ports", [])
+    for name in ("tcp", "http", "interserver"):
+        for port in container_ports:
+            if port.get("name") == name:
+                port.pop("hostPort", None)
+                port["containerPort"] = ports[name]
+                break
+        else:
+            container_ports.append({"name": name, "containerPort": ports[name]})
+
+    # setupStatefulSetApplyVolumeMount, volume claim template is not mounted twice and mount path is not reused
+    mounts = container.setdefault("volumeMounts", [])
+    for template_field, path in (("dataVolumeClaimTemplate", dir_path_clickhouse_data),
+                                 ("logVolumeClaimTemplate", dir_path_clickhouse_log)):
+        name = host["templates"].get(template_field)
+        if name in volume_claim_templates \
+                and all(m.get("name") != name and m.get("mountPath") != path for m in mounts):
+            mounts.append({"name": name, "mountPath": path})
+    for path in config_mounts:
+        mounts.append({"name": "", "mountPath": path})
+    return pod_template, spec
+
+
+def pod_anti_affinity(pod_template, labels):
+    """podAntiAffinity generated from ClickHouseAntiAffinity podDistribution, other types are not ported."""
+    terms = []
+    for distribution in pod_template.get("podDistribution", []) or []:
+        if distribution.get("type") != "ClickHouseAntiAffinity":
+            continue
+        match_labels = {label_app: "chop"}
+        for label in scope_labels.get(distribution.get("scope") or "Cluster", ()):
+            match_labels[label] = labels[label]
+        terms.append({
+            "labelSelector": {"matchLabels": match_labels},
+            "topologyKey": distribution.get("topologyKey") or "kubernetes.io/hostname",
+        })
+    return {"requiredDuringSchedulingIgnoredDuringExecution": terms} if terms else None
+
+
+def chit_index():
+    """{CHIT name: path} of templates in manifests/chit.
+
+    Several files define clickhouse-version, the last one wins, pass the intended one to normalize() explicitly.
+    """
+    index = {}
+    for path in sorted(glob.glob(os.path.join(chit_dir, "*.yaml"))):
+        chit = yaml_manifest.get_manifest_data(path)
+        if chit and chit.get("kind") == "ClickHouseInstallationTemplate":
+            index[chit["metadata"]["name"]] = path
+    return index
+
+
+def expand(chi, chits=(), ns="test"):
+    """Normalized view of the parsed CHI, chits are parsed CHITs available in the cluster."""
+    spec = effective_spec(chi, chits)
+    templates = spec.get("templates", {}) or {}
+    pod_templates = {t["name"]: t for t in templates.get("podTemplates", []) or []}
+    host_templates = {t["name"]: t for t in templates.get("hostTemplates", []) or []}
+    volume_claim_templates = {t["name"]: t for t in templates.get("volumeClaimTemplates", []) or []}
+    service_templates = {t["name"]: t for t in templates.get("serviceTemplates", []) or []}
+    defaults = (spec.get("defaults", {}) or {}).get("templates", {}) or {}
+    configuration = spec.get("configuration", {}) or {}
+    clusters = configuration.get("clusters", []) or [{"name": "cluster"}]
+    chi_name = chi["metadata"]["name"]
+    ns = chi["metadata"].get("namespace", ns)
+
+    hosts = []
+    for cluster in clusters:
+        for host in cluster_hosts(cluster, defaults, configuration.get("settings", {}) or {}):
+            name = "-".join([
+                "chi", name_part("chi", chi_name), name_part("cluster", cluster["name"]),
+                name_part("shard", host["shard"]), name_part("replica", host["replica"]),
+            ])
+            labels = {
+                label_app: "chop",
+                label_namespace: ns,
+                label_chi: chi_name,
+                label_cluster: cluster["name"],
+                label_shard: host["shard"],
+                label_replica: host["replica"],
+            }
+            ports = host_ports(host, host_templates)
+            pod_template, pod_spec = host_pod_spec(host, pod_templates, volume_claim_templates, ports)
+            volume_claims = []
+            for container in pod_spec["containers"]:
+                for mount in container.get("volumeMounts", []):
+                    vct = mount.get("name")
+                    if vct in volume_claim_templates and vct not in [c["template"] for c in volume_claims]:
+                        volume_claims.append({"name": f"{vct}-{name}-0", "template": vct, "mountPath": mount["mountPath"]})
+            hosts.append({
+                "cluster": cluster["name"],
+                "shard": host["shard"],
+                "replica": host["replica"],
+                "shardIndex": host["shardIndex"],
+                "replicaIndex": host["replicaIndex"],
+                "name": name,
+                "pod": f"{name}-0",
+                "labels": labels,
+                "templates": host["templates"],
+                "ports": ports,
+                "podSpec": pod_spec,
+                "volumeMounts": clickhouse_container(pod_spec).get("volumeMounts", []),
+                "volumeClaims": volume_claims,
+                "podAntiAffinity": pod_anti_affinity(pod_template, labels),
+            })
+    return {
+        "name": chi_name,
+        "namespace": ns,
+        "spec": spec,
+        "stopped": is_stopped(spec),
+        "clusters": [c["name"] for c in clusters],
+        "hosts": hosts,
+        "podTemplates": pod_templates,
+        "volumeClaimTemplates": volume_claim_templates,
+        "serviceTemplates": service_templates,
+    }
+
+
+def normalize(manifest, templates=(), ns="test"):
+    """Normalized CHI of a manifest, see expand(), paths are relative to tests/e2e.
+
+    templates are CHIT manifests installed in the cluster, e.g. check["apply_templates"],
+    CHITs referenced by useTemplates and not among them are looked up in manifests/chit.
+    The result is cached by the hash of all these manifests, callers must not modify it.
+    """
+    paths = [os.path.join(current_dir, p) for p in [manifest] + sorted(templates or ())]
+    chi = yaml_manifest.get_manifest_data(paths[0])
+    chits = [yaml_manifest.get_manifest_data(p) for p in paths[1:]]
+    chits = [chit for chit in chits if chit.get("kind") == "ClickHouseInstallationTemplate"]
+    known = {chit["metadata"]["name"] for chit in chits}
+    used = [t["name"] for t in chi.get("spec", {}).get("useTemplates", []) or [] if t["name"] not in known]
+    if used:
+        index = chit_index()
+        paths += [index[name] for name in used if name in index]
+        chits += [yaml_manifest.get_manifest_data(index[name]) for name in used if name in index]
+
+    h = hashlib.sha1(ns.encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    key = h.hexdigest()
+    if key not in _normalized:
+        _normalized[key] = expand(chi, chits, ns)
+    return _normalized[key]
@@ -0,0 +1,239 @@
+"""Background availability prober for operator driven restarts, upgrades and rescaling.
+
+Every target is probed from its own thread every settings.probe_interval seconds. With native kubectl
+probes go over HTTP through one `kubectl proxy` (see kubectl.Proxy), each thread keeps its connection
+open, so a probe costs one HTTP round trip and the proxy survives restarts of the pods behind it.
+Otherwise every probe is a `kubectl exec ... clickhouse-client`, with correspondingly lower resolution.
+
+ClickHouse checks the source address of HTTP probes, so the user has to be allowed from any network,
+e.g. `probe/networks/ip: 0.0.0.0/0` in the CHI.
+
+    with prober.for_chi("manifests/chi/test-014-replication-1.yaml", user="probe", password="probe") as p:
+        ... operator action ...
+    p.report()
+"""
+import time
+import shlex
+import subprocess
+import http.client
+import urllib.parse
+
+import e2e.benchmark as benchmark
+import e2e.kubectl as kubectl
+import e2e.normalizer as normalizer
+import e2e.settings as settings
+
+from testflows.core import current, note, debug
+
+
+class Target(object):
+    """Pod or service probed with sql, the probe fails on error or when `expect` is set and the result differs."""
+
+    def __init__(self, name, pod=None, service=None, sql="SELECT 1", expect=None, port=8123):
+        self.name = name
+        self.pod = pod
+        self.service = service
+        self.sql = sql
+        self.expect = expect
+        self.port = port
+        # (unixtime, ok, latency seconds, error)
+        self.samples = []
+
+
+class Client(object):
+    """Runs queries on targets, over HTTP via proxy when given, via kubectl exec of clickhouse-client otherwise.
+
+    A client keeps its HTTP connection open between queries, so it must not be shared by threads.
+    """
+
+    def __init__(self, proxy=None, user="", password="", timeout=2.0, client_pod=None, ns=settings.test_namespace):
+        self.proxy = proxy
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.client_pod = client_pod
+        self.ns = ns
+        self.connection = None
+
+    def query(self, target, sql=None):
+        sql = target.sql if sql is None else sql
+        if self.proxy is None:
+            return self.query_exec(target, sql)
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection("127.0.0.1", self.proxy.local_port, timeout=self.timeout)
+            return self.query_http(target, sql)
+        except Exception:
+            self.close()
+            raise
+
+    def query_http(self, target, sql):
+        if target.pod is not None:
+            path = self.proxy.pod_path(target.pod, target.port, ns=self.ns)
+        else:
+            path = self.proxy.service_path(target.service, target.port, ns=self.ns)
+        headers = {"X-ClickHouse-User": self.user or "default", "X-ClickHouse-Key": self.password, "Content-Length": "0"}
+        # GET requests are readonly in ClickHouse, POST runs inserts as well
+        self.connection.request("POST", f"{path}?{urllib.parse.urlencode({'query': sql})}", headers=headers)
+        response = self.connection.getresponse()
+        body = response.read().decode()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status} {body.strip()[:200]}")
+        return body.strip()
+
+    def query_exec(self, target, sql):
+        pod = target.pod or self.client_pod
+        host = "127.0.0.1" if target.pod else target.service
+        credentials = (f" --user={self.user}" if self.user else "") + (f" --password={self.password}" if self.password else "")
+        cmd = f"{settings.kubectl_cmd} exec {pod} --namespace={self.ns} -- " \
+              f"clickhouse-client -h {host}{credentials} --connect_timeout={max(1, int(self.timeout))} -q {shlex.quote(sql)}"
+        out = subprocess.run(shlex.split(cmd), capture_output=True, text=True, timeout=self.timeout + 30)
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr.strip()[:200] or f"exit code {out.returncode}")
+        return out.stdout.strip()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def start_proxy():
+    """kubectl.Proxy when kubectl runs natively and the proxy starts, None to fall back to kubectl exec."""
+    if not current().context.native:
+        return None
+    try:
+        return kubectl.Proxy().start()
+    except RuntimeError as e:
+        note(f"kubectl proxy is not available, falling back to kubectl exec: {e}")
+        return None
+
+
+def overlap(intervals_list):
+    """Intervals covered by all of the lists of (start, end) intervals."""
+    result = intervals_list[0] if intervals_list else []
+    for intervals in intervals_list[1:]:
+        merged = []
+        for a_start, a_end in result:
+            for b_start, b_end in intervals:
+                start, end = max(a_start, b_start), min(a_end, b_end)
+                if start < end:
+                    merged.append((start, end))
+        result = merged
+    return result
+
+
+class AvailabilityProber(benchmark.Sampler):
+    def __init__(self, targets, user="", password="", interval=None, timeout=2.0, client_pod=None,
+                 ns=settings.test_namespace):
+        """targets is a list of Target, client_pod runs exec probes of services, first pod target by default."""
+        super().__init__(join_timeout=timeout + 60)
+        self.targets = {t.name: t for t in targets}
+        self.user = user
+        self.password = password
+        self.interval = settings.probe_interval if interval is None else interval
+        self.timeout = timeout
+        self.client_pod = client_pod or next((t.pod for t in targets if t.pod), None)
+        self.ns = ns
+        self.proxy = None
+
+    def threads_args(self):
+        return [(target,) for target in self.targets.values()]
+
+    def setup(self):
+        self.proxy = start_proxy()
+
+    def cleanup(self):
+        if self.proxy is not None:
+            self.proxy.stop()
+
+    def run(self, target):
+        client = Client(self.proxy, self.user, self.password, self.timeout, self.client_pod, self.ns)
+        try:
+            self.every(self.interval, lambda: self.probe(client, target))
+        finally:
+            client.close()
+
+    def probe(self, client, target):
+        started = time.time()
+        try:
+            result = client.query(target)
+            ok = target.expect is None or result == str(target.expect)
+            error = None if ok else f"unexpected result {result}"
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        target.samples.append((started, ok, time.time() - started, error))
+
+    def intervals(self, name, ok=False):
+        """[(start, end)] when the target was down (ok=False) or up, a state lasts until the next probe which differs."""
+        samples = self.targets[name].samples
+        end_time = self.stopped_at or time.time()
+        result = []
+        start = None
+        for t, sample_ok, _, _ in samples:
+            if sample_ok == ok and start is None:
+                start = t
+            elif sample_ok != ok and start is not None:
+                result.append((start, t))
+                start = None
+        if start is not None:
+            result.append((start, end_time))
+        return result
+
+    def downtime(self, *names):
+        """Seconds when all of the named targets were down at the same time, all targets by default."""
+        names = names or list(self.targets)
+        return sum(end - start for start, end in overlap([self.intervals(name) for name in names]))
+
+    def latencies(self, name):
+        return [latency for _, ok, latency, _ in self.targets[name].samples if ok]
+
+    def report(self, chi_targets=None):
+        """{target: {probes, errors, downtime, outages, longest_outage, p50, p99}, "chi_downtime": seconds}.
+
+        chi_targets are targets which together make the CHI available, pod targets by default.
+        """
+        result = {}
+        for name, target in self.targets.items():
+            down = self.intervals(name)
+            latencies = self.latencies(name)
+            result[name] = {
+                "probes": len(target.samples),
+                "errors": sum(1 for _, ok, _, _ in target.samples if not ok),
+                "downtime": round(sum(end - start for start, end in down), 3),
+                "outages": [(round(start - self.started_at, 3), round(end - start, 3)) for start, end in down],
+                "longest_outage": round(max([end - start for start, end in down], default=0), 3),
+                "p50": benchmark.percentile(latencies, 50),
+                "p99": benchmark.percentile(latencies, 99),
+            }
+        chi_targets = chi_targets or [name for name, target in self.targets.items() if target.pod is not None]
+        result["chi_downtime"] = round(self.downtime(*chi_targets), 3) if chi_targets else 0
+        return result
+
+    def note_report(self, chi_targets=None):
+        report = self.report(chi_targets)
+        total = (self.stopped_at or time.time()) - self.started_at
+        note(f"probed every {self.interval}s for {round(total, 1)}s via {'kubectl proxy' if self.proxy else 'kubectl exec'}")
+        for name, target in self.targets.items():
+            r = report[name]
+            p50 = "n/a" if r["p50"] is None else f"{r['p50'] * 1000:.1f}ms"
+            p99 = "n/a" if r["p99"] is None else f"{r['p99'] * 1000:.1f}ms"
+            note(f"{name}: {r['probes']} probes, {r['errors']} errors, downtime {r['downtime']}s, "
+                         f"longest outage {r['longest_outage']}s, p50 {p50}, p99 {p99}")
+            for start, duration in r["outages"]:
+                note(f"{name}: down at +{start}s for {duration}s")
+            errors = {error for _, ok, _, error in target.samples if not ok}
+            if errors:
+                debug(f"{name} errors: {errors}")
+        note(f"CHI downtime: {report['chi_downtime']}s")
+        return report
+
+
+def for_chi(manifest, user="", password="", templates=(), sql="SELECT 1", service=True, client_pod=None,
+            interval=None, ns=settings.test_namespace):
+    """Prober of every host pod of the CHI manifest and of its load balancer service, hosts come from e2e.normalizer."""
+    normalized = normalizer.normalize(manifest, templates, ns=ns)
+    targets = [Target(host["name"], pod=host["pod"], sql=sql) for host in normalized["hosts"]]
+    if service:
+        targets.append(Target(f"clickhouse-{normalized['name']}", service=f"clickhouse-{normalized['name']}", sql=sql))
+    return AvailabilityProber(targets, user=user, password=password, interval=interval, client_pod=client_pod, ns=ns)
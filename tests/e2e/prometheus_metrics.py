@@ -0,0 +1,153 @@
+import re
+
+from collections import namedtuple
+
+label_pair_re = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"\s*,?')
+label_unescape_re = re.compile(r'\\(.)')
+
+Sample = namedtuple("Sample", ["name", "labels", "value"])
+
+
+def _unescape(value, newline=True):
+    if "\\" not in value:
+        return value
+    return label_unescape_re.sub(lambda m: "\n" if m.group(1) == "n" and newline else m.group(1), value)
+
+
+def _parse_value(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def _label_matches(expected, actual):
+    if actual is None:
+        return False
+    if isinstance(expected, re.Pattern):
+        return expected.fullmatch(actual) is not None
+    return expected == actual
+
+
+class Scrape(object):
+    """Parsed Prometheus text exposition format with a (metric name, label set) index.
+
+    Label sets are stored as sorted tuples of (name, value) pairs, so they can be used as dict keys.
+    """
+    def __init__(self, text=""):
+        # name -> {"help": str or None without a HELP line, "type": str}
+        self.families = {}
+        # name -> {labels tuple -> value}
+        self.series = {}
+        # (name, label, value) -> set of labels tuples, used to narrow lookups by exact label values
+        self.label_index = {}
+        self._parse(text)
+
+    def _parse(self, text):
+        families = self.families
+        series = self.series
+        label_index = self.label_index
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line[0] == "#":
+                parts = line.split(None, 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    family = families.setdefault(parts[2], {"help": None, "type": "untyped"})
+                    value = parts[3] if len(parts) > 3 else ""
+                    if parts[1] == "HELP":
+                        family["help"] = _unescape(value)
+                    else:
+                        family["type"] = value.strip()
+                continue
+
+            brace = line.find("{")
+            if brace >= 0:
+                name = line[:brace].strip()
+                end = line.rfind("}")
+                labels = tuple(sorted(
+                    (k, _unescape(v)) for k, v in label_pair_re.findall(line[brace + 1:end])
+                ))
+                rest = line[end + 1:].split()
+            else:
+                parts = line.split()
+                name, labels, rest = parts[0], (), parts[1:]
+            if not rest:
+                continue
+
+            series.setdefault(name, {})[labels] = _parse_value(rest[0])
+            for pair in labels:
+                label_index.setdefault((name,) + pair, set()).add(labels)
+
+    def __len__(self):
+        return sum(len(s) for s in self.series.values())
+
+    def get(self, name, labels=None):
+        """Return value of the series with exactly these labels, or None."""
+        return self.series.get(name, {}).get(tuple(sorted((labels or {}).items())))
+
+    def find(self, name, labels=None):
+        """Return samples of `name` which contain all `labels`.
+
+        Label values may be plain strings for exact match or compiled regular expressions for full match.
+        """
+        family = self.series.get(name)
+        if not family:
+            return []
+        labels = labels or {}
+        exact = [(k, v) for k, v in labels.items() if not isinstance(v, re.Pattern)]
+        regex = [(k, v) for k, v in labels.items() if isinstance(v, re.Pattern)]
+
+        if exact:
+            candidates = None
+            for k, v in exact:
+                matched = self.label_index.get((name, k, v), set())
+                candidates = matched if candidates is None else candidates & matched
+                if not candidates:
+                    return []
+        else:
+            candidates = family.keys()
+
+        result = []
+        for key in candidates:
+            if regex:
+                actual = dict(key)
+                if not all(_label_matches(v, actual.get(k)) for k, v in regex):
+                    continue
+            result.append(Sample(name, dict(key), family[key]))
+        return result
+
+    def has(self, name, labels=None):
+        return len(self.find(name, labels)) > 0
+
+    def help(self, name):
+        """HELP text of the metric family, None when the scrape has no HELP line for it."""
+        family = self.families.get(name)
+        return family["help"] if family is not None else None
+
+    def metric_type(self, name):
+        family = self.families.get(name)
+        return family["type"] if family is not None else None
+
+    def diff(self, other):
+        """Compare with a later scrape.
+
+        Returns dict with "added" and "removed" lists of (name, labels) and "changed" list of (name, labels, old, new).
+        """
+        added, removed, changed = [], [], []
+        for name in set(self.series) | set(other.series):
+            before = self.series.get(name, {})
+            after = other.series.get(name, {})
+            for labels in before.keys() - after.keys():
+                removed.append((name, dict(labels)))
+            for labels in after.keys() - before.keys():
+                added.append((name, dict(labels)))
+            for labels in before.keys() & after.keys():
+                old, new = before[labels], after[labels]
+                if old != new and not (old != old and new != new):
+                    changed.append((name, dict(labels), old, new))
+        return {"added": added, "removed": removed, "changed": changed}
+
+
+def parse(text):
+    return Scrape(text)
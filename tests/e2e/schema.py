@@ -0,0 +1,81 @@
+"""Schema of all hosts of a CHI in one query, and per host differences against a source host:
+
+    snap = schema.snapshot(chi)
+    assert schema.diff(snap, source=f"chi-{chi}-default-0-0-0") == {}, error()
+
+Hosts are named by hostName(), which is the pod name. Databases, tables and dictionaries are compared by
+name and engine, system databases are skipped.
+"""
+import e2e.clickhouse as clickhouse
+
+from testflows.core import debug
+
+system_databases = "'system', 'INFORMATION_SCHEMA', 'information_schema'"
+
+# inner tables of materialized views are named by uuid in Atomic databases, so only the views are compared,
+# dictionaries have no engine, 'Dictionary' keeps the line from ending with a tab stripped from the output
+snapshot_sql = (
+    "SELECT hostName(), 'database', name, engine FROM clusterAllReplicas('{cluster}', system.databases) "
+    "WHERE name NOT IN ({system_databases}) "
+    "UNION ALL "
+    "SELECT hostName(), 'table', concat(database, '.', name), engine FROM clusterAllReplicas('{cluster}', system.tables) "
+    "WHERE database NOT IN ({system_databases}) AND NOT is_temporary AND name NOT LIKE '.inner%' "
+    "UNION ALL "
+    "SELECT hostName(), 'dictionary', if(database = '', name, concat(database, '.', name)), 'Dictionary' "
+    "FROM clusterAllReplicas('{cluster}', system.dictionaries)"
+)
+
+
+def snapshot(chi, cluster="all-sharded", host="127.0.0.1", pod=""):
+    """{pod: {(kind, name): engine}} of every available host of the cluster, in one round trip from host.
+
+    all-sharded cluster of the operator has every host of the CHI as a shard.
+    """
+    out = clickhouse.query(
+        chi, snapshot_sql.format(cluster=cluster, system_databases=system_databases), host=host, pod=pod, timeout=120,
+        advanced_params="--skip_unavailable_shards=1",
+    )
+    result = {}
+    for line in out.splitlines():
+        fields = line.split("\t")
+        if len(fields) != 4:
+            continue
+        pod_name, kind, name, engine = fields
+        result.setdefault(pod_name, {})[(kind, name)] = engine
+    return result
+
+
+def diff(snap, source, pods=None):
+    """{pod: {"missing": [...], "extra": [...], "engine": [...]}} of pods which differ from the source pod.
+
+    pods are the pods to compare, all pods of the snapshot by default, pods not in the snapshot are
+    reported as {"unreachable": True}.
+    """
+    expected = snap.get(source, {})
+    result = {}
+    for pod in (pods if pods is not None else sorted(snap)):
+        if pod == source:
+            continue
+        if pod not in snap:
+            result[pod] = {"unreachable": True}
+            continue
+        actual = snap[pod]
+        d = {
+            "missing": sorted(f"{kind} {name}" for kind, name in set(expected) - set(actual)),
+            "extra": sorted(f"{kind} {name}" for kind, name in set(actual) - set(expected)),
+            "engine": sorted(
+                f"{kind} {name}: {expected[(kind, name)]} != {engine}"
+                for (kind, name), engine in actual.items()
+                if (kind, name) in expected and expected[(kind, name)] != engine
+            ),
+        }
+        if any(d.values()):
+            result[pod] = d
+    if result:
+        debug(f"schema differs from {source}: {result}")
+    return result
+
+
+def missing_objects(snap, pod, objects):
+    """Objects, given as (kind, name), which are missing on the pod."""
+    return [obj for obj in objects if obj not in snap.get(pod, {})]
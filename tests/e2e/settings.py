@@ -1,14 +1,15 @@
 import os
-import yaml
 import inspect
 import pathlib
-from testflows.core import current
+import functools
+
+import e2e.yaml_manifest as yaml_manifest
 
 
 def get_ch_version(test_file):
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    return yaml.safe_load(
-        open(os.path.join(current_dir, test_file), "r")
+    return yaml_manifest.get_manifest_data(
+        os.path.join(current_dir, test_file)
     )["spec"]["templates"]["podTemplates"][0]["spec"]["containers"][0]["image"]
 
 
@@ -19,20 +20,56 @@ def get_docker_compose_path():
     return docker_compose_file_path, docker_compose_project_dir
 
 
-kubectl_cmd = "kubectl" \
-    if current().context.native \
-    else f"docker-compose -f {get_docker_compose_path()[0]} exec runner kubectl"
+class LazySettings:
+    """Settings which read files or need a running TestFlows session, evaluated on first access.
+
+    They are available as module attributes, e.g. `settings.kubectl_cmd`, see __getattr__ below.
+    """
+
+    @functools.cached_property
+    def kubectl_cmd(self):
+        if 'KUBECTL_CMD' in os.environ:
+            return os.getenv('KUBECTL_CMD')
+        from testflows.core import current
+        return "kubectl" \
+            if current().context.native \
+            else f"docker-compose -f {get_docker_compose_path()[0]} exec runner kubectl"
+
+    @functools.cached_property
+    def operator_version(self):
+        if 'OPERATOR_VERSION' in os.environ:
+            return os.getenv('OPERATOR_VERSION')
+        with open(os.path.join(pathlib.Path(__file__).parent.absolute(), "../../release")) as f:
+            return f.read(1024).strip(" \r\n\t")
+
+    @functools.cached_property
+    def clickhouse_version(self):
+        return get_ch_version(clickhouse_template)
+
+    @functools.cached_property
+    def clickhouse_version_old(self):
+        return get_ch_version(clickhouse_template_old)
+
+
+lazy_settings = LazySettings()
+
+
+def __getattr__(name):
+    if isinstance(getattr(LazySettings, name, None), functools.cached_property):
+        return getattr(lazy_settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load():
+    """Evaluate all lazy settings, called by regression.py and benchmark.py once the context is set up."""
+    for name, value in vars(LazySettings).items():
+        if isinstance(value, functools.cached_property):
+            getattr(lazy_settings, name)
 
-kubectl_cmd = os.getenv('KUBECTL_CMD') \
-    if 'KUBECTL_CMD' in os.environ \
-    else kubectl_cmd
 
 test_namespace = os.getenv('TEST_NAMESPACE') \
     if 'TEST_NAMESPACE' in os.environ \
     else "test"
-operator_version = os.getenv('OPERATOR_VERSION') \
-    if 'OPERATOR_VERSION' in os.environ \
-    else open(os.path.join(pathlib.Path(__file__).parent.absolute(), "../../release")).read(1024).strip(" \r\n\t")
 operator_namespace = os.getenv('OPERATOR_NAMESPACE') \
     if 'OPERATOR_NAMESPACE' in os.environ \
     else 'kube-system'
@@ -63,11 +100,97 @@ image_pull_policy = os.getenv('IMAGE_PULL_POLICY') \
 clickhouse_template = "manifests/chit/tpl-clickhouse-22.3.yaml"
 clickhouse_template_old = "manifests/chit/tpl-clickhouse-21.8.yaml"
 
-clickhouse_version = get_ch_version(clickhouse_template)
-clickhouse_version_old = get_ch_version(clickhouse_template_old)
-
 prometheus_namespace = "prometheus"
 prometheus_operator_version = "0.50"
 prometheus_scrape_interval = 10
 
 minio_version = "latest"
+# hard limit for a clickhouse-backup command to reach its final status, seconds
+backup_status_timeout = int(os.getenv('BACKUP_STATUS_TIMEOUT')) \
+    if 'BACKUP_STATUS_TIMEOUT' in os.environ \
+    else 900
+# seconds between availability probes of e2e.prober, per target
+probe_interval = float(os.getenv('PROBE_INTERVAL')) \
+    if 'PROBE_INTERVAL' in os.environ \
+    else 0.2
+# SLO of e2e.workload operations during operator actions: 99th percentile latency in seconds and error rate
+workload_slo_p99 = float(os.getenv('WORKLOAD_SLO_P99')) \
+    if 'WORKLOAD_SLO_P99' in os.environ \
+    else 5.0
+workload_slo_error_rate = float(os.getenv('WORKLOAD_SLO_ERROR_RATE')) \
+    if 'WORKLOAD_SLO_ERROR_RATE' in os.environ \
+    else 0.0
+
+benchmark_results_dir = os.getenv('BENCHMARK_RESULTS_DIR') \
+    if 'BENCHMARK_RESULTS_DIR' in os.environ \
+    else os.path.join(pathlib.Path(__file__).parent.parent.absolute(), "benchmarks")
+# relative change against the previous run with the same parameters which is reported as a regression
+benchmark_tolerance = float(os.getenv('BENCHMARK_TOLERANCE')) \
+    if 'BENCHMARK_TOLERANCE' in os.environ \
+    else 0.2
+benchmark_fail_on_regression = os.getenv('BENCHMARK_FAIL_ON_REGRESSION') \
+    if 'BENCHMARK_FAIL_ON_REGRESSION' in os.environ \
+    else 'no'
+
+# empty means e2e.fake_metrics_exporter is used as a baseline
+metrics_exporter_url = os.getenv('METRICS_EXPORTER_URL') \
+    if 'METRICS_EXPORTER_URL' in os.environ \
+    else ''
+# 0 means ephemeral ports, otherwise every fake ClickHouse host listens on its own 127.0.0.N address and this port
+fake_clickhouse_port = int(os.getenv('FAKE_CLICKHOUSE_PORT')) \
+    if 'FAKE_CLICKHOUSE_PORT' in os.environ \
+    else 0
+metrics_exporter_benchmark_hosts = os.getenv('METRICS_EXPORTER_BENCHMARK_HOSTS') \
+    if 'METRICS_EXPORTER_BENCHMARK_HOSTS' in os.environ \
+    else "1,10,100,300"
+# rows and parts counts of the table backed up by e2e.benchmark_backup
+backup_benchmark_rows = os.getenv('BACKUP_BENCHMARK_ROWS') \
+    if 'BACKUP_BENCHMARK_ROWS' in os.environ \
+    else "10000,100000,1000000"
+backup_benchmark_parts = os.getenv('BACKUP_BENCHMARK_PARTS') \
+    if 'BACKUP_BENCHMARK_PARTS' in os.environ \
+    else "1,10"
+# SHARDSxREPLICAS layouts of CHIs created by e2e.benchmark_reconcile
+reconcile_benchmark_layouts = os.getenv('RECONCILE_BENCHMARK_LAYOUTS') \
+    if 'RECONCILE_BENCHMARK_LAYOUTS' in os.environ \
+    else "1x1,4x1,4x2,16x1"
+# numbers of CHIs of e2e.benchmark_operator_restart, and operator version to upgrade from, no upgrade when empty
+operator_restart_benchmark_chis = os.getenv('OPERATOR_RESTART_BENCHMARK_CHIS') \
+    if 'OPERATOR_RESTART_BENCHMARK_CHIS' in os.environ \
+    else "1,10"
+operator_upgrade_benchmark_from = os.getenv('OPERATOR_UPGRADE_BENCHMARK_FROM') \
+    if 'OPERATOR_UPGRADE_BENCHMARK_FROM' in os.environ \
+    else ""
+# shard counts e2e.benchmark_scale steps a CHI through, up and back down
+scale_benchmark_shards = os.getenv('SCALE_BENCHMARK_SHARDS') \
+    if 'SCALE_BENCHMARK_SHARDS' in os.environ \
+    else "1,2,4,8"
+# replicated inserts per second per replica of e2e.benchmark_keeper
+keeper_benchmark_insert_rates = os.getenv('KEEPER_BENCHMARK_INSERT_RATES') \
+    if 'KEEPER_BENCHMARK_INSERT_RATES' in os.environ \
+    else "1,5,10,25"
+# seconds of e2e.keeper_load at each rate, rows per insert and writer threads per replica
+keeper_benchmark_duration = int(os.getenv('KEEPER_BENCHMARK_DURATION')) \
+    if 'KEEPER_BENCHMARK_DURATION' in os.environ \
+    else 60
+keeper_benchmark_batch_size = int(os.getenv('KEEPER_BENCHMARK_BATCH_SIZE')) \
+    if 'KEEPER_BENCHMARK_BATCH_SIZE' in os.environ \
+    else 1
+keeper_benchmark_writers = int(os.getenv('KEEPER_BENCHMARK_WRITERS')) \
+    if 'KEEPER_BENCHMARK_WRITERS' in os.environ \
+    else 4
+# inserts per second per replica, rows per insert (every row is a part) and seconds of e2e.keeper_load
+# in test_keeper probes scenarios, 100000 parts per replica by default
+keeper_probes_insert_rate = float(os.getenv('KEEPER_PROBES_INSERT_RATE')) \
+    if 'KEEPER_PROBES_INSERT_RATE' in os.environ \
+    else 1
+keeper_probes_batch_size = int(os.getenv('KEEPER_PROBES_BATCH_SIZE')) \
+    if 'KEEPER_PROBES_BATCH_SIZE' in os.environ \
+    else 1000
+keeper_probes_duration = int(os.getenv('KEEPER_PROBES_DURATION')) \
+    if 'KEEPER_PROBES_DURATION' in os.environ \
+    else 100
+# seconds between samples of read-only replicas and keeper quorum of e2e.keeper_timeline during keeper rescales
+keeper_timeline_interval = float(os.getenv('KEEPER_TIMELINE_INTERVAL')) \
+    if 'KEEPER_TIMELINE_INTERVAL' in os.environ \
+    else 0.5
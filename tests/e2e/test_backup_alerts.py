@@ -1,7 +1,11 @@
+import re
 import json
 import random
 import time
 import datetime
+import base64
+import threading
+import http.client
 import e2e.alerts as alerts
 import e2e.settings as settings
 import e2e.kubectl as kubectl
@@ -10,6 +14,7 @@ import e2e.util as util
 
 from testflows.core import *
 from testflows.asserts import error
+from testflows.connect import Shell
 
 
 def get_minio_spec():
@@ -33,32 +38,233 @@ def get_backup_metric_value(backup_pod, metric_name, ns=settings.test_namespace)
     return exec_on_backup_container(backup_pod, cmd=cmd, ns=ns)
 
 
-def is_expected_backup_status(command_name, command_is_done, st, expected_status, err_status):
-    if 'command' in st and st['command'] == command_name:
-        if st['status'] == expected_status:
-            command_is_done = True
-            return True,  command_is_done
-        elif st['status'] == err_status:
-            if 'error' in st:
-                fail(st['error'])
-            else:
-                fail(f'unexpected status of {command_name} {st}')
-        else:
-            with Then('Not ready, wait 5 sec'):
-                time.sleep(5)
-    return False, command_is_done
-
-
-def wait_backup_command_status(backup_pod, command_name, expected_status='success', err_status='error'):
-    command_is_done = False
+class BackupStatusTracker(object):
+    """Follows /backup/status of the clickhouse-backup API in one pod.
+
+    When kubectl runs natively, a background thread polls the API through one port-forward and keep-alive
+    HTTP connection and wakes waiters as soon as a command status changes, otherwise status is polled
+    by `kubectl exec curl` from wait(). The API returns the whole command log every time, lines which already
+    reached a final status are not parsed again.
+    """
+    final_statuses = ("success", "error", "canceled")
+    # longest pause between port-forward attempts while the API does not answer
+    max_retry_interval = 30.0
+
+    def __init__(self, backup_pod, ns=settings.test_namespace, poll_interval=1.0):
+        self.backup_pod = backup_pod
+        self.ns = ns
+        self.poll_interval = poll_interval
+        self.lines = []
+        self.statuses = []
+        # number of leading lines with final status
+        self.done = 0
+        self.condition = threading.Condition()
+        self.forward = None
+        self.connection = None
+        self.thread = None
+        self.stopped = False
+
+    def start(self):
+        if current().context.native:
+            self.thread = threading.Thread(target=self._poll_forever, name=f"backup-status-{self.backup_pod}", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self._disconnect()
+
+    def _disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        if self.forward is not None:
+            self.forward.stop()
+            self.forward = None
+
+    def _fetch_http(self):
+        if self.forward is None or not self.forward.alive():
+            self._disconnect()
+            self.forward = kubectl.port_forward(f"pod/{self.backup_pod}", 7171, ns=self.ns).start()
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection("127.0.0.1", self.forward.local_port, timeout=30)
+        self.connection.request("GET", "/backup/status")
+        response = self.connection.getresponse()
+        return response.read().decode()
+
+    def _poll_forever(self):
+        failures = 0
+        while True:
+            try:
+                self.update(self._fetch_http())
+                failures = 0
+            except Exception:
+                # clickhouse-backup container restarted or port-forward broke, reconnect with a backoff,
+                # a recreated pod is not ready for port-forward for a while
+                self._disconnect()
+                failures += 1
+            with self.condition:
+                if self.stopped:
+                    return
+                self.condition.wait(min(self.poll_interval * 2 ** failures, self.max_retry_interval))
+                if self.stopped:
+                    return
+
+    def update(self, out):
+        lines = [line for line in out.splitlines() if line.startswith("{")]
+        with self.condition:
+            if len(lines) < len(self.lines):
+                # command log only grows, shorter one means clickhouse-backup was restarted
+                self.lines, self.statuses, self.done = [], [], 0
+            for i in range(self.done, len(lines)):
+                if i < len(self.lines) and self.lines[i] == lines[i]:
+                    continue
+                status = json.loads(lines[i])
+                if i < len(self.lines):
+                    self.lines[i], self.statuses[i] = lines[i], status
+                else:
+                    self.lines.append(lines[i])
+                    self.statuses.append(status)
+            while self.done < len(self.statuses) and self.statuses[self.done].get('status') in self.final_statuses:
+                self.done += 1
+            self.condition.notify_all()
+
+    def find(self, command_name):
+        """Last status reported for the command, or None. command_name may be a compiled regexp for commands with flags."""
+        with self.condition:
+            for st in reversed(self.statuses):
+                if st.get('command') == command_name or (
+                    isinstance(command_name, re.Pattern) and command_name.fullmatch(st.get('command', ''))
+                ):
+                    return st
+        return None
+
+    def wait(self, command_name, expected_status='success', err_status='error', timeout=None):
+        timeout = settings.backup_status_timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        while True:
+            if self.thread is None:
+                self.update(exec_on_backup_container(
+                    self.backup_pod, 'curl -sL "http://127.0.0.1:7171/backup/status"', ns=self.ns, ok_to_fail=True,
+                ))
+            st = self.find(command_name)
+            if st is not None and st['status'] == expected_status:
+                return st
+            if st is not None and st['status'] == err_status:
+                fail(st['error'] if 'error' in st else f'unexpected status of {command_name} {st}')
+            if time.time() >= deadline:
+                fail(f'"{command_name}" did not reach status "{expected_status}" in {timeout}s, last status {st}')
+            with self.condition:
+                self.condition.wait(min(self.poll_interval if self.thread is not None else 5, max(0.0, deadline - time.time())))
+
+
+backup_status_trackers = {}
+backup_status_trackers_lock = threading.Lock()
+
+
+def get_backup_status_tracker(backup_pod, ns=settings.test_namespace):
+    with backup_status_trackers_lock:
+        if (backup_pod, ns) not in backup_status_trackers:
+            backup_status_trackers[(backup_pod, ns)] = BackupStatusTracker(backup_pod, ns=ns).start()
+        return backup_status_trackers[(backup_pod, ns)]
+
+
+def stop_backup_status_trackers():
+    with backup_status_trackers_lock:
+        trackers = list(backup_status_trackers.values())
+        backup_status_trackers.clear()
+    for tracker in trackers:
+        tracker.stop()
+
+
+def wait_backup_command_status(backup_pod, command_name, expected_status='success', err_status='error', timeout=None):
     with Then(f'wait "{command_name}" with status "{expected_status}"'):
-        while command_is_done is False:
-            status_lines = exec_on_backup_container(backup_pod, f'curl -sL "http://127.0.0.1:7171/backup/status"').splitlines()
-            for line in status_lines:
-                st = json.loads(line)
-                is_break, command_is_done = is_expected_backup_status(command_name, command_is_done, st, expected_status, err_status)
-                if is_break:
-                    break
+        return get_backup_status_tracker(backup_pod).wait(command_name, expected_status, err_status, timeout=timeout)
+
+
+class FakeBackupMetrics(object):
+    """Metrics served instead of clickhouse-backup by the nginx sidecar of tpl-clickhouse-backups-fake.yaml.
+
+    Values are kept here and the whole exposition file is replaced by a single exec on every change.
+    """
+    path = "/usr/share/nginx/html/metrics"
+    help = {
+        "clickhouse_backup_last_backup_duration": "Backup duration in nanoseconds.",
+        "clickhouse_backup_last_create_duration": "Backup create duration in nanoseconds",
+        "clickhouse_backup_last_download_duration": "Backup download duration in nanoseconds",
+        "clickhouse_backup_last_restore_duration": "Backup restore duration in nanoseconds",
+        "clickhouse_backup_last_upload_duration": "Backup upload duration in nanoseconds",
+        "clickhouse_backup_last_create_status": "Last backup create status: 0=failed, 1=success, 2=unknown",
+        "clickhouse_backup_last_upload_status": "Last backup upload status: 0=failed, 1=success, 2=unknown",
+        "clickhouse_backup_last_backup_success": "Last backup success boolean: 0=failed, 1=success, 2=unknown.",
+        "clickhouse_backup_last_create_finish": "Last backup create finish timestamp",
+        "clickhouse_backup_last_upload_finish": "Last backup upload finish timestamp",
+        "clickhouse_backup_last_backup_size_local": "Last local backup size in bytes",
+        "clickhouse_backup_last_backup_size_remote": "Last remote backup size in bytes",
+    }
+    # the same values as the sidecar writes on start
+    defaults = {
+        "clickhouse_backup_last_backup_duration": 0,
+        "clickhouse_backup_last_create_duration": 14400000000001,
+        "clickhouse_backup_last_download_duration": 0,
+        "clickhouse_backup_last_restore_duration": 0,
+        "clickhouse_backup_last_upload_duration": 0,
+        "clickhouse_backup_last_create_status": 1,
+        "clickhouse_backup_last_backup_success": 1,
+    }
+
+    def __init__(self, backup_pod, ns=settings.test_namespace):
+        self.backup_pod = backup_pod
+        self.ns = ns
+        self.values = dict(self.defaults)
+
+    def render(self):
+        out = ""
+        for name, value in self.values.items():
+            value = int(value) if float(value).is_integer() else value
+            out += f"# HELP {name} {self.help.get(name, name)}\n# TYPE {name} gauge\n{name} {value}\n"
+        return out
+
+    def write(self):
+        content = base64.b64encode(self.render().encode()).decode()
+        exec_on_backup_container(
+            self.backup_pod,
+            f"bash -c 'echo {content} | base64 -d > {self.path}.tmp && mv {self.path}.tmp {self.path}'",
+            ns=self.ns,
+        )
+
+    def set(self, **values):
+        """Change some metrics and keep the rest."""
+        self.values.update(values)
+        self.write()
+
+    def replace(self, **values):
+        """Serve only these metrics."""
+        self.values = dict(values)
+        self.write()
+
+
+@TestStep(When)
+def run_on_backup_pod(self, backup_pod, action, results):
+    """Run action(backup_pod) with its own shell, so it can run in parallel with other pods."""
+    with Shell() as shell:
+        self.context.shell = shell
+        results[backup_pod] = action(backup_pod)
+
+
+def for_each_backup_pod(name, backup_pods, action):
+    """Run action(backup_pod) for all pods concurrently, returns {backup_pod: result}."""
+    results = {}
+    for backup_pod in backup_pods:
+        When(f"{name} on {backup_pod}", test=run_on_backup_pod, parallel=True)(
+            backup_pod=backup_pod, action=action, results=results,
+        )
+    join()
+    return results
 
 
 def wait_backup_pod_ready_and_curl_installed(backup_pod):
@@ -247,29 +453,35 @@ def test_backup_duration(self, chi, minio_spec):
     short_pod, _, long_pod, _ = alerts.random_pod_choice_for_callbacks(chi)
     apply_fake_backup("prepare fake backup duration metric")
 
-    for pod in [short_pod, long_pod]:
+    def wait_too_long_alert(pod):
         with Then(f"wait {pod} ready"):
             kubectl.wait_field("pod", pod, ".spec.containers[1].image", "nginx:latest")
             kubectl.wait_field("pod", pod, ".status.containerStatuses[1].ready", "true")
 
-            fired = alerts.wait_alert_state("ClickHouseBackupTooLong", "firing", expected_state=True, sleep_time=settings.prometheus_scrape_interval,
-                                            labels={"pod_name": pod}, time_range='60s')
-            assert fired, error(f"can't get ClickHouseBackupTooLong alert in firing state for {pod}")
+        return alerts.wait_alert_state("ClickHouseBackupTooLong", "firing", expected_state=True, sleep_time=settings.prometheus_scrape_interval,
+                                       labels={"pod_name": pod}, time_range='60s')
+
+    fired = for_each_backup_pod("wait ClickHouseBackupTooLong", [short_pod, long_pod], wait_too_long_alert)
+    for pod in fired:
+        with Then(f"ClickHouseBackupTooLong is firing for {pod}"):
+            assert fired[pod], error(f"can't get ClickHouseBackupTooLong alert in firing state for {pod}")
 
-    with Then(f"wait when prometheus will scrape fake data"):
-        time.sleep(70)
+    with Then(f"wait when prometheus will have a minute of fake data, ClickHouseBackupTooShort compares with offset 1m"):
+        scraped = alerts.wait_prometheus_value(
+            f'clickhouse_backup_last_create_duration{{pod_name="{short_pod}"}} offset 1m',
+            FakeBackupMetrics.defaults["clickhouse_backup_last_create_duration"],
+        )
+        assert scraped, error()
 
     with Then(f"decrease {short_pod} backup duration"):
-        kubectl.launch(
-            f'exec {short_pod} -c clickhouse-backup -- bash -xc \''
-            'echo "# HELP clickhouse_backup_last_create_duration Backup create duration in nanoseconds" > /usr/share/nginx/html/metrics && '
-            'echo "# TYPE clickhouse_backup_last_create_duration gauge" >> /usr/share/nginx/html/metrics && '
-            'echo "clickhouse_backup_last_create_duration 7000000000000" >> /usr/share/nginx/html/metrics && '
-            'echo "# HELP clickhouse_backup_last_create_status Last backup create status: 0=failed, 1=success, 2=unknown" >> /usr/share/nginx/html/metrics && '
-            'echo "# TYPE clickhouse_backup_last_create_status gauge" >> /usr/share/nginx/html/metrics && '
-            'echo "clickhouse_backup_last_create_status 1" >> /usr/share/nginx/html/metrics'
-            '\''
+        FakeBackupMetrics(short_pod).set(
+            clickhouse_backup_last_create_duration=7000000000000,
+            clickhouse_backup_last_create_status=1,
+        )
+        scraped = alerts.wait_prometheus_value(
+            f'clickhouse_backup_last_create_duration{{pod_name="{short_pod}"}}', 7000000000000,
         )
+        assert scraped, error()
 
         fired = alerts.wait_alert_state("ClickHouseBackupTooShort", "firing", expected_state=True, sleep_time=settings.prometheus_scrape_interval,
                                         labels={"pod_name": short_pod}, time_range='60s')
@@ -303,13 +515,13 @@ def test_backup_size(self, chi, minio_spec):
             'decrease': False,
         },
     }
-    for backup_pod in backup_cases:
-        decrease = backup_cases[backup_pod]['decrease']
+
+    def backup_size_cycle(backup_pod):
         for backup_rows in backup_cases[backup_pod]['rows']:
             backup_name = prepare_table_for_backup(backup_pod, chi, rows=backup_rows)
             exec_on_backup_container(backup_pod, f'curl -X POST -sL "http://127.0.0.1:7171/backup/create?name={backup_name}"')
             wait_backup_command_status(backup_pod, f'create {backup_name}', expected_status='success')
-            if decrease:
+            if backup_cases[backup_pod]['decrease']:
                 clickhouse.query(
                     chi['metadata']['name'],
                     f"TRUNCATE TABLE default.test_backup",
@@ -318,12 +530,18 @@ def test_backup_size(self, chi, minio_spec):
             time.sleep(15)
         fired = alerts.wait_alert_state("ClickHouseBackupSizeChanged", "firing", expected_state=True, sleep_time=settings.prometheus_scrape_interval,
                                         labels={"pod_name": backup_pod}, time_range='60s')
-        assert fired, error(f"can't get ClickHouseBackupSizeChanged alert in firing state, decrease={decrease}")
+        resolved = fired and alerts.wait_alert_state("ClickHouseBackupSizeChanged", "firing", expected_state=False,
+                                                     labels={"pod_name": backup_pod})
+        return {'fired': fired, 'resolved': resolved}
 
-        with Then("check ClickHouseBackupSizeChanged gone away"):
-            resolved = alerts.wait_alert_state("ClickHouseBackupSizeChanged", "firing", expected_state=False,
-                                               labels={"pod_name": backup_pod})
-            assert resolved, error(f"can't get ClickHouseBackupSizeChanged alert is gone away, decrease={decrease}")
+    results = for_each_backup_pod("backup size cycle", list(backup_cases), backup_size_cycle)
+    for backup_pod, result in results.items():
+        decrease = backup_cases[backup_pod]['decrease']
+        with Then(f"ClickHouseBackupSizeChanged fired for {backup_pod}"):
+            assert result['fired'], error(f"can't get ClickHouseBackupSizeChanged alert in firing state, decrease={decrease}")
+
+        with Then(f"check ClickHouseBackupSizeChanged gone away for {backup_pod}"):
+            assert result['resolved'], error(f"can't get ClickHouseBackupSizeChanged alert is gone away, decrease={decrease}")
 
 
 @TestScenario
@@ -337,12 +555,8 @@ def test_backup_not_run(self, chi, minio_spec):
         kubectl.wait_field("pod", not_run_pod, ".status.containerStatuses[1].ready", "true")
 
     with Then(f"setup {not_run_pod} backup create end time"):
-        kubectl.launch(
-            f'exec {not_run_pod} -c clickhouse-backup -- bash -xc \''
-            'echo "# HELP clickhouse_backup_last_create_finish Last backup create finish timestamp" > /usr/share/nginx/html/metrics && '
-            'echo "# TYPE clickhouse_backup_last_create_finish gauge" >> /usr/share/nginx/html/metrics && '
-            f'echo "clickhouse_backup_last_create_finish {int((datetime.datetime.now() - datetime.timedelta(days=2)).timestamp())}" >> /usr/share/nginx/html/metrics '
-            '\''
+        FakeBackupMetrics(not_run_pod).replace(
+            clickhouse_backup_last_create_finish=int((datetime.datetime.now() - datetime.timedelta(days=2)).timestamp()),
         )
 
         fired = alerts.wait_alert_state("ClickhouseBackupDoesntRunTooLong", "firing", expected_state=True, sleep_time=settings.prometheus_scrape_interval,
@@ -387,5 +601,8 @@ def test(self):
             test_backup_size,
             test_backup_not_run,
         ]
-        for t in test_cases:
-            Scenario(test=t)(chi=chi, minio_spec=minio_spec)
+        try:
+            for t in test_cases:
+                Scenario(test=t)(chi=chi, minio_spec=minio_spec)
+        finally:
+            stop_backup_status_trackers()
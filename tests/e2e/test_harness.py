@@ -0,0 +1,240 @@
+"""Offline checks of the harness itself against e2e.fake_kubectl and e2e.fake_clickhouse, see Offline mode in README.md:
+
+    KUBECTL_CMD="python3 $(pwd)/e2e/fake_kubectl.py" FAKE_KUBECTL_STATE=/tmp/fake-kubectl.json \\
+        python3 ./regression.py --native --only "/regression/e2e.test_harness/*"
+
+The feature is skipped with a real kubectl.
+"""
+import os
+import time
+
+import e2e.fake_clickhouse as fake_clickhouse
+import e2e.keeper_load as keeper_load
+import e2e.keeper_timeline as keeper_timeline
+import e2e.kubectl as kubectl
+import e2e.prober as prober
+import e2e.schema as schema
+import e2e.settings as settings
+import e2e.util as util
+import e2e.workload as workload
+import e2e.yaml_manifest as yaml_manifest
+
+from testflows.core import *
+from testflows.asserts import error
+from testflows.connect import Shell
+
+readonly_error = "Code: 242. DB::Exception: Table is in readonly mode: replica_path=/clickhouse/tables/0/default/t. (TABLE_IS_READ_ONLY)"
+keeper_error = "Code: 999. Coordination::Exception: Connection loss. (KEEPER_EXCEPTION)"
+
+
+class FakeChi(object):
+    """CHI of the manifest applied to fake kubectl, clickhouse-client in its pods is answered by a FakeClickHouseFleet.
+
+    Queries to services go to the first host.
+    """
+
+    def __init__(self, manifest, shards=1, replicas=1):
+        self.manifest = util.get_full_path(manifest)
+        self.chi_name = yaml_manifest.get_chi_name(self.manifest)
+        self.fleet = fake_clickhouse.FakeClickHouseFleet.for_chi(self.chi_name, shards, replicas)
+        self.environ = {}
+
+    @property
+    def servers(self):
+        return list(self.fleet.servers.values())
+
+    @property
+    def pods(self):
+        return [server.pod for server in self.servers]
+
+    def __enter__(self):
+        self.fleet.start()
+        environ = dict(self.fleet.kubectl_env(), FAKE_CLICKHOUSE_URL=self.servers[0].url)
+        self.environ = {name: os.environ.get(name) for name in environ}
+        os.environ.update(environ)
+        # shells of kubectl.launch get the environment when they start, prober.Client runs kubectl directly
+        current().context.shell = Shell()
+        kubectl.apply(self.manifest)
+        kubectl.wait_chi_status(self.chi_name, "Completed")
+        return self
+
+    def __exit__(self, type, value, traceback):
+        try:
+            kubectl.launch(f"delete chi {self.chi_name}", ok_to_fail=True)
+            current().context.shell.close()
+        finally:
+            for name, value in self.environ.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            self.fleet.stop()
+
+
+def count_inserts(server):
+    """Rule for inserts into the server which counts them as ZooKeeperTransactions of system.events."""
+    events = {"ZooKeeperTransactions": 0, "ZooKeeperWaitMicroseconds": 0}
+
+    def insert(sql, host):
+        events["ZooKeeperTransactions"] += 1
+        events["ZooKeeperWaitMicroseconds"] += 1000
+        return ""
+
+    server.set_table("system.events", ["event", "value", "description"], lambda: [[e, v, ""] for e, v in events.items()])
+    server.add_rule(r"^INSERT INTO", insert)
+
+
+@TestScenario
+@Name("test_harness_001. Schema snapshot and diff of fake hosts")
+def test_harness_001(self):
+    tables = ["database", "name", "engine", "uuid", "is_temporary"]
+    with FakeChi("manifests/chi/test-014-replication-1.yaml", shards=2) as chi:
+        source, other = chi.pods
+        with Given("default.t, its view and a dictionary on the first host, default.t with another engine on the second"):
+            chi.servers[0].set_table("system.tables", tables, [
+                ["default", "t", "ReplicatedMergeTree", "", 0],
+                ["default", "v", "MaterializedView", "", 0],
+                ["default", ".inner_id.5f7d", "ReplicatedMergeTree", "", 0],
+                ["system", "one", "SystemOne", "", 0],
+                ["default", "tmp", "Memory", "", 1],
+            ])
+            chi.servers[0].set_table("system.dictionaries", ["database", "name", "status"], [["default", "d", "LOADED"]])
+            chi.servers[1].set_table("system.tables", tables, [
+                ["default", "t", "MergeTree", "", 0],
+                ["default", "v", "MaterializedView", "", 0],
+            ])
+
+        with When("schema of all hosts is taken"):
+            snap = schema.snapshot(chi.chi_name)
+
+        with Then("hosts are named by their pods"):
+            assert sorted(snap) == sorted(chi.pods), error()
+            assert snap[source] == {
+                ("database", "default"): "Atomic",
+                ("table", "default.t"): "ReplicatedMergeTree",
+                ("table", "default.v"): "MaterializedView",
+                ("dictionary", "default.d"): "Dictionary",
+            }, error()
+
+        with Then("differences from the first host are reported, a missing pod is unreachable"):
+            missing_pod = f"chi-{chi.chi_name}-default-2-0-0"
+            assert schema.diff(snap, source, pods=chi.pods + [missing_pod]) == {
+                other: {
+                    "missing": ["dictionary default.d"],
+                    "extra": [],
+                    "engine": ["table default.t: ReplicatedMergeTree != MergeTree"],
+                },
+                missing_pod: {"unreachable": True},
+            }, error()
+            assert schema.missing_objects(snap, other, [("table", "default.t"), ("dictionary", "default.d")]) == \
+                [("dictionary", "default.d")], error()
+
+
+@TestScenario
+@Name("test_harness_002. Workload classifies injected errors and measures injected latency")
+def test_harness_002(self):
+    with FakeChi("manifests/chi/test-014-replication-1.yaml", shards=2) as chi:
+        server = chi.servers[0]
+        server.add_rule(r"^INSERT INTO", lambda sql, host: "")
+        load = workload.Workload(
+            prober.Target(chi.pods[0], pod=chi.pods[0]), read_table="system.one", write_table="default.t",
+            qps=5, timeout=5.0,
+        )
+        with When("inserts fail as read-only, a read loses its connection and reads are slow for a while"):
+            server.inject(r"^INSERT INTO", error=readonly_error, times=2)
+            server.inject(r"FROM system\.one", drop_connection=True, times=1)
+            server.inject(r"FROM system\.one", latency=0.5, times=2)
+            with load:
+                time.sleep(3)
+            report = load.note_report()
+
+        with Then("errors are counted by their class"):
+            assert report["write"]["error_classes"] == {"readonly": 2}, error()
+            assert report["read"]["error_classes"] == {"connection": 1}, error()
+            assert report["read"]["ops"] > 3 and report["write"]["ops"] > 2, error()
+
+        with Then("slow reads and failed inserts violate the SLO"):
+            violations = load.violations(p99=0.4, error_rate=0.1)
+            assert any(v.startswith("read: p99 latency") for v in violations), error()
+            assert any(v.startswith("write: error rate") for v in violations), error()
+
+        with Then("classify() knows errors of the client"):
+            assert workload.classify(keeper_error) == "keeper", error()
+            assert workload.classify("HTTP 503 no endpoints available for service") == "unavailable", error()
+            assert workload.classify("timed out") == "timeout", error()
+
+
+@TestScenario
+@Name("test_harness_003. Rescale timeline measures read-only replicas and unavailable ClickHouse")
+def test_harness_003(self):
+    with FakeChi("manifests/chi/test-014-replication-1.yaml", shards=2) as chi:
+        timeline = keeper_timeline.RescaleTimeline(chi.chi_name, keeper_pod_count=1, interval=0.2)
+        with timeline:
+            timeline.mark("read-only")
+            chi.servers[1].set_metric("ReadonlyReplica", 1)
+            time.sleep(1.5)
+            chi.servers[1].set_metric("ReadonlyReplica", 0)
+            timeline.mark("unavailable")
+            fault = chi.servers[0].inject(r"system\.metrics", drop_connection=True)
+            time.sleep(1.5)
+            chi.servers[0].clear_faults(fault)
+            timeline.mark("recovered")
+            time.sleep(1)
+        report = timeline.note_report()
+
+        # a sample lasts until the next one and is taken when its query starts, so phases overlap by a sample
+        with Then("read-only time is attributed to the pod of the second host and its phase"):
+            phases = report["phases"]
+            assert list(report["readonly_host_s"]) == [chi.pods[1]], error()
+            assert phases["read-only"]["readonly_s"] > phases["read-only"]["duration_s"] / 2, error()
+            assert phases["unavailable"]["readonly_s"] < phases["unavailable"]["duration_s"] / 2, error()
+            assert phases["recovered"]["readonly_s"] < phases["recovered"]["duration_s"] / 2, error()
+
+        with Then("dropped connections are reported as unavailable ClickHouse"):
+            assert phases["unavailable"]["clickhouse_unavailable_s"] > phases["unavailable"]["duration_s"] / 2, error()
+            assert phases["read-only"]["clickhouse_unavailable_s"] < phases["read-only"]["duration_s"] / 2, error()
+            assert phases["recovered"]["clickhouse_unavailable_s"] < phases["recovered"]["duration_s"] / 2, error()
+
+        with Then("keeper without pods has no quorum"):
+            assert report["no_quorum_s"] > report["duration_s"] - timeline.interval, error()
+
+
+@TestScenario
+@Name("test_harness_004. Keeper load counts inserts, keeper errors and ZooKeeper events of fake hosts")
+def test_harness_004(self):
+    with FakeChi("manifests/chi/test-014-replication-1.yaml", shards=2) as chi:
+        for server in chi.servers:
+            count_inserts(server)
+        load = keeper_load.KeeperLoad(chi.chi_name, chi.pods, keeper_pod_count=1, rate=4, batch_size=1, writers=1,
+                                      sample_interval=0.5)
+        with When("inserts into the second host lose the keeper session twice"):
+            chi.servers[1].inject(r"^INSERT INTO", error=keeper_error, times=2)
+            with load:
+                time.sleep(3)
+            report = load.note_report()
+
+        with Then("inserts and keeper errors are counted"):
+            assert report["insert_error_classes"] == {"keeper": 2}, error()
+            assert report["inserts"] > 4, error()
+
+        with Then("ZooKeeper events of all hosts are sampled from one query"):
+            assert {host for _, events in load.clickhouse_samples for host in events} == set(chi.pods), error()
+            assert report["zookeeper_transactions_per_s"] > 0, error()
+            assert report["zookeeper_wait_us_per_transaction"] == 1000, error()
+
+
+@TestFeature
+@Name("e2e.test_harness")
+def test(self):
+    if "fake_kubectl" not in settings.kubectl_cmd:
+        skip("needs KUBECTL_CMD of e2e/fake_kubectl.py")
+    util.clean_namespace(delete_chi=True)
+
+    all_tests = [
+        test_harness_001,
+        test_harness_002,
+        test_harness_003,
+        test_harness_004,
+    ]
+    for t in all_tests:
+        Scenario(test=t)()
@@ -1,6 +1,9 @@
 import time
 
 import e2e.clickhouse as clickhouse
+import e2e.keeper as keeper
+import e2e.keeper_load as keeper_load
+import e2e.keeper_timeline as keeper_timeline
 import e2e.kubectl as kubectl
 import e2e.settings as settings
 import e2e.util as util
@@ -9,24 +12,25 @@ from testflows.core import *
 
 
 def wait_keeper_ready(keeper_type='zookeeper', pod_count=3, retries=10):
-    svc_name = 'zookeeper-client' if keeper_type == "zookeeper-operator" else 'zookeeper'
-    expected_containers = "2/2" if keeper_type == "clickhouse-keeper" else "1/1"
-    expected_pod_prefix = "clickhouse-keeper" if keeper_type == "clickhouse-keeper" else "zookeeper"
-    for i in range(retries):
-        ready_pods = kubectl.launch(f"get pods | grep {expected_pod_prefix} | grep Running | grep '{expected_containers}' | wc -l")
-        ready_endpoints = "0"
-        if ready_pods == str(pod_count):
-            ready_endpoints = kubectl.launch(f"get endpoints {svc_name} -o json | jq '.subsets[].addresses[].ip' | wc -l")
-            if ready_endpoints == str(pod_count):
-                break
-        else:
+    with keeper.KeeperProbe(keeper_type) as probe:
+        for i in range(retries):
+            pods = keeper.ready_pods(keeper_type)
+            ready_pods = sorted(pod for pod, ready in pods.items() if ready)
+            ready_endpoints = 0
+            states = {}
+            if len(ready_pods) == pod_count:
+                ready_endpoints = keeper.ready_endpoints(keeper_type)
+                if ready_endpoints == pod_count:
+                    states = probe.quorum(ready_pods)
+                    if keeper.has_quorum(states, pod_count):
+                        break
             with Then(
-                    f"Zookeeper Not ready yet ready_endpoints={ready_endpoints} ready_pods={ready_pods}, expected pod_count={pod_count}. "
-                    f"Wait for {i * 3} seconds"
+                    f"{keeper_type} not ready yet ready_endpoints={ready_endpoints} ready_pods={ready_pods} states={states}, "
+                    f"expected pod_count={pod_count}. Wait for {i * 3} seconds"
             ):
                 time.sleep(i * 3)
-        if i == retries - 1:
-            Fail(f"Zookeeper failed, ready_endpoints={ready_endpoints} ready_pods={ready_pods}, expected pod_count={pod_count}")
+            if i == retries - 1:
+                Fail(f"{keeper_type} failed, ready_endpoints={ready_endpoints} ready_pods={ready_pods} states={states}, expected pod_count={pod_count}")
 
 
 def wait_clickhouse_no_readonly_replicas(chi, retries=20):
@@ -63,34 +67,17 @@ def insert_replicated_data(chi, pod_for_insert_data, create_tables, insert_table
             )
 
 def check_zk_root_znode(chi, keeper_type, pod_count, retry_count=5):
-    for pod_num in range(pod_count):
-        out = ""
-        expected_out = ""
+    expected_znodes = keeper.root_znodes[keeper_type]
+    pods = [f"{keeper.pod_prefixes[keeper_type]}-{pod_num}" for pod_num in range(pod_count)]
+    with keeper.KeeperProbe(keeper_type) as probe:
         for i in range(retry_count):
-            if keeper_type == "zookeeper-operator":
-                expected_out = "[clickhouse, zookeeper, zookeeper-operator]"
-                keeper_cmd = './bin/zkCli.sh ls /'
-                pod_prefix = "zookeeper"
-            elif keeper_type == "zookeeper":
-                expected_out = "[clickhouse, zookeeper]"
-                keeper_cmd = './bin/zkCli.sh ls /'
-                pod_prefix = "zookeeper"
-            else:
-                expected_out = "clickhouse"
-                keeper_cmd = "if [[ ! $(command -v zookeepercli) ]]; then "
-                keeper_cmd += "wget -q -O /tmp/zookeepercli.deb https://github.com/outbrain/zookeepercli/releases/download/v1.0.12/zookeepercli_1.0.12_amd64.deb; "
-                keeper_cmd += "dpkg -i /tmp/zookeepercli.deb; "
-                keeper_cmd += "fi; "
-                keeper_cmd += "zookeepercli -servers 127.0.0.1:2181 -c ls /"
-                pod_prefix = "clickhouse-keeper"
-
-            out = kubectl.launch(f"exec {pod_prefix}-{pod_num} -- bash -ce '{keeper_cmd}'", ns=settings.test_namespace, ok_to_fail=True)
-            if expected_out in out:
+            out = {pod: probe.get_children(pod, "/") for pod in pods}
+            ok = all(set(expected_znodes) <= set(children) for children in out.values())
+            if ok:
                 break
-            else:
-                with Then(f"{keeper_type} ROOT NODE not ready, wait {(i + 1) * 3} sec"):
-                    time.sleep((i + 1) * 3)
-        assert expected_out in out, f"Unexpected {keeper_type} `ls /` output"
+            with Then(f"{keeper_type} ROOT NODE not ready {out}, wait {(i + 1) * 3} sec"):
+                time.sleep((i + 1) * 3)
+        assert ok, f"Unexpected {keeper_type} `ls /` output {out}, expected {expected_znodes}"
 
     out = clickhouse.query(chi["metadata"]["name"], "SELECT count() FROM system.zookeeper WHERE path='/'")
     expected_out = {
@@ -145,23 +132,36 @@ def test_keeper_outline(self,
     total_iterations = 3
     for iteration in range(total_iterations):
         with When(f"ITERATION {iteration}"):
-            with Then("CH 1 -> 2 wait complete + ZK 1 -> 3 nowait"):
-                chi = rescale_zk_and_clickhouse(ch_node_count=2, keeper_node_count=3, keeper_type=keeper_type, keeper_manifest_1_node=keeper_manifest_1_node, keeper_manifest_3_node=keeper_manifest_3_node)
-                wait_keeper_ready(keeper_type=keeper_type, pod_count=3)
-                check_zk_root_znode(chi, keeper_type, pod_count=3)
-
-                util.wait_clickhouse_cluster_ready(chi)
-                wait_clickhouse_no_readonly_replicas(chi)
-                insert_replicated_data(chi, pod_for_insert_data, create_tables=['test_repl2'], insert_tables=['test_repl1', 'test_repl2'])
-
-            with Then("CH 2 -> 1 wait complete + ZK 3 -> 1 nowait"):
-                chi = rescale_zk_and_clickhouse(ch_node_count=1, keeper_node_count=1, keeper_type=keeper_type, keeper_manifest_1_node=keeper_manifest_1_node, keeper_manifest_3_node=keeper_manifest_3_node,)
-                wait_keeper_ready(keeper_type=keeper_type, pod_count=1)
-                check_zk_root_znode(chi, keeper_type, pod_count=1)
-
-                util.wait_clickhouse_cluster_ready(chi)
-                wait_clickhouse_no_readonly_replicas(chi)
-                insert_replicated_data(chi, pod_for_insert_data, create_tables=['test_repl3'], insert_tables=['test_repl1', 'test_repl2', 'test_repl3'])
+            timeline = keeper_timeline.RescaleTimeline(chi['metadata']['name'], keeper_type, user="bench", password="bench")
+            with timeline:
+                with Then("CH 1 -> 2 wait complete + ZK 1 -> 3 nowait"):
+                    timeline.mark("CH 1 -> 2 + keeper 1 -> 3")
+                    chi = rescale_zk_and_clickhouse(ch_node_count=2, keeper_node_count=3, keeper_type=keeper_type, keeper_manifest_1_node=keeper_manifest_1_node, keeper_manifest_3_node=keeper_manifest_3_node)
+                    wait_keeper_ready(keeper_type=keeper_type, pod_count=3)
+                    check_zk_root_znode(chi, keeper_type, pod_count=3)
+
+                    util.wait_clickhouse_cluster_ready(chi)
+                    wait_clickhouse_no_readonly_replicas(chi)
+                    insert_replicated_data(chi, pod_for_insert_data, create_tables=['test_repl2'], insert_tables=['test_repl1', 'test_repl2'])
+
+                with Then("CH 2 -> 1 wait complete + ZK 3 -> 1 nowait"):
+                    timeline.mark("CH 2 -> 1 + keeper 3 -> 1")
+                    chi = rescale_zk_and_clickhouse(ch_node_count=1, keeper_node_count=1, keeper_type=keeper_type, keeper_manifest_1_node=keeper_manifest_1_node, keeper_manifest_3_node=keeper_manifest_3_node,)
+                    wait_keeper_ready(keeper_type=keeper_type, pod_count=1)
+                    check_zk_root_znode(chi, keeper_type, pod_count=1)
+
+                    util.wait_clickhouse_cluster_ready(chi)
+                    wait_clickhouse_no_readonly_replicas(chi)
+                    insert_replicated_data(chi, pod_for_insert_data, create_tables=['test_repl3'], insert_tables=['test_repl1', 'test_repl2', 'test_repl3'])
+
+            with Then(f"Record read-only time of ITERATION {iteration}"):
+                timeline.note_report()
+                keeper_timeline.store(timeline, params={
+                    "keeper_type": keeper_type,
+                    "keeper_manifest": keeper_manifest_3_node,
+                    "iteration": iteration,
+                    "clickhouse_version": settings.clickhouse_version,
+                })
 
     with When("CH 1 -> 2 wait complete + ZK 1 -> 3 nowait"):
         chi = rescale_zk_and_clickhouse(ch_node_count=2, keeper_node_count=3, keeper_type=keeper_type, keeper_manifest_1_node=keeper_manifest_1_node, keeper_manifest_3_node=keeper_manifest_3_node)
@@ -240,39 +240,29 @@ def test_keeper_probes_outline(
         wait_clickhouse_no_readonly_replicas(chi)
 
     with Then("Create zookeeper_bench table"):
-        clickhouse.query(chi['metadata']['name'],"DROP DATABASE IF EXISTS zookeeper_bench SYNC")
-        clickhouse.query(chi['metadata']['name'],"CREATE DATABASE zookeeper_bench")
-        clickhouse.query(chi['metadata']['name'],"""
-            CREATE TABLE zookeeper_bench.zookeeper_bench (p UInt64, x UInt64)
-            ENGINE=ReplicatedSummingMergeTree('/clickhouse/tables/{database}/{table}', '{replica}' )
-            ORDER BY tuple()
-            PARTITION BY p
-            SETTINGS in_memory_parts_enable_wal=0,
-                min_bytes_for_wide_part=104857600,
-                min_bytes_for_compact_part=10485760,
-                parts_to_delay_insert=1000000,
-                parts_to_throw_insert=1000000,
-                max_parts_in_total=1000000;        
-        """)
-    with Then("Insert data to zookeeper_bench for make zookeeper workload"):
+        clickhouse.query(chi['metadata']['name'],"DROP DATABASE IF EXISTS zookeeper_bench ON CLUSTER 'all-sharded' SYNC")
+        clickhouse.query(chi['metadata']['name'],"CREATE DATABASE zookeeper_bench ON CLUSTER 'all-sharded'")
+        clickhouse.query(chi['metadata']['name'], keeper_load.create_table_sql)
+
+    rate = settings.keeper_probes_insert_rate
+    parts = int(rate * settings.keeper_probes_batch_size * settings.keeper_probes_duration)
+    with Then(f"Insert up to {parts} parts to each replica for make zookeeper workload"):
         pod_prefix="chi-test-cluster-for-zk-default"
-        rows = 100000
-        for pod in ("0-0-0", "0-1-0"):
-            clickhouse.query(chi['metadata']['name'],"""
-                INSERT INTO zookeeper_bench.zookeeper_bench SELECT rand(1)%100, rand(2) FROM numbers(100000)
-                SETTINGS max_block_size=1,
-                  min_insert_block_size_bytes=1,
-                  min_insert_block_size_rows=1,
-                  insert_deduplicate=0,
-                  max_threads=128,
-                  max_insert_threads=128
-            """, pod=f"{pod_prefix}{pod}", timeout=rows )
+        load = keeper_load.KeeperLoad(
+            chi['metadata']['name'], [f"{pod_prefix}-0-0-0", f"{pod_prefix}-0-1-0"], keeper_type, rate=rate,
+            batch_size=settings.keeper_probes_batch_size, user="bench", password="bench", timeout=600,
+        )
+        with load:
+            time.sleep(settings.keeper_probes_duration)
+        report = load.note_report()
+        keeper_load.store(load, keeper_type, rate)
+        assert report["inserts"] > 0, "inserts shall be successful"
+        assert report["insert_error_rate"] <= settings.workload_slo_error_rate, \
+            f"insert errors {report['insert_error_classes']} shall be within WORKLOAD_SLO_ERROR_RATE"
 
     with Then("Check liveness and readiness probes fail"):
-        zk_pod_prefix = "zookeeper"
-        for zk_pod in range(3):
-            out = kubectl.launch(f"describe pod {zk_pod_prefix}-{zk_pod}")
-            assert "probe failed" not in out, "all probes shall be successful"
+        assert report["probe_failures"] == {}, "all probes shall be successful"
+        assert report["restarts"] == {}, "keeper pods shall not be restarted"
 
     with Then("Check ReadOnlyReplica"):
         out = clickhouse.query(chi['metadata']['name'],"SELECT count() FROM cluster('all-sharded',system.metric_log) WHERE CurrentMetric_ReadonlyReplica > 0")
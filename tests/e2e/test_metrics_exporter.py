@@ -6,10 +6,58 @@ from testflows.core import *
 from testflows.asserts import error
 
 import e2e.kubectl as kubectl
+import e2e.prometheus_metrics as prometheus_metrics
 import e2e.settings as settings
 import e2e.util as util
 
 
+def exporter_endpoint_via_kubectl(operator_namespace, operator_pod):
+    def get(path):
+        url_cmd = util.make_http_get_request("127.0.0.1", "8888", path)
+        return kubectl.launch(
+            f"exec {operator_pod} -c metrics-exporter -- {url_cmd}",
+            ns=operator_namespace
+        )
+    return get
+
+
+def check_monitoring_chi(get_endpoint, expect_result, max_retries=10):
+    with Then(f"metrics-exporter /chi endpoint result should return {expect_result}"):
+        for i in range(1, max_retries):
+            # check /metrics for try to refresh monitored instances
+            get_endpoint("/metrics")
+            # check /chi after refresh monitored instances
+            out = json.loads(get_endpoint("/chi"))
+            if out == expect_result:
+                break
+            with Then("Not ready. Wait for " + str(i * 5) + " seconds"):
+                time.sleep(i * 5)
+        assert out == expect_result, error()
+
+
+def check_monitoring_metrics(get_endpoint, expect_result, expect_types=None, max_retries=10):
+    """expect_result is a list of (metric name, labels, exists), label values may be compiled regexps.
+
+    expect_types is {metric name: type}, these metrics need both HELP and TYPE lines.
+    """
+    expect_types = expect_types or {}
+    with Then(f"metrics-exporter /metrics endpoint result should match with {expect_result}"):
+        for i in range(1, max_retries):
+            scrape = prometheus_metrics.parse(get_endpoint("/metrics"))
+            all_expected_done = all(
+                exists == scrape.has(name, labels) for name, labels, exists in expect_result
+            ) and all(
+                scrape.help(name) is not None and scrape.metric_type(name) == metric_type
+                for name, metric_type in expect_types.items()
+            )
+
+            if all_expected_done:
+                break
+            with Then("Not ready. Wait for " + str(i * 5) + " seconds"):
+                time.sleep(i * 5)
+        assert all_expected_done, error()
+
+
 @TestScenario
 @Name("Check metrics server setup and version")
 def test_metrics_exporter_setup(self):
@@ -22,28 +70,6 @@ def test_metrics_exporter_setup(self):
 @TestScenario
 @Name("Check metrics server state after reboot")
 def test_metrics_exporter_reboot(self):
-    def check_monitoring_chi(operator_namespace, operator_pod, expect_result, max_retries=10):
-        with Then(f"metrics-exporter /chi endpoint result should return {expect_result}"):
-            for i in range(1, max_retries):
-                # check /metrics for try to refresh monitored instances
-                url_cmd = util.make_http_get_request("127.0.0.1", "8888", "/metrics")
-                kubectl.launch(
-                    f"exec {operator_pod} -c metrics-exporter -- {url_cmd}",
-                    ns=operator_namespace
-                )
-                # check /chi after refresh monitored instances
-                url_cmd = util.make_http_get_request("127.0.0.1", "8888", "/chi")
-                out = kubectl.launch(
-                    f"exec {operator_pod} -c metrics-exporter -- {url_cmd}",
-                    ns=operator_namespace
-                )
-                out = json.loads(out)
-                if out == expect_result:
-                    break
-                with Then("Not ready. Wait for " + str(i * 5) + " seconds"):
-                    time.sleep(i * 5)
-            assert out == expect_result, error()
-
     with Given("clickhouse-operator is installed"):
         kubectl.wait_field("pods", util.operator_label, ".status.containerStatuses[*].ready", "true,true",
                            ns=settings.operator_namespace)
@@ -52,9 +78,10 @@ def test_metrics_exporter_reboot(self):
         out = kubectl.launch("get pods -l app=clickhouse-operator", ns=settings.operator_namespace).splitlines()[1]
         operator_pod = re.split(r'[\t\r\n\s]+', out)[0]
         operator_namespace = settings.operator_namespace
+        exporter = exporter_endpoint_via_kubectl(operator_namespace, operator_pod)
         kubectl.delete_ns(kubectl.namespace, ok_to_fail=True)
         kubectl.create_ns(kubectl.namespace)
-        check_monitoring_chi(operator_namespace, operator_pod, [])
+        check_monitoring_chi(exporter, [])
         with And("created simple clickhouse installation"):
             manifest = "../../docs/chi-examples/01-simple-layout-01-1shard-1repl.yaml"
             kubectl.create_and_check(
@@ -71,52 +98,33 @@ def test_metrics_exporter_reboot(self):
                 "namespace": "test", "name": "simple-01",
                 "hostnames": ["chi-simple-01-simple-0-0.test.svc.cluster.local"]
             }]
-            check_monitoring_chi(operator_namespace, operator_pod, expected_chi)
+            check_monitoring_chi(exporter, expected_chi)
             with When("reboot metrics exporter"):
                 kubectl.launch(f"exec -n {operator_namespace} {operator_pod} -c metrics-exporter -- bash -c 'kill 1'")
                 time.sleep(15)
                 kubectl.wait_field("pods", util.operator_label, ".status.containerStatuses[*].ready", "true,true",
                                    ns=settings.operator_namespace)
                 with Then("check metrics exporter still contains chi objects"):
-                    check_monitoring_chi(operator_namespace, operator_pod, expected_chi)
+                    check_monitoring_chi(exporter, expected_chi)
                     kubectl.delete(util.get_full_path(manifest, lookup_in_host=False), timeout=600)
-                    check_monitoring_chi(operator_namespace, operator_pod, [])
+                    check_monitoring_chi(exporter, [])
 
 
 @TestScenario
 @Name("Check metrics server help with different clickhouse version")
 def test_metrics_exporter_with_multiple_clickhouse_version(self):
-    def check_monitoring_metrics(operator_namespace, operator_pod, expect_result, max_retries=10):
-        with Then(f"metrics-exporter /metrics endpoint result should match with {expect_result}"):
-            for i in range(1, max_retries):
-                url_cmd = util.make_http_get_request("127.0.0.1", "8888", "/metrics")
-                out = kubectl.launch(
-                    f"exec {operator_pod} -c metrics-exporter -- {url_cmd}",
-                    ns=operator_namespace
-                )
-                all_strings_expected_done = True
-                for string, exists in expect_result.items():
-                    all_strings_expected_done = (exists == (string in out))
-                    if not all_strings_expected_done:
-                        break
-
-                if all_strings_expected_done:
-                    break
-                with Then("Not ready. Wait for " + str(i * 5) + " seconds"):
-                    time.sleep(i * 5)
-            assert all_strings_expected_done, error()
-
     with Given("clickhouse-operator pod exists"):
         out = kubectl.launch("get pods -l app=clickhouse-operator", ns='kube-system').splitlines()[1]
         operator_pod = re.split(r'[\t\r\n\s]+', out)[0]
         operator_namespace = "kube-system"
+        exporter = exporter_endpoint_via_kubectl(operator_namespace, operator_pod)
 
         with Then("check empty /metrics"):
             kubectl.delete_ns(kubectl.namespace, ok_to_fail=True)
             kubectl.create_ns(kubectl.namespace)
-            check_monitoring_metrics(operator_namespace, operator_pod, expect_result={
-                'chi_clickhouse_metric_VersionInteger': False,
-            })
+            check_monitoring_metrics(exporter, expect_result=[
+                ('chi_clickhouse_metric_VersionInteger', {}, False),
+            ])
 
         with Then("Install multiple clickhouse version"):
             manifest = "manifests/chi/test-017-multi-version.yaml"
@@ -131,18 +139,24 @@ def test_metrics_exporter_with_multiple_clickhouse_version(self):
                     "do_not_delete": True,
                 })
             with And("Check not empty /metrics"):
-                check_monitoring_metrics(operator_namespace, operator_pod, expect_result={
-                    '# HELP chi_clickhouse_metric_VersionInteger': True,
-                    '# TYPE chi_clickhouse_metric_VersionInteger gauge': True,
-                    'chi_clickhouse_metric_VersionInteger{chi="test-017-multi-version",hostname="chi-test-017-multi-version-default-0-0': True,
-                    'chi_clickhouse_metric_VersionInteger{chi="test-017-multi-version",hostname="chi-test-017-multi-version-default-1-0': True,
+                check_monitoring_metrics(exporter, expect_result=[
+                    ('chi_clickhouse_metric_VersionInteger', {
+                        'chi': 'test-017-multi-version',
+                        'hostname': re.compile(r'chi-test-017-multi-version-default-0-0.*'),
+                    }, True),
+                    ('chi_clickhouse_metric_VersionInteger', {
+                        'chi': 'test-017-multi-version',
+                        'hostname': re.compile(r'chi-test-017-multi-version-default-1-0.*'),
+                    }, True),
+                ], expect_types={
+                    'chi_clickhouse_metric_VersionInteger': 'gauge',
                 })
 
         with Then("check empty /metrics after delete namespace"):
             kubectl.delete_ns(kubectl.namespace)
-            check_monitoring_metrics(operator_namespace, operator_pod, expect_result={
-                'chi_clickhouse_metric_VersionInteger': False,
-            })
+            check_monitoring_metrics(exporter, expect_result=[
+                ('chi_clickhouse_metric_VersionInteger', {}, False),
+            ])
 
 
 @TestFeature
@@ -3,7 +3,11 @@ import yaml
 import threading
 
 import e2e.clickhouse as clickhouse
+import e2e.fleet as fleet
 import e2e.kubectl as kubectl
+import e2e.prober as prober
+import e2e.schema as schema
+import e2e.workload as workload
 import e2e.yaml_manifest as yaml_manifest
 import e2e.settings as settings
 import e2e.util as util
@@ -172,7 +176,9 @@ def test_007(self):
 
 
 @TestStep
-def test_operator_upgrade(self, manifest, version_from, version_to=settings.operator_version):
+def test_operator_upgrade(self, manifest, version_from, version_to=None):
+    if version_to is None:
+        version_to = settings.operator_version
     with Given(f"clickhouse-operator FROM {version_from}"):
         util.set_operator_version(version_from)
         chi = yaml_manifest.get_chi_name(util.get_full_path(manifest, True))
@@ -189,17 +195,20 @@ def test_operator_upgrade(self, manifest, version_from, version_to=settings.oper
                 "do_not_delete": 1,
             }
         )
-        start_time = kubectl.get_field("pod", f"chi-{chi}-{cluster}-0-0-0", ".status.startTime")
 
         with Then("Create a table"):
             clickhouse.query(chi, "CREATE TABLE test_local Engine = Log as SELECT 1")
             clickhouse.query(chi, "CREATE TABLE test_dist as system.one Engine = Distributed('test-009', system, one)")
 
         with When(f"upgrade operator TO {version_to}"):
+            tracker = fleet.FleetTracker().start()
             util.set_operator_version(version_to, timeout=120)
             kubectl.wait_chi_status(chi, "Completed", retries=20)
 
             kubectl.wait_objects(chi, {"statefulset": 1, "pod": 1, "service": 2})
+            tracker.wait_reconciled()
+            report = tracker.finish()
+            tracker.note_report()
 
             with Then("Check that table is here"):
                 tables = clickhouse.query(chi, "SHOW TABLES")
@@ -208,32 +217,36 @@ def test_operator_upgrade(self, manifest, version_from, version_to=settings.oper
                 assert "1" == out
 
             with Then("ClickHouse pods should not be restarted"):
-                new_start_time = kubectl.get_field("pod", f"chi-{chi}-{cluster}-0-0-0", ".status.startTime")
-                if start_time != new_start_time:
+                if report["restarted_pods"]:
                     kubectl.launch(f"describe chi -n {settings.test_namespace} {chi}")
                     kubectl.launch(
                         f"logs -n {settings.test_namespace} pod/$(kubectl get pods -o name | grep clickhouse-operator) -c clickhouse-operator"
                     )
-                assert start_time == new_start_time, error(
-                    f"{start_time} != {new_start_time}, pod restarted after operator upgrade")
+                assert report["restarted_pods"] == {}, error(
+                    f"{report['restarted_pods']}, pods restarted after operator upgrade")
         kubectl.delete_chi(chi)
 
 
 @TestStep
 def check_operator_restart(self, chi, wait_objects, pod):
-    start_time = kubectl.get_field("pod", pod, ".status.startTime")
+    tracker = fleet.FleetTracker().start()
     with When("Restart operator"):
         util.restart_operator()
         kubectl.wait_objects(chi, wait_objects)
         kubectl.wait_chi_status(chi, "Completed")
-        new_start_time = kubectl.get_field("pod", pod, ".status.startTime")
+        tracker.wait_reconciled()
+        report = tracker.finish()
+        tracker.note_report()
 
         with Then("ClickHouse pods should not be restarted"):
-            assert start_time == new_start_time
+            assert pod not in report["restarted_pods"], error(report["restarted_pods"][pod])
+            assert report["restarted_pods"] == {}, error()
 
 
 @TestStep
-def test_operator_restart(self, manifest, version=settings.operator_version):
+def test_operator_restart(self, manifest, version=None):
+    if version is None:
+        version = settings.operator_version
     with Given(f"clickhouse-operator {version}"):
         util.set_operator_version(version)
         chi = yaml_manifest.get_chi_name(util.get_full_path(manifest))
@@ -699,9 +712,10 @@ def test_013(self):
     start_time = kubectl.get_field("pod", f"chi-{chi}-{cluster}-0-0-0", ".status.startTime")
 
     schema_objects = [
-        'test_local_013',
-        'test_distr_013',
-        'events-distr_013',
+        ('database', 'test-db-013'),
+        ('table', 'test-db-013.test_local_013'),
+        ('table', 'test-db-013.test_distr_013'),
+        ('table', 'test-db-013.events-distr_013'),
     ]
     with Then("Create local and distributed tables"):
         clickhouse.query(chi, "CREATE DATABASE \\\"test-db-013\\\"")
@@ -739,13 +753,10 @@ def test_013(self):
         assert start_time == new_start_time
 
     with And("Schema objects should be migrated to new shards"):
-        for obj in schema_objects:
-            out = clickhouse.query(
-                chi,
-                f"SELECT count() FROM system.tables WHERE name = '{obj}'",
-                host=f"chi-{chi}-{cluster}-1-0"
-            )
-            assert out == "1"
+        snap = schema.snapshot(chi)
+        diff = schema.diff(snap, source=f"chi-{chi}-{cluster}-0-0-0", pods=[f"chi-{chi}-{cluster}-1-0-0"])
+        assert diff == {}, error(diff)
+        assert schema.missing_objects(snap, f"chi-{chi}-{cluster}-1-0-0", schema_objects) == [], error()
 
     with When("Remove shards"):
         kubectl.create_and_check(
@@ -801,14 +812,16 @@ def test_014(self):
     start_time = kubectl.get_field("pod", f"chi-{chi}-{cluster}-0-0-0", ".status.startTime")
 
     schema_objects = [
-        'test_local_014',
-        'test_view_014',
-        'test_mv_014',
-        'test_buffer_014',
-        'a_view_014',
-        'test_local2_014',
-        'test_local_uuid_014',
-        'test_uuid_014'
+        ('table', 'default.test_local_014'),
+        ('table', 'default.test_view_014'),
+        ('table', 'default.test_mv_014'),
+        ('table', 'default.test_buffer_014'),
+        ('table', 'default.a_view_014'),
+        ('table', 'test_atomic_014.test_local2_014'),
+        ('table', 'test_atomic_014.test_local_uuid_014'),
+        ('table', 'test_atomic_014.test_uuid_014'),
+        ('dictionary', 'default.test_dict_014'),
+        ('database', 'test_atomic_014'),
     ]
     replicated_tables = [
         'default.test_local_014',
@@ -838,30 +851,16 @@ def test_014(self):
 
     def check_schema_propagation(replicas):
         with Then("Schema objects should be migrated to the new replicas"):
+            snap = schema.snapshot(chi, host=f"chi-{chi}-{cluster}-0-0")
+            source = f"chi-{chi}-{cluster}-0-0-0"
+            with By("Checking tables, views, dictionaries and database engine of the first replica"):
+                assert schema.missing_objects(snap, source, schema_objects) == [], error()
+                assert snap[source][("database", "test_atomic_014")] == "Atomic", error()
             for replica in replicas:
-                host = f"chi-{chi}-{cluster}-0-{replica}"
-                print(f"Checking replica {host}")
-                print("Checking tables and views")
-                for obj in schema_objects:
-                    out = clickhouse.query(
-                        chi,
-                        f"SELECT count() FROM system.tables WHERE name = '{obj}'",
-                        host=host)
-                    assert out == "1"
-
-                print("Checking dictionaries")
-                out = clickhouse.query(
-                    chi,
-                    f"SELECT count() FROM system.dictionaries WHERE name = 'test_dict_014'",
-                    host=host)
-                assert out == "1"
-
-                print("Checking database engine")
-                out = clickhouse.query(
-                    chi,
-                    f"SELECT engine FROM system.databases WHERE name = 'test_atomic_014'",
-                    host=host)
-                assert out == "Atomic"
+                pod = f"chi-{chi}-{cluster}-0-{replica}-0"
+                print(f"Checking replica {pod}")
+                diff = schema.diff(snap, source, pods=[pod])
+                assert diff == {}, error(diff)
 
         with And("Replicated table should have the data"):
             for replica in replicas:
@@ -1758,53 +1757,64 @@ def test_025(self):
         clickhouse.query(chi,
                          "CREATE TABLE test_distr_025 AS test_local_025 Engine = Distributed('default', default, test_local_025)")
         clickhouse.query(chi, f"INSERT INTO test_local_025 SELECT * FROM numbers({numbers})", timeout=120)
+        clickhouse.query(chi, create_table.replace("test_local_025", "test_workload_025"))
+
+    service = f"clickhouse-{chi}"
+    probe = prober.AvailabilityProber(
+        [
+            prober.Target("local via loadbalancer", service=service, sql="SELECT count() FROM test_local_025"),
+            prober.Target("distributed via loadbalancer", service=service, sql="SELECT count() FROM test_distr_025"),
+        ],
+        user="probe", password="probe", client_pod="chi-test-025-rescaling-default-0-0-0",
+    )
+    load = workload.Workload(
+        prober.Target(service, service=service), readers=1, writers=1,
+        read_table="test_distr_025", write_table="test_workload_025", batch_size=1000, qps=5,
+        user="probe", password="probe", client_pod="chi-test-025-rescaling-default-0-0-0",
+    )
 
-    with When("Add one more replica, but do not wait for completion"):
-        kubectl.create_and_check(
-            manifest="manifests/chi/test-025-rescaling-2.yaml",
-            check={
-                "do_not_delete": 1,
-                "pod_count": 2,
-                "chi_status": "InProgress",  # do not wait
-            },
-            timeout=600,
-        )
-
-    with Then("Query second pod using service as soon as pod is in ready state"):
-        kubectl.wait_field(
-            "pod", "chi-test-025-rescaling-default-0-1-0",
-            ".metadata.labels.\"clickhouse\\.altinity\\.com/ready\"", "yes",
-            backoff=1
-        )
-        start_time = time.time()
-        lb_error_time = start_time
-        distr_lb_error_time = start_time
-        latent_replica_time = start_time
-        for i in range(1, 100):
-            cnt_local = clickhouse.query_with_error(chi, "SELECT count() FROM test_local_025",
-                                                    "chi-test-025-rescaling-default-0-1.test.svc.cluster.local")
-            cnt_lb = clickhouse.query_with_error(chi, "SELECT count() FROM test_local_025")
-            cnt_distr_lb = clickhouse.query_with_error(chi, "SELECT count() FROM test_distr_025")
-            if "Exception" in cnt_lb or cnt_lb == 0:
-                lb_error_time = time.time()
-            if "Exception" in cnt_distr_lb or cnt_distr_lb == 0:
-                distr_lb_error_time = time.time()
-            note(f"local via loadbalancer: {cnt_lb}, distributed via loadbalancer: {cnt_distr_lb}")
-            if "Exception" not in cnt_local:
-                note(f"local: {cnt_local}, distr: {cnt_distr_lb}")
-                if cnt_local == numbers:
-                    break
-                latent_replica_time = time.time()
-                note("Replicated table did not catch up")
-            note("Waiting 1 second.")
-            time.sleep(1)
-        note(
-            f"Tables not ready: {round(distr_lb_error_time - start_time)}s, data not ready: {round(latent_replica_time - distr_lb_error_time)}s")
+    with probe, load:
+        with When("Add one more replica, but do not wait for completion"):
+            kubectl.create_and_check(
+                manifest="manifests/chi/test-025-rescaling-2.yaml",
+                check={
+                    "do_not_delete": 1,
+                    "pod_count": 2,
+                    "chi_status": "InProgress",  # do not wait
+                },
+                timeout=600,
+            )
 
-        with Then("Query to the distributed table via load balancer should never fail"):
-            assert round(distr_lb_error_time - start_time) == 0
-        with And("Query to the local table via load balancer should never fail"):
-            assert round(lb_error_time - start_time) == 0
+        with Then("Query second pod using service as soon as pod is in ready state"):
+            kubectl.wait_field(
+                "pod", "chi-test-025-rescaling-default-0-1-0",
+                ".metadata.labels.\"clickhouse\\.altinity\\.com/ready\"", "yes",
+                backoff=1
+            )
+            start_time = time.time()
+            latent_replica_time = start_time
+            for i in range(1, 100):
+                cnt_local = clickhouse.query_with_error(chi, "SELECT count() FROM test_local_025",
+                                                        "chi-test-025-rescaling-default-0-1.test.svc.cluster.local")
+                if "Exception" not in cnt_local:
+                    note(f"local: {cnt_local}")
+                    if cnt_local == numbers:
+                        break
+                    latent_replica_time = time.time()
+                    note("Replicated table did not catch up")
+                note("Waiting 1 second.")
+                time.sleep(1)
+
+    report = probe.note_report(chi_targets=["local via loadbalancer", "distributed via loadbalancer"])
+    load.note_report()
+    note(f"Data not ready: {round(latent_replica_time - start_time)}s")
+
+    with Then("Query to the distributed table via load balancer should never fail"):
+        assert report["distributed via loadbalancer"]["downtime"] == 0
+    with And("Query to the local table via load balancer should never fail"):
+        assert report["local via loadbalancer"]["downtime"] == 0
+    with And("Reads and inserts via load balancer should stay within SLO"):
+        assert load.violations() == [], error()
 
     kubectl.delete_chi(chi)
 
@@ -1956,41 +1966,30 @@ def test_028(self):
     out = clickhouse.query_with_error(chi, sql)
     note(out)
     with When("CHI is patched with a restart attribute"):
-        cmd = f"patch chi {chi} --type='json' --patch='[{{\"op\":\"add\",\"path\":\"/spec/restart\",\"value\":\"RollingUpdate\"}}]'"
-        kubectl.launch(cmd)
-        with Then("Operator should let the query to finish"):
-            out = clickhouse.query_with_error(chi, "select count(sleepEachRow(1)) from numbers(30)")
-            assert out == "30"
-
-        with Then("Operator should start processing a change"):
-            # TODO: Test needs to be improved
-            kubectl.wait_chi_status(chi, "InProgress")
-            start_time = time.time()
-            ch1_downtime = 0
-            ch2_downtime = 0
-            chi_downtime = 0
-            with And("Queries keep running"):
-                while kubectl.get_field("chi", chi, ".status.status") == "InProgress":
-                    ch1 = clickhouse.query_with_error(chi, sql, pod="chi-test-014-replication-default-0-0-0", host="chi-test-014-replication-default-0-0", advanced_params="--connect_timeout=1 --send_timeout=10 --receive_timeout=10")
-                    ch2 = clickhouse.query_with_error(chi, sql, pod="chi-test-014-replication-default-1-0-0", host="chi-test-014-replication-default-1-0", advanced_params="--connect_timeout=1 --send_timeout=10 --receive_timeout=10")
-
-                    if "error" in ch1 or "Exception" in ch1 or ch2.endswith("1"):
-                        ch1_downtime = ch1_downtime + 5
-                    if "error" in ch2 or "Exception" in ch2 or ch1.endswith("1"):
-                        ch2_downtime = ch2_downtime + 5
-                    if ("error" in ch1 or "Exception" in ch1) and ("error" in ch2 or "Exception" in ch2):
-                        chi_downtime = chi_downtime + 5
-
-                    print(ch1 + "\t" + ch2)
-
-                    # print("Waiting 5 seconds")
-                    time.sleep(5)
-            end_time = time.time()
+        probe = prober.for_chi(manifest, user="probe", password="probe")
+        with probe:
+            cmd = f"patch chi {chi} --type='json' --patch='[{{\"op\":\"add\",\"path\":\"/spec/restart\",\"value\":\"RollingUpdate\"}}]'"
+            kubectl.launch(cmd)
+            with Then("Operator should let the query to finish"):
+                out = clickhouse.query_with_error(chi, "select count(sleepEachRow(1)) from numbers(30)")
+                assert out == "30"
+
+            with Then("Operator should start processing a change"):
+                # TODO: Test needs to be improved
+                kubectl.wait_chi_status(chi, "InProgress")
+                start_time = time.time()
+                with And("Queries keep running"):
+                    while kubectl.get_field("chi", chi, ".status.status") == "InProgress":
+                        time.sleep(1)
+                end_time = time.time()
+
+        with Then("CHI should stay available during the restart"):
             print(f"Total restart time: {str(round(end_time - start_time))}")
-            print(f"First replica downtime: {ch1_downtime}")
-            print(f"Second replica downtime: {ch2_downtime}")
-            print(f"CHI downtime: {chi_downtime}")
-            assert chi_downtime == 0
+            report = probe.note_report()
+            for host in ("chi-test-014-replication-default-0-0", "chi-test-014-replication-default-1-0"):
+                print(f"{host} downtime: {report[host]['downtime']}")
+            print(f"CHI downtime: {report['chi_downtime']}")
+            assert report["chi_downtime"] == 0
 
         with Then("Check restart attribute"):
             restart = kubectl.get_field("chi", chi, ".spec.restart")
@@ -2109,24 +2108,25 @@ def test_031(self):
     chi = "test-031-wo-tpl"
 
     with Given("I generate CHO deploy manifest"):
-        with open(util.get_full_path(settings.clickhouse_operator_install_manifest)) as base_template, \
-                open(util.get_full_path("../../config/config.yaml")) as config_file:
-            manifest_yaml = list(yaml.safe_load_all(base_template.read()))
-
-            config_yaml = yaml.safe_load(config_file.read())
-            config_yaml["annotation"]["exclude"] = ["excl", ]
-            config_contents = yaml.dump(config_yaml, default_flow_style=False)
-
-            for doc in manifest_yaml:
-                if doc["metadata"]["name"] == "etc-clickhouse-operator-files":
-                    doc["data"]["config.yaml"] = config_contents
-                    debug(config_contents)
-                    break
+        manifest_yaml = yaml_manifest.thaw(yaml_manifest.get_multidoc_manifest_data(
+            util.get_full_path(settings.clickhouse_operator_install_manifest)
+        ))
+
+        config_yaml = yaml_manifest.thaw(yaml_manifest.get_manifest_data(util.get_full_path("../../config/config.yaml")))
+        config_yaml["annotation"]["exclude"] = ["excl", ]
+        config_contents = yaml.dump(config_yaml, default_flow_style=False)
+
+        for doc in manifest_yaml:
+            if doc["metadata"]["name"] == "etc-clickhouse-operator-files":
+                doc["data"]["config.yaml"] = config_contents
+                debug(config_contents)
+                break
 
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix=".yaml") as f:
-                f.write(yaml.dump_all(manifest_yaml).encode())
-                util.install_operator_if_not_exist(reinstall=True, manifest=f.name)
+        import tempfile
+        with tempfile.NamedTemporaryFile(suffix=".yaml") as f:
+            f.write(yaml.dump_all(manifest_yaml).encode())
+            f.flush()
+            util.install_operator_if_not_exist(reinstall=True, manifest=f.name)
 
     with And("Restart operator"):
         util.restart_operator(ns=settings.operator_namespace)
@@ -2218,6 +2218,7 @@ def test_032(self):
         clickhouse.query(chi, create_table)
         clickhouse.query(chi, "CREATE TABLE test_distr as test_local Engine = Distributed('default', default, test_local)")
         clickhouse.query(chi, f"INSERT INTO test_local select * from numbers({numbers})", timeout=120)
+        clickhouse.query(chi, create_table.replace("test_local", "test_workload"))
 
     with When("check the initial select query count before rolling update"):
         with By("executing query in the clickhouse installation"):
@@ -2226,38 +2227,56 @@ def test_032(self):
             assert cnt_test_local == '100000000', error()
 
     trigger_event = threading.Event()
+    service = "clickhouse-test-032-rescaling"
+    probe = prober.AvailabilityProber(
+        [prober.Target(service, service=service, sql="SELECT count() FROM test_distr", expect=numbers)],
+        user="test_032", password="test_032", client_pod="clickhouse-test-032-client",
+    )
+    load = workload.Workload(
+        prober.Target(service, service=service), readers=2, writers=1,
+        read_table="test_distr", write_table="test_workload", batch_size=1000, qps=5,
+        user="test_032", password="test_032", client_pod="clickhouse-test-032-client",
+    )
 
-    Check("run select query until receive stop event",
-        test=run_select_query,
-        parallel=True)(
-            client_pod = "clickhouse-test-032-client",
-            user_name = "test_032",
-            password = "test_032",
-            trigger_event = trigger_event,
-            )
+    with probe, load:
+        Check("run select query until receive stop event",
+            test=run_select_query,
+            parallel=True)(
+                client_pod = "clickhouse-test-032-client",
+                user_name = "test_032",
+                password = "test_032",
+                trigger_event = trigger_event,
+                )
 
-    with When("Change the image in the podTemplate by updating the chi version to test the rolling update logic"):
-        kubectl.create_and_check(
-            manifest="manifests/chi/test-032-rescaling-2.yaml",
-            check={
-            "apply_templates": {
-                settings.clickhouse_template,
-                "manifests/chit/tpl-persistent-volume-100Mi.yaml",
-            },
-            "object_counts": {
-                "statefulset": 2,
-                "pod": 2,
-                "service": 3,
+        with When("Change the image in the podTemplate by updating the chi version to test the rolling update logic"):
+            kubectl.create_and_check(
+                manifest="manifests/chi/test-032-rescaling-2.yaml",
+                check={
+                "apply_templates": {
+                    settings.clickhouse_template,
+                    "manifests/chit/tpl-persistent-volume-100Mi.yaml",
+                },
+                "object_counts": {
+                    "statefulset": 2,
+                    "pod": 2,
+                    "service": 3,
+                },
+                "do_not_delete": 2,
             },
-            "do_not_delete": 2,
-        },
-        timeout=int(1000),
-        )
+            timeout=int(1000),
+            )
 
-    note("Setting the thread event to true...")
-    trigger_event.set()
-    note("Joining the parallel thread with main...")
-    join()
+        note("Setting the thread event to true...")
+        trigger_event.set()
+        note("Joining the parallel thread with main...")
+        join()
+
+    with Then("Load balancer should stay available during the rolling update"):
+        report = probe.note_report(chi_targets=[service])
+        assert report["chi_downtime"] == 0, error()
+    with And("Reads and inserts should stay within SLO during the rolling update"):
+        load.note_report()
+        assert load.violations() == [], error()
 
     kubectl.delete_chi(chi)
     kubectl.launch(f"delete pod clickhouse-test-032-client", ns=kubectl.namespace, timeout=600)
@@ -1,9 +1,12 @@
 import os
 import time
 
+import yaml
+
 import e2e.clickhouse as clickhouse
 import e2e.kubectl as kubectl
 import e2e.settings as settings
+import e2e.chi_model as chi_model
 import e2e.yaml_manifest as yaml_manifest
 
 from testflows.core import fail, Given, Then, current
@@ -21,6 +24,16 @@ def get_full_path(test_file, lookup_in_host=True):
         return os.path.abspath(f"/home/master/clickhouse-operator/tests/e2e/{test_file}")
 
 
+def write_manifest(data, name):
+    """Write a generated manifest to manifests/generated, where kubectl in docker-compose sees it too,
+    returns its path relative to tests/e2e."""
+    path = os.path.join("manifests", "generated", f"{name}.yaml")
+    os.makedirs(get_full_path(os.path.dirname(path)), exist_ok=True)
+    with open(get_full_path(path), "w") as f:
+        yaml.dump(data, f)
+    return path
+
+
 def set_operator_version(version, ns=settings.operator_namespace, timeout=600):
     if settings.operator_install != 'yes':
         return
@@ -134,9 +147,6 @@ def install_clickhouse_and_keeper(chi_file, chi_template_file, chi_name,
         if keeper_install_first:
             require_keeper(keeper_type=keeper_type, keeper_manifest=keeper_manifest, force_install=force_keeper_install)
 
-        chi_manifest_data = yaml_manifest.get_manifest_data(get_full_path(chi_file))
-        layout = chi_manifest_data["spec"]["configuration"]["clusters"][0]["layout"]
-        expected_nodes = 1 * layout["shardsCount"] * layout["replicasCount"]
         check = {
             "apply_templates": [
                 chi_template_file,
@@ -145,11 +155,9 @@ def install_clickhouse_and_keeper(chi_file, chi_template_file, chi_name,
             "do_not_delete": 1
         }
         if make_object_count:
-            check["object_counts"] = {
-                "statefulset": expected_nodes,
-                "pod": expected_nodes,
-                "service": expected_nodes + 1,
-            }
+            check["object_counts"] = chi_model.expected_object_counts(
+                chi_file, check["apply_templates"], kinds=("statefulset", "pod", "service"),
+            )
         kubectl.create_and_check(
             manifest=chi_file,
             check=check,
@@ -188,9 +196,11 @@ def make_http_get_request(host, port, path):
     return f"bash -c '{cmd}'"
 
 
-def install_operator_if_not_exist(reinstall=False, manifest=get_full_path(settings.clickhouse_operator_install_manifest)):
+def install_operator_if_not_exist(reinstall=False, manifest=None):
     if settings.operator_install != 'yes':
         return
+    if manifest is None:
+        manifest = get_full_path(settings.clickhouse_operator_install_manifest)
     with Given(f"clickhouse-operator version {settings.operator_version} is installed"):
         if kubectl.get_count("pod", ns=settings.operator_namespace, label="-l app=clickhouse-operator") == 0 or reinstall:
             kubectl.apply(
@@ -0,0 +1,204 @@
+"""Background read/write workload for operator actions under load.
+
+Reader and writer threads query a pod or service of the CHI (see e2e.prober.Client for the transport) at a
+target rate, per operation latencies and classified errors are collected and checked against an SLO:
+
+    load = workload.Workload(prober.Target("lb", service=f"clickhouse-{chi}"), readers=2, writers=1,
+                             read_table="test_distr", write_table="test_local", batch_size=1000, qps=10)
+    with load:
+        ... operator action ...
+    load.note_report()
+    assert load.violations() == [], error()
+
+Rates are totals per operation, split among its threads. A thread falling behind skips missed slots
+instead of bursting to catch up, so latencies are service times of single queries.
+"""
+import re
+import time
+import threading
+import collections
+
+import e2e.benchmark as benchmark
+import e2e.prober as prober
+import e2e.settings as settings
+
+from testflows.core import note, debug
+
+read_sql = "SELECT count() FROM {table}"
+write_sql = "INSERT INTO {table} SELECT number FROM numbers({batch_size})"
+
+# upper bounds of latency histogram buckets, seconds
+histogram_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# ClickHouse error codes -> error class
+error_codes = {
+    60: "unknown_table",
+    81: "unknown_database",
+    159: "timeout",
+    164: "readonly",
+    209: "timeout",
+    210: "connection",
+    225: "keeper",
+    242: "readonly",
+    252: "too_many_parts",
+    279: "connection",
+    319: "unknown_insert_status",
+    516: "auth",
+    999: "keeper",
+}
+
+
+def classify(error):
+    """Class of an error message of prober.Client, e.g. readonly, keeper, connection, timeout or unavailable."""
+    m = re.search(r"Code: (\d+)", error)
+    if m is not None:
+        return error_codes.get(int(m.group(1)), f"code_{m.group(1)}")
+    if re.search(r"HTTP 50[234]", error):
+        # proxy has no ready endpoint behind the service or pod
+        return "unavailable"
+    if "timed out" in error or "Timeout" in error:
+        return "timeout"
+    if "Connection" in error or "RemoteDisconnected" in error or "Broken pipe" in error:
+        return "connection"
+    return "other"
+
+
+def histogram(latencies):
+    """{bucket upper bound: count}, "inf" counts latencies above the largest bucket."""
+    result = collections.OrderedDict((bound, 0) for bound in histogram_buckets)
+    result["inf"] = 0
+    for latency in latencies:
+        for bound in histogram_buckets:
+            if latency <= bound:
+                result[bound] += 1
+                break
+        else:
+            result["inf"] += 1
+    return result
+
+
+class Stats(object):
+    """Outcomes of one kind of operation, shared by its threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (unixtime, latency seconds) of successful operations
+        self.ok = []
+        # (unixtime, error class, error)
+        self.errors = []
+
+    def add(self, started, latency, error=None):
+        with self.lock:
+            if error is None:
+                self.ok.append((started, latency))
+            else:
+                self.errors.append((started, classify(error), error))
+
+
+class Workload(benchmark.Sampler):
+    def __init__(self, target, readers=1, writers=1, read_table="test_distr", write_table="test_local",
+                 batch_size=1000, qps=10, read_qps=None, write_qps=None, read_sql=read_sql, write_sql=write_sql,
+                 user="", password="", client_pod=None, timeout=10.0, ns=settings.test_namespace):
+        """target is a prober.Target, sql templates are formatted with table and batch_size.
+
+        qps is the rate of reads and, separately, of writes unless read_qps or write_qps are given,
+        client_pod runs exec queries of services when kubectl proxy is not available.
+        """
+        super().__init__(join_timeout=timeout + 60)
+        self.target = target
+        self.threads_count = {"read": readers, "write": writers}
+        self.qps = {"read": qps if read_qps is None else read_qps, "write": qps if write_qps is None else write_qps}
+        self.sql = {
+            "read": read_sql.format(table=read_table, batch_size=batch_size),
+            "write": write_sql.format(table=write_table, batch_size=batch_size),
+        }
+        self.batch_size = batch_size
+        self.user = user
+        self.password = password
+        self.client_pod = client_pod
+        self.timeout = timeout
+        self.ns = ns
+        self.stats = {"read": Stats(), "write": Stats()}
+        self.proxy = None
+
+    def threads_args(self):
+        return [(op, i) for op, count in self.threads_count.items() for i in range(count)]
+
+    def setup(self):
+        self.proxy = prober.start_proxy()
+
+    def cleanup(self):
+        if self.proxy is not None:
+            self.proxy.stop()
+
+    def run(self, op, i):
+        client = prober.Client(self.proxy, self.user, self.password, self.timeout, self.client_pod, self.ns)
+        interval = self.threads_count[op] / self.qps[op] if self.qps[op] else 0
+        try:
+            # spread threads of the same operation over the interval
+            self.every(interval, lambda: self.query(client, op), start=time.time() + interval * i / self.threads_count[op])
+        finally:
+            client.close()
+
+    def query(self, client, op):
+        started = time.time()
+        try:
+            client.query(self.target, self.sql[op])
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.stats[op].add(started, time.time() - started, error)
+
+    def report(self):
+        """{op: {ops, errors, error_rate, error_classes, qps, rows, latency summary, histogram}} for read and write."""
+        duration = max((self.stopped_at or time.time()) - self.started_at, 1e-9)
+        result = {}
+        for op, stats in self.stats.items():
+            latencies = [latency for _, latency in stats.ok]
+            ops = len(stats.ok) + len(stats.errors)
+            result[op] = {
+                "ops": ops,
+                "errors": len(stats.errors),
+                "error_rate": len(stats.errors) / ops if ops else 0.0,
+                "error_classes": dict(collections.Counter(error_class for _, error_class, _ in stats.errors)),
+                "qps": len(stats.ok) / duration,
+                "rows": len(stats.ok) * self.batch_size if op == "write" else None,
+                "latency": benchmark.summarize(latencies),
+                "histogram": histogram(latencies),
+            }
+        return result
+
+    def violations(self, p99=None, error_rate=None, ops=("read", "write")):
+        """SLO violations of the ops, settings.workload_slo_p99 and settings.workload_slo_error_rate by default."""
+        p99 = settings.workload_slo_p99 if p99 is None else p99
+        error_rate = settings.workload_slo_error_rate if error_rate is None else error_rate
+        report = self.report()
+        result = []
+        for op in ops:
+            if not self.threads_count[op]:
+                continue
+            r = report[op]
+            if r["ops"] == 0:
+                result.append(f"{op}: no operations were run")
+                continue
+            if r["error_rate"] > error_rate:
+                result.append(f"{op}: error rate {r['error_rate']:.3f} > {error_rate}, {r['error_classes']}")
+            if r["latency"]["count"] and r["latency"]["p99"] > p99:
+                result.append(f"{op}: p99 latency {r['latency']['p99']:.3f}s > {p99}s")
+        return result
+
+    def note_report(self):
+        report = self.report()
+        duration = (self.stopped_at or time.time()) - self.started_at
+        note(f"workload on {self.target.name} for {round(duration, 1)}s via {'kubectl proxy' if self.proxy else 'kubectl exec'}")
+        for op, r in report.items():
+            if not self.threads_count[op]:
+                continue
+            latency = r["latency"]
+            percentiles = "" if not latency["count"] else \
+                f", p50 {latency['p50'] * 1000:.1f}ms, p99 {latency['p99'] * 1000:.1f}ms, max {latency['max'] * 1000:.1f}ms"
+            note(f"{op}: {r['ops']} ops, {r['qps']:.1f} qps, {r['errors']} errors {r['error_classes']}{percentiles}")
+            note(f"{op} latency histogram: " + ", ".join(f"<={bound}s: {count}" for bound, count in r["histogram"].items() if count))
+            for started, error_class, error in self.stats[op].errors[:10]:
+                debug(f"{op} +{round(started - self.started_at, 3)}s {error_class}: {error}")
+        return report
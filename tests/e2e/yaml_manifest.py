@@ -1,13 +1,58 @@
+import os
+import types
+import threading
+
 import yaml
 
+# libyaml based loader is several times faster, fall back to pure python when PyYAML is built without it
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# absolute path -> ((st_mtime_ns, st_size), tuple of frozen documents)
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def freeze(data):
+    """Read-only view of parsed YAML, dicts become MappingProxyType and lists become tuples."""
+    if isinstance(data, dict):
+        return types.MappingProxyType({k: freeze(v) for k, v in data.items()})
+    if isinstance(data, list):
+        return tuple(freeze(v) for v in data)
+    return data
+
+
+def thaw(data):
+    """Mutable deep copy of frozen YAML, for callers which modify or dump a manifest."""
+    if isinstance(data, types.MappingProxyType):
+        return {k: thaw(v) for k, v in data.items()}
+    if isinstance(data, tuple):
+        return [thaw(v) for v in data]
+    return data
+
+
+def load_documents(manifest_filename):
+    """All documents of manifest_filename, parsed once and re-parsed only when the file changes."""
+    path = os.path.abspath(manifest_filename)
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, "r") as f:
+        docs = tuple(freeze(doc) for doc in yaml.load_all(f, Loader=Loader) if doc is not None)
+    with _cache_lock:
+        _cache[path] = (key, docs)
+    return docs
+
 
 def get_chi_name(chi_manifest_filename):
-    return yaml.safe_load(open(chi_manifest_filename, "r"))["metadata"]["name"]
+    return get_manifest_data(chi_manifest_filename)["metadata"]["name"]
 
 
 def get_manifest_data(manifest_filename):
-    return yaml.safe_load(open(manifest_filename, "r"))
+    docs = load_documents(manifest_filename)
+    return docs[0] if docs else None
 
 
 def get_multidoc_manifest_data(manifest_filename):
-    return yaml.safe_load_all(open(manifest_filename, "r"))
+    return load_documents(manifest_filename)
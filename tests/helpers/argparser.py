@@ -11,6 +11,31 @@ def argparser(parser):
         "--keeper-type",
         type=str,
         help="which type of keeper will use for test",
-        choices=["zookeeper", "clickhouse-keeper"],
+        choices=["zookeeper", "zookeeper-operator", "clickhouse-keeper"],
         default="zookeeper"
     )
+
+
+def regression_argparser(parser):
+    """Argument parser for regression.py, adds requirement based scenario selection.
+    """
+    argparser(parser)
+    parser.add_argument(
+        "--requirement",
+        type=str,
+        action="append",
+        metavar="pattern",
+        help="run only scenarios covering matching requirements, SRS or python name, wildcards allowed, "
+             "can be repeated, see helpers/requirements_index.py",
+        default=None
+    )
+    parser.add_argument(
+        "--keeper-matrix",
+        type=str,
+        nargs="?",
+        const="zookeeper,zookeeper-operator,clickhouse-keeper",
+        metavar="types",
+        help="run only e2e.test_keeper, for every comma separated keeper type in parallel, each in its own namespace, "
+             "all keeper types by default, requires --native, see helpers/keeper_matrix.py",
+        default=None
+    )
@@ -0,0 +1,133 @@
+"""e2e.test_keeper scenarios of several keeper types at once, each in its own namespace.
+
+Every keeper type runs as a child `regression.py --native --keeper-type <type>` process limited to the
+scenarios of that type, with TEST_NAMESPACE set to `<TEST_NAMESPACE>-<type>`. Keeper manifests and CHIs
+are namespaced, so the children do not share keeper services, CHIs or ClickHouse replica paths. They share
+the operator, which is installed by the parent before the children start, and the benchmark results
+directory, where e2e.keeper_timeline and e2e.keeper_load append their records.
+
+The combined report compares read-only replica and keeper quorum time of rescale iterations and insert
+throughput and latency under probes workload across keeper types, and is written to
+keeper-matrix-<timestamp>.json in the benchmark results directory.
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import subprocess
+
+import e2e.benchmark as benchmark
+import e2e.settings as settings
+import e2e.util as util
+
+from testflows.core import *
+
+keeper_types = ("zookeeper", "zookeeper-operator", "clickhouse-keeper")
+# scenarios of e2e.test_keeper by keeper type
+scenarios = {
+    "zookeeper": ["test_zookeeper_rescale", "test_zookeeper_pvc_scaleout_rescale", "test_zookeeper_probes_workload"],
+    "zookeeper-operator": ["test_zookeeper_operator_rescale", "test_zookeeper_operator_probes_workload"],
+    "clickhouse-keeper": ["test_clickhouse_keeper_rescale", "test_clickhouse_keeper_probes_workload"],
+}
+tests_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def command(suite_path, keeper_type):
+    only = [f"{suite_path}/e2e.test_keeper/{name}[.]*" for name in scenarios[keeper_type]]
+    return [sys.executable, os.path.join(tests_dir, "regression.py"), "--native", "--keeper-type", keeper_type, "--only", *only]
+
+
+def namespace(keeper_type):
+    return f"{settings.test_namespace}-{keeper_type}"
+
+
+def rescale_rows(keeper_type, since):
+    """Totals and worst iteration of keeper_rescale records of the keeper type stored since `since`, per keeper manifest."""
+    rows = {}
+    for record in benchmark.load_results("keeper_rescale"):
+        params = record["params"]
+        if params.get("keeper_type") != keeper_type or record["unixtime"] < since:
+            continue
+        row = rows.setdefault(params["keeper_manifest"], {"iterations": 0})
+        row["iterations"] += 1
+        for key, value in record["results"].items():
+            row[f"total_{key}"] = row.get(f"total_{key}", 0.0) + value
+            row[f"max_{key}"] = max(row.get(f"max_{key}", 0.0), value)
+    return rows
+
+
+def load_rows(keeper_type, since):
+    """keeper_load results of the keeper type stored since `since`, by insert rate."""
+    return {
+        record["params"]["rate"]: record["results"]
+        for record in benchmark.load_results("keeper_load")
+        if record["params"].get("keeper_type") == keeper_type and record["unixtime"] >= since
+    }
+
+
+def report(runs, since):
+    """{keeper type: {exit_code, duration_s, namespace, log, rescale, load}} of the runs."""
+    return {
+        keeper_type: dict(run, rescale=rescale_rows(keeper_type, since), load=load_rows(keeper_type, since))
+        for keeper_type, run in runs.items()
+    }
+
+
+def note_report(result):
+    for keeper_type, run in result.items():
+        note(f"{keeper_type}: exit code {run['exit_code']} in {round(run['duration_s'], 1)}s, "
+             f"namespace {run['namespace']}, log {run['log']}")
+        for manifest, row in sorted(run["rescale"].items()):
+            note(f"{keeper_type} {manifest}: {row['iterations']} rescale iterations, "
+                 f"read-only {row.get('total_readonly_s', 0.0):.1f}s (worst iteration {row.get('max_readonly_s', 0.0):.1f}s), "
+                 f"ClickHouse unavailable {row.get('total_clickhouse_unavailable_s', 0.0):.1f}s, "
+                 f"no quorum {row.get('total_no_quorum_s', 0.0):.1f}s, rescale {row.get('total_duration_s', 0.0):.1f}s")
+        for rate, results in sorted(run["load"].items()):
+            note(f"{keeper_type} {rate} inserts/s per replica: {results['inserts_per_s']:.1f} inserts/s, "
+                 f"p99 {results['insert_p99_s'] * 1000:.1f}ms, keeper max latency {results['keeper_max_latency_ms']}ms, "
+                 f"{results['probe_failures']} failed probes, {results['restarts']} restarts")
+
+
+def run(suite_path, types=keeper_types):
+    """Run e2e.test_keeper scenarios of the keeper types concurrently and report them side by side."""
+    os.makedirs(settings.benchmark_results_dir, exist_ok=True)
+    timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    processes = {}
+    runs = {}
+    with Given("operator is installed once for all keeper types"):
+        util.install_operator_if_not_exist()
+
+    started_at = time.time()
+    with When(f"e2e.test_keeper runs for {', '.join(types)} in parallel"):
+        for keeper_type in types:
+            log = os.path.join(settings.benchmark_results_dir, f"keeper-matrix-{timestamp}-{keeper_type}.log")
+            env = dict(os.environ, TEST_NAMESPACE=namespace(keeper_type))
+            with open(log, "w") as f:
+                processes[keeper_type] = subprocess.Popen(
+                    command(suite_path, keeper_type), cwd=tests_dir, env=env, stdout=f, stderr=subprocess.STDOUT,
+                )
+            runs[keeper_type] = {"namespace": namespace(keeper_type), "log": log}
+            note(f"{keeper_type} runs in namespace {namespace(keeper_type)}, output goes to {log}")
+        pending = dict(processes)
+        while pending:
+            time.sleep(5)
+            for keeper_type, process in list(pending.items()):
+                if process.poll() is not None:
+                    del pending[keeper_type]
+                    runs[keeper_type]["exit_code"] = process.returncode
+                    runs[keeper_type]["duration_s"] = time.time() - started_at
+                    note(f"{keeper_type} finished with exit code {process.returncode} in {round(runs[keeper_type]['duration_s'], 1)}s")
+
+    result = report(runs, started_at)
+    with Then("compare keeper types"):
+        note_report(result)
+        report_file = os.path.join(settings.benchmark_results_dir, f"keeper-matrix-{timestamp}.json")
+        with open(report_file, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True, default=str)
+        note(f"keeper matrix report is written to {report_file}")
+
+    with And("every keeper type passed"):
+        failed = [keeper_type for keeper_type, run in runs.items() if run["exit_code"] != 0]
+        assert failed == [], f"e2e.test_keeper failed for {failed}, see {[runs[t]['log'] for t in failed]}"
+    return result
@@ -0,0 +1,164 @@
+"""Static index of requirements covered by e2e scenarios.
+
+Test modules are parsed with ast, not imported, so building the index needs neither testflows nor a cluster.
+Parsed modules are cached in __pycache__ and re-parsed only when their mtime changes.
+
+Usage from tests/:
+
+    python3 helpers/requirements_index.py "RQ.SRS-026.ClickHouseOperator.Create*"
+"""
+import os
+import ast
+import sys
+import json
+import glob
+import fnmatch
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+tests_dir = os.path.dirname(current_dir)
+cache_file = os.path.join(current_dir, "__pycache__", "requirements-coverage.json")
+scenario_decorators = ("TestScenario", "TestCheck", "TestOutline")
+module_decorators = ("TestModule", "TestFeature", "TestSuite")
+
+if tests_dir not in sys.path:
+    sys.path.insert(0, tests_dir)
+
+import requirements
+
+
+def _decorator_name(decorator):
+    node = decorator.func if isinstance(decorator, ast.Call) else decorator
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _requirements(decorator):
+    """[(python name, version)] referenced by @Requirements(RQ_X("1.0"), RQ_Y)."""
+    result = []
+    for arg in decorator.args:
+        version = None
+        if isinstance(arg, ast.Call):
+            if arg.args and isinstance(arg.args[0], ast.Constant):
+                version = arg.args[0].value
+            arg = arg.func
+        if isinstance(arg, ast.Attribute):
+            result.append((arg.attr, version))
+        elif isinstance(arg, ast.Name):
+            result.append((arg.id, version))
+    return result
+
+
+def parse_module(path):
+    """Module name, module level requirements and scenarios with their requirements."""
+    with open(path, "r") as f:
+        tree = ast.parse(f.read(), path)
+    entry = {"module": None, "requirements": [], "scenarios": []}
+    for node in tree.body:
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        kinds = set()
+        name = node.name
+        reqs = []
+        for decorator in node.decorator_list:
+            decorator_name = _decorator_name(decorator)
+            kinds.add(decorator_name)
+            if decorator_name == "Name" and decorator.args and isinstance(decorator.args[0], ast.Constant):
+                name = decorator.args[0].value
+            elif decorator_name == "Requirements":
+                reqs.extend(_requirements(decorator))
+        if kinds & set(module_decorators):
+            entry["module"] = name
+            entry["requirements"] = reqs
+        elif kinds & set(scenario_decorators):
+            entry["scenarios"].append({"name": name, "function": node.name, "requirements": reqs})
+    return entry
+
+
+def load(paths=None):
+    """{path: parse_module(path)} for e2e test modules, unchanged modules come from the cache."""
+    if paths is None:
+        paths = sorted(glob.glob(os.path.join(tests_dir, "e2e", "test_*.py")))
+    try:
+        with open(cache_file, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    index = {}
+    changed = False
+    for path in paths:
+        mtime = os.stat(path).st_mtime
+        cached = cache.get(path)
+        if cached is None or cached["mtime"] != mtime:
+            cached = {"mtime": mtime, "entry": parse_module(path)}
+            changed = True
+        cache[path] = cached
+        index[path] = cached["entry"]
+    if changed:
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file + ".tmp", "w") as f:
+                json.dump(cache, f)
+            os.replace(cache_file + ".tmp", cache_file)
+        except OSError:
+            pass
+    return index
+
+
+def _matches(python_name, selectors):
+    srs_name = requirements.index().get(python_name, {}).get("name", python_name)
+    return any(fnmatch.fnmatchcase(python_name, s) or fnmatch.fnmatchcase(srs_name, s) for s in selectors)
+
+
+def scenarios_covering(selectors, paths=None):
+    """{module name: [scenario names]} of scenarios covering requirements matching any of the selectors.
+
+    Selectors are SRS names (RQ.SRS-026.ClickHouseOperator.Create) or python names (RQ_SRS_026_ClickHouseOperator_Create),
+    shell-style wildcards are allowed. Requirements of a module cover all its scenarios.
+    """
+    result = {}
+    for entry in load(paths).values():
+        if entry["module"] is None:
+            continue
+        module_covered = any(_matches(name, selectors) for name, _ in entry["requirements"])
+        for scenario in entry["scenarios"]:
+            if module_covered or any(_matches(name, selectors) for name, _ in scenario["requirements"]):
+                result.setdefault(entry["module"], []).append(scenario["name"])
+    return result
+
+
+def coverage(paths=None):
+    """{SRS requirement name: ["module/scenario", ...]} for all requirements referenced by tests."""
+    result = {}
+    names = requirements.index()
+    for entry in load(paths).values():
+        for scenario in entry["scenarios"]:
+            for name, _ in scenario["requirements"] + entry["requirements"]:
+                srs_name = names.get(name, {}).get("name", name)
+                result.setdefault(srs_name, []).append(f"{entry['module']}/{scenario['name']}")
+    return result
+
+
+def only_patterns(suite_path, covering):
+    """testflows only= patterns for scenarios returned by scenarios_covering().
+
+    Every scenario gets a pattern for itself and one for its steps, otherwise testflows skips the steps.
+    """
+    def escape(name):
+        return "".join(f"[{c}]" if c in "*?[" else c for c in name)
+
+    return [
+        pattern
+        for module, names in covering.items() for name in names
+        for pattern in (f"{suite_path}/{module}/*{escape(name)}", f"{suite_path}/{module}/*{escape(name)}/*")
+    ]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for module, names in scenarios_covering(sys.argv[1:]).items():
+            for name in names:
+                print(f"{module}/{name}")
+    else:
+        for requirement, scenarios in sorted(coverage().items()):
+            print(f"{requirement}: {len(scenarios)}")
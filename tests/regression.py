@@ -1,7 +1,10 @@
 from testflows.core import *
 
-from helpers.argparser import argparser
+from helpers.argparser import regression_argparser
 from helpers.cluster import Cluster
+import e2e.settings as settings
+import helpers.keeper_matrix
+import helpers.requirements_index as requirements_index
 from requirements.requirements import *
 
 xfails = {
@@ -29,11 +32,11 @@ xfails = {
 
 @TestSuite
 @XFails(xfails)
-@ArgumentParser(argparser)
+@ArgumentParser(regression_argparser)
 @Specifications(
     QA_SRS026_ClickHouse_Operator
 )
-def regression(self, native, keeper_type):
+def regression(self, native, keeper_type, requirement=None, keeper_matrix=None):
     """ClickHouse Operator test regression suite.
     """
     def run_features():
@@ -45,12 +48,32 @@ def regression(self, native, keeper_type):
             "e2e.test_clickhouse",
             "e2e.test_examples",
             "e2e.test_keeper",
+            "e2e.test_harness",
         ]
+        if requirement is None:
+            for feature_name in features:
+                Feature(run=load(feature_name, "test"))
+            return
+
+        covering = requirements_index.scenarios_covering(requirement)
+        note(f"{sum(len(names) for names in covering.values())} scenarios cover {', '.join(requirement)}")
         for feature_name in features:
-            Feature(run=load(feature_name, "test"))
+            if feature_name in covering:
+                only = requirements_index.only_patterns(self.name, {feature_name: covering[feature_name]})
+                Feature(run=load(feature_name, "test"), only=only)
 
     self.context.native = native
     self.context.keeper_type = keeper_type
+    settings.load()
+    if keeper_matrix is not None:
+        if not native:
+            fail("--keeper-matrix needs --native, every keeper type starts its own kubectl proxy and port-forwards")
+        types = [t.strip() for t in keeper_matrix.split(",")]
+        unknown = [t for t in types if t not in helpers.keeper_matrix.keeper_types]
+        if unknown:
+            fail(f"unknown keeper types {unknown}, expected {', '.join(helpers.keeper_matrix.keeper_types)}")
+        helpers.keeper_matrix.run(self.name, types)
+        return
     if native:
         run_features()
     else:
@@ -0,0 +1,60 @@
+"""Compact index of the generated requirements.
+
+requirements.py is generated by `tfs requirements generate` and is not edited by hand, tests import it directly
+with `from requirements.requirements import *`.
+
+index() returns names, versions and numbers of all requirements without importing the generated module
+or testflows, from a compact index cached in __pycache__ and rebuilt when requirements.py changes.
+"""
+import os
+import ast
+import json
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+generated_file = os.path.join(current_dir, "requirements.py")
+index_file = os.path.join(current_dir, "__pycache__", "requirements-index.json")
+
+_index = None
+
+
+def _build_index():
+    with open(generated_file, "r") as f:
+        tree = ast.parse(f.read(), generated_file)
+    requirements = {}
+    for node in tree.body:
+        if not (isinstance(node, ast.Assign) and isinstance(node.value, ast.Call)):
+            continue
+        if not (isinstance(node.value.func, ast.Name) and node.value.func.id == "Requirement"):
+            continue
+        fields = {
+            k.arg: k.value.value for k in node.value.keywords
+            if k.arg in ("name", "version", "num", "level") and isinstance(k.value, ast.Constant)
+        }
+        requirements[node.targets[0].id] = fields
+    return requirements
+
+
+def index():
+    """{python name: {"name": ..., "version": ..., "num": ..., "level": ...}} of all generated requirements."""
+    global _index
+    mtime = os.stat(generated_file).st_mtime
+    if _index is not None and _index["mtime"] == mtime:
+        return _index["requirements"]
+    try:
+        with open(index_file, "r") as f:
+            cached = json.load(f)
+        if cached["mtime"] == mtime:
+            _index = cached
+            return _index["requirements"]
+    except (OSError, ValueError, KeyError):
+        pass
+    _index = {"mtime": mtime, "requirements": _build_index()}
+    try:
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        with open(index_file + ".tmp", "w") as f:
+            json.dump(_index, f)
+        os.replace(index_file + ".tmp", index_file)
+    except OSError:
+        # read-only checkout, keep the index in memory only
+        pass
+    return _index["requirements"]